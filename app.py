@@ -5,6 +5,7 @@ from datetime import timedelta
 import calendar
 import plotly.express as px
 import plotly.graph_objects as go
+import plotly.io as pio
 import re
 import time
 from streamlit_option_menu import option_menu
@@ -13,7 +14,11 @@ import io
 import os  # MULTI-USER: Adicionado
 
 # MULTI-USER: Import do módulo de autenticação
-from auth import AuthManager
+from auth import AuthManager, LoginRateLimiter
+from database import GerenciadorSupabase, ler_admins, ler_credenciais
+from logic import IndiceCobertura, get_materias_edital, montar_editais, projetar_edital
+from prioridades import construir_matrizes, ranquear_alvos
+from store import QuestoesStore, VersoesDados, EstudosMultiMissao, CatalogoTemplates, FilaEscrita, normalizar_nome, FAIXAS_RELEVANCIA_QUESTOES, ORDENACAO_QUESTOES, aplicar_filtros_questoes
 
 # ============================================================================
 # 🎨 DESIGN SYSTEM - TEMA MODERNO ROXO/CIANO
@@ -189,7 +194,7 @@ def safe_pdf_output(pdf):
         return str(e).encode('utf-8')
 
 # --- NOVA VERSÃO: RELATÓRIO ESTRATÉGICO MODERNO COM SUMÁRIO ---
-def gerar_pdf_estratégico(df_estudos, missao, df_bruto, proj=None):
+def gerar_pdf_estratégico(df_estudos, missao, df_bruto, proj=None, matrizes=None):
     pdf = EstudoPDF()
     pdf.add_page()
     pdf.set_auto_page_break(auto=True, margin=15)
@@ -271,8 +276,10 @@ def gerar_pdf_estratégico(df_estudos, missao, df_bruto, proj=None):
     pdf.set_text_color(139, 92, 246)
     pdf.cell(0, 10, fix_text('2. ANÁLISE DE PRIORIDADES'), 0, 1, 'L')
     
-    df_matriz = df_estudos.groupby('materia').agg({'acertos': 'sum', 'total': 'sum'}).reset_index()
-    df_matriz['taxa'] = (df_matriz['acertos'] / df_matriz['total'] * 100).fillna(0)
+    # Matrizes do motor de prioridades (as mesmas do Guia Semanal quando informadas)
+    if matrizes is None:
+        matrizes = construir_matrizes(df_estudos, get_br_date())
+    df_matriz = matrizes['materias']
     
     # Classificação em 3 Níveis
     prioridade = df_matriz[df_matriz['taxa'] <= 75].sort_values('taxa')
@@ -329,8 +336,7 @@ def gerar_pdf_estratégico(df_estudos, missao, df_bruto, proj=None):
     pdf.set_text_color(139, 92, 246)
     pdf.cell(0, 10, fix_text('3. DETALHAMENTO TÁTICO POR MATÉRIA'), 0, 1, 'L')
     
-    df_assuntos = df_estudos.groupby(['materia', 'assunto']).agg({'acertos': 'sum', 'total': 'sum'}).reset_index()
-    df_assuntos['taxa'] = (df_assuntos['acertos'] / df_assuntos['total'] * 100).fillna(0)
+    df_assuntos = matrizes['assuntos']
     
     # Ordenar matérias pela taxa (do pior para o melhor para focar no erro)
     for _, row_mat in df_matriz.sort_values('taxa').iterrows():
@@ -411,6 +417,21 @@ def gerar_pdf_estratégico(df_estudos, missao, df_bruto, proj=None):
             pdf.set_font('Arial', '', 8)
             pdf.set_text_color(100, 100, 100)
             pdf.cell(0, 6, fix_text(f"(Em {proj['dias_para_fim']} dias, se mantiver o ritmo atual)"), 0, 1)
+        
+        # Término por matéria (mesma projeção exibida em Relatórios)
+        if proj.get('materias'):
+            pdf.set_xy(10, proj_y + 56)
+            pdf.set_font('Arial', 'B', 9)
+            pdf.set_text_color(30, 41, 59)
+            pdf.cell(0, 6, fix_text(f"Ritmo móvel (tópicos/semana): 7d {proj['ritmos'][7]:.1f} | 30d {proj['ritmos'][30]:.1f} | 90d {proj['ritmos'][90]:.1f}"), 0, 1)
+            pdf.set_font('Arial', '', 8)
+            pdf.set_text_color(71, 85, 105)
+            for m in proj['materias']:
+                termino = m['data_fim'].strftime('%d/%m/%Y') if pd.notna(m['data_fim']) else 'sem ritmo recente'
+                prazo = ""
+                if proj.get('data_prova') and 'no_prazo' in m:
+                    prazo = " - antes da prova" if m['no_prazo'] else " - APÓS A PROVA"
+                pdf.cell(0, 5, fix_text(f"{m['materia']}: {m['estudados']}/{m['total']} tópicos | término: {termino}{prazo}"), 0, 1)
 
     return safe_pdf_output(pdf)
 
@@ -837,104 +858,26 @@ def validar_tempo_hhmm(tempo_str):
         return False, f"Erro ao processar tempo: {e}", 0
 
 # =============================================================================
-# SUPABASE - INICIALIZAÇÃO CORRETA (PUBLISHABLE KEY)
-# =============================================================================
-
-import os
-import streamlit as st
-from supabase import create_client, Client
-
-
-def init_supabase() -> Client | None:
-    try:
-        # 1️⃣ Streamlit Cloud
-        url = st.secrets.get("SUPABASE_URL")
-        key = st.secrets.get("SUPABASE_KEY")
-
-        if url and key:
-            url = url.strip()
-            key = key.strip()
-
-            if not url.startswith("https://"):
-                raise ValueError("SUPABASE_URL inválida")
-
-            # ✅ NÃO validar tamanho da key (publishable é curta)
-            return create_client(url, key)
-
-        # 2️⃣ Ambiente local
-        url = os.getenv("SUPABASE_URL")
-        key = os.getenv("SUPABASE_KEY")
-
-        if url and key:
-            return create_client(url.strip(), key.strip())
-
-        st.error("❌ SUPABASE_URL / SUPABASE_KEY não encontrados.")
-        return None
-
-    except Exception as e:
-        st.error(f"❌ Erro ao inicializar Supabase: {e}")
-        return None
-
-
-supabase: Client | None = init_supabase()
-
-if not supabase:
-    st.error("❌ Erro ao conectar com Supabase. Verifique as configurações.")
-    st.stop()
-
-
-
-# =============================================================================
-# MULTI-USER: AUTENTICAÇÃO
-# =============================================================================
-
-if supabase:
-    # Inicializar gerenciador de autenticação
-    auth = AuthManager(supabase)
-    
-    # Verificar se está autenticado
-    if not auth.is_authenticated():
-        # Usuário NÃO autenticado -> Mostrar tela de login
-        auth.render_login_page()
-        st.stop()
-    
-    # Usuário AUTENTICADO -> Obter user_id para usar nas queries
-    user_id = auth.get_user_id()
-    
-# =============================================================================
-# INTEGRAÇÃO: SUPABASE (MULTI-USER MODE)
+# SUPABASE - POOL DE CONEXÕES DO PROCESSO + CONTEXTO POR USUÁRIO
 # =============================================================================
 
-import os
-import streamlit as st
-from supabase import create_client, Client
-
+@st.cache_resource
+def get_gerenciador_supabase(url, key):
+    """Um gerenciador (pool HTTP keep-alive) por processo, reaproveitado entre reruns e sessões"""
+    return GerenciadorSupabase(url, key)
 
-def init_supabase() -> Client | None:
+def init_supabase() -> GerenciadorSupabase | None:
     """
-    Inicializa o cliente Supabase.
+    Obtém o gerenciador de clientes Supabase.
 
     Compatível com:
     - Streamlit Cloud (st.secrets)
     - Ambiente local (.env / variáveis de ambiente)
-
-    NÃO usa options, persist_session ou auto_refresh_token
-    (incompatíveis / instáveis no Streamlit).
     """
     try:
-        # Streamlit Cloud / Produção
-        url = st.secrets.get("SUPABASE_URL")
-        key = st.secrets.get("SUPABASE_KEY")
-
+        url, key = ler_credenciais(st.secrets)
         if url and key:
-            return create_client(url, key)
-
-        # Fallback: ambiente local
-        url = os.getenv("SUPABASE_URL")
-        key = os.getenv("SUPABASE_KEY")
-
-        if url and key:
-            return create_client(url, key)
+            return get_gerenciador_supabase(url, key)
 
         st.error("❌ SUPABASE_URL ou SUPABASE_KEY não configurados.")
         return None
@@ -944,19 +887,52 @@ def init_supabase() -> Client | None:
         return None
 
 
-# Inicializar Supabase
-supabase: Client | None = init_supabase()
+gerenciador_supabase = init_supabase()
+
+if not gerenciador_supabase:
+    st.error("❌ Erro ao conectar com Supabase. Verifique as configurações.")
+    st.stop()
+
+@st.cache_resource
+def get_catalogo_templates():
+    """Catálogo de templates públicos único por processo (compartilhado entre sessões)"""
+    return CatalogoTemplates(ttl_segundos=600)
+
+def carregar_catalogo_templates(supabase):
+    """Catálogo de templates públicos (uma linha por template)"""
+    response = supabase.table("templates")\
+        .select("id, user_id, concurso, cargo, nome, descricao, materias, clones")\
+        .order("clones", desc=True)\
+        .order("id")\
+        .execute()
+    return response.data or []
+
+def carregar_materias_template(supabase, template):
+    """Matérias e tópicos de um template (linhas do edital do criador)"""
+    return [
+        {"materia": linha['materia'], "topicos": linha['topicos']}
+        for linha in get_materias_edital(supabase, template['criador_id'], template['concurso'])
+        if linha.get('is_template')
+    ]
+
+# Aquecimento do catálogo na primeira execução do processo (contexto anônimo)
+get_catalogo_templates().aquecer_em_segundo_plano(lambda: carregar_catalogo_templates(gerenciador_supabase.anonimo))
 
 # =============================================================================
 # MULTI-USER: AUTENTICAÇÃO
 # =============================================================================
 
-if not supabase:
-    st.error("❌ Erro ao conectar com Supabase. Verifique as configurações.")
-    st.stop()
+# Cliente de autenticação próprio desta sessão do navegador (sessão GoTrue isolada)
+if 'auth_cliente' not in st.session_state:
+    st.session_state.auth_cliente = gerenciador_supabase.cliente_auth()
+
+@st.cache_resource
+def get_limitador_login():
+    """Limitador de tentativas de login (email e IP) compartilhado pelo processo"""
+    return LoginRateLimiter()
 
 # Inicializar gerenciador de autenticação
-auth = AuthManager(supabase)
+auth = AuthManager(gerenciador_supabase.contexto_login(st.session_state.auth_cliente), get_limitador_login())
 
 # Verificar autenticação
 if not auth.is_authenticated():
@@ -965,6 +941,11 @@ if not auth.is_authenticated():
 
 # Usuário autenticado
 user_id = auth.get_user_id()
+# Diagnósticos do processo (limitador de login, chamadas de auth, payload) só para admins
+usuario_admin = str(user_id) in ler_admins(st.secrets)
+
+# Queries do usuário: contexto com o JWT dele sobre o pool compartilhado (RLS no servidor)
+supabase = gerenciador_supabase.contexto(user_id, auth.get_access_token())
 
 
 # ============================================================================
@@ -972,45 +953,24 @@ user_id = auth.get_user_id()
 # ============================================================================
 
 def listar_templates_publicos(supabase):
-    """Lista todos os templates públicos disponíveis"""
+    """Lista todos os templates públicos disponíveis (catálogo em cache no processo)"""
     try:
-        response = supabase.table("editais_materias")\
-            .select("concurso, cargo, template_nome, template_descricao, template_clones")\
-            .eq("is_template", True)\
-            .execute()
-        
-        if response.data:
-            templates = {}
-            for item in response.data:
-                concurso = item['concurso']
-                if concurso not in templates:
-                    templates[concurso] = {
-                        'cargo': item['cargo'],
-                        'nome': item.get('template_nome', concurso),
-                        'descricao': item.get('template_descricao', ''),
-                        'clones': item.get('template_clones', 0)
-                    }
-            return templates
-        return {}
+        return get_catalogo_templates().templates(lambda: carregar_catalogo_templates(supabase))
     except Exception as e:
         st.error(f"Erro ao listar templates: {e}")
         return {}
 
-def visualizar_template(supabase, concurso_template):
-    """Mostra as matérias e tópicos de um template"""
+def visualizar_template(supabase, template_id):
+    """Mostra as matérias e tópicos de um template (catálogo em cache no processo)"""
     try:
-        response = supabase.table("editais_materias")\
-            .select("materia, topicos")\
-            .eq("concurso", concurso_template)\
-            .eq("is_template", True)\
-            .execute()
-        
-        return response.data if response.data else []
+        catalogo = get_catalogo_templates()
+        catalogo.templates(lambda: carregar_catalogo_templates(supabase))
+        return catalogo.materias(template_id, lambda template: carregar_materias_template(supabase, template))
     except Exception as e:
         st.error(f"Erro ao visualizar template: {e}")
         return []
 
-def clonar_template(supabase, concurso_origem, novo_concurso, novo_cargo, user_id, data_prova=None):
+def clonar_template(supabase, template_id, novo_concurso, novo_cargo, user_id, data_prova=None):
     """Clona um template para o usuário"""
     try:
         check = supabase.table("editais_materias")\
@@ -1023,17 +983,14 @@ def clonar_template(supabase, concurso_origem, novo_concurso, novo_cargo, user_i
         if check.data:
             return {'success': False, 'message': f'Você já tem um concurso chamado "{novo_concurso}"!'}
         
-        materias = supabase.table("editais_materias")\
-            .select("materia, topicos")\
-            .eq("concurso", concurso_origem)\
-            .eq("is_template", True)\
-            .execute()
+        template = listar_templates_publicos(supabase).get(template_id)
+        materias = visualizar_template(supabase, template_id) if template else []
         
-        if not materias.data:
+        if not materias:
             return {'success': False, 'message': 'Template não encontrado!'}
         
-        clonados = 0
-        for materia_data in materias.data:
+        payloads = []
+        for materia_data in materias:
             payload = {
                 "concurso": novo_concurso,
                 "cargo": novo_cargo,
@@ -1046,14 +1003,14 @@ def clonar_template(supabase, concurso_origem, novo_concurso, novo_cargo, user_i
             if data_prova:
                 payload["data_prova"] = data_prova.strftime("%Y-%m-%d")
             
-            supabase.table("editais_materias").insert(payload).execute()
-            clonados += 1
+            payloads.append(payload)
         
-        supabase.table("editais_materias")\
-            .update({"template_clones": supabase.rpc('increment', {'x': 1})})\
-            .eq("concurso", concurso_origem)\
-            .eq("is_template", True)\
-            .execute()
+        criar_materias(payloads)
+        clonados = len(payloads)
+        
+        # Contador de clones: incremento atômico no servidor
+        supabase.rpc("templates_registrar_clone", {"p_template_id": template['id']}).execute()
+        get_catalogo_templates().invalidar()
         
         return {'success': True, 'message': f'✅ Template clonado! {clonados} matéria(s) adicionada(s).'}
         
@@ -1064,27 +1021,33 @@ def transformar_em_template(supabase, concurso, user_id, nome_template, descrica
     """Transforma seu edital em um template público"""
     try:
         check = supabase.table("editais_materias")\
-            .select("id")\
+            .select("id, cargo")\
             .eq("concurso", concurso)\
             .eq("user_id", user_id)\
-            .limit(1)\
             .execute()
         
         if not check.data:
             return {'success': False, 'message': 'Edital não encontrado!'}
         
+        # Matérias ficam visíveis para clonagem; os metadados vão para o catálogo
         supabase.table("editais_materias")\
-            .update({
-                "is_template": True,
-                "template_criador_id": user_id,
-                "template_nome": nome_template,
-                "template_descricao": descricao,
-                "template_clones": 0
-            })\
+            .update({"is_template": True})\
             .eq("concurso", concurso)\
             .eq("user_id", user_id)\
             .execute()
         
+        supabase.table("templates")\
+            .upsert({
+                "user_id": user_id,
+                "concurso": concurso,
+                "cargo": check.data[0].get('cargo'),
+                "nome": nome_template,
+                "descricao": descricao,
+                "materias": len(check.data)
+            }, on_conflict="user_id,concurso")\
+            .execute()
+        get_catalogo_templates().invalidar()
+        
         return {'success': True, 'message': f'✅ Edital "{concurso}" agora é um template público!'}
         
     except Exception as e:
@@ -1093,34 +1056,25 @@ def transformar_em_template(supabase, concurso, user_id, nome_template, descrica
 def remover_de_templates(supabase, concurso, user_id):
     """Remove um edital dos templates públicos (volta a ser privado)"""
     try:
-        # Verificar se o edital pertence ao usuário e é um template
-        check = supabase.table("editais_materias")\
-            .select("id, is_template, template_criador_id")\
+        # Verificar se o template existe e pertence ao usuário (criador)
+        check = supabase.table("templates")\
+            .select("id")\
             .eq("concurso", concurso)\
             .eq("user_id", user_id)\
-            .eq("is_template", True)\
             .limit(1)\
             .execute()
         
         if not check.data:
             return {'success': False, 'message': 'Template não encontrado ou você não é o criador!'}
         
-        # Verificar se é o criador
-        if check.data[0].get('template_criador_id') != user_id:
-            return {'success': False, 'message': 'Você não pode remover templates criados por outros usuários!'}
-        
-        # Remover do templates (volta a ser privado)
+        # Remover do catálogo (o edital volta a ser privado)
+        supabase.table("templates").delete().eq("id", check.data[0]['id']).eq("user_id", user_id).execute()
         supabase.table("editais_materias")\
-            .update({
-                "is_template": False,
-                "template_criador_id": None,
-                "template_nome": None,
-                "template_descricao": None,
-                "template_clones": 0
-            })\
+            .update({"is_template": False})\
             .eq("concurso", concurso)\
             .eq("user_id", user_id)\
             .execute()
+        get_catalogo_templates().invalidar()
         
         return {'success': True, 'message': f'✅ Edital "{concurso}" removido dos templates públicos!'}
         
@@ -1128,27 +1082,10 @@ def remover_de_templates(supabase, concurso, user_id):
         return {'success': False, 'message': f'❌ Erro: {str(e)}'}
 
 def listar_meus_templates(supabase, user_id):
-    """Lista os templates públicos criados pelo usuário"""
+    """Lista os templates públicos criados pelo usuário (recorte do catálogo em cache)"""
     try:
-        response = supabase.table("editais_materias")\
-            .select("concurso, cargo, template_nome, template_descricao, template_clones")\
-            .eq("is_template", True)\
-            .eq("template_criador_id", user_id)\
-            .execute()
-        
-        if response.data:
-            templates = {}
-            for item in response.data:
-                concurso = item['concurso']
-                if concurso not in templates:
-                    templates[concurso] = {
-                        'cargo': item['cargo'],
-                        'nome': item.get('template_nome', concurso),
-                        'descricao': item.get('template_descricao', ''),
-                        'clones': item.get('template_clones', 0)
-                    }
-            return templates
-        return {}
+        templates = get_catalogo_templates().templates(lambda: carregar_catalogo_templates(supabase))
+        return {t: info for t, info in templates.items() if info['criador_id'] == user_id}
     except Exception as e:
         st.error(f"Erro ao listar seus templates: {e}")
         return {}
@@ -1468,59 +1405,348 @@ def apply_styles():
         </style>
     """, unsafe_allow_html=True)
 
-# --- INICIALIZAÇÃO OBRIGATÓRIA (ÚNICA) ---
-if 'missao_ativa' not in st.session_state:
-    # Tentar carregar a missão principal primeiro
-    missao_carregada = None
-    
+# --- SNAPSHOT DO USUÁRIO (edital + configurações em uma única requisição) ---
+@st.cache_data(ttl=600)
+def get_snapshot_usuario(user_id):
+    """Editais e linha de user_settings do usuário via RPC snapshot_usuario"""
+    if not supabase:
+        return {"editais": {}, "settings": {}}
     try:
-        ed = get_editais(supabase, user_id)
-        if ed:
-            # PASSO 1: Tentar buscar missão principal do banco
-            try:
-                res_principal = supabase.table("editais_materias").select("concurso").eq("is_principal", True).limit(1).eq("user_id", user_id).execute()
-                if res_principal.data and len(res_principal.data) > 0:
-                    missao_principal = res_principal.data[0]['concurso']
-                    # Verificar se ainda existe
-                    if missao_principal in ed:
-                        missao_carregada = missao_principal
-            except:
-                pass
-            
-            # PASSO 2: Se não encontrou missão principal, pega a primeira
-            if not missao_carregada:
-                missao_carregada = list(ed.keys())[0]
-        
-        st.session_state.missao_ativa = missao_carregada
+        response = supabase.rpc("snapshot_usuario", {"p_user_id": user_id}).execute()
+        dados_snapshot = response.data or {}
+        return {
+            "editais": montar_editais(dados_snapshot.get('editais') or []),
+            "settings": dados_snapshot.get('settings') or {},
+        }
     except Exception:
-        st.session_state.missao_ativa = None
+        return {"editais": {}, "settings": {}}
+
+def salvar_configuracoes(**campos):
+    """Grava campos de user_settings com um único upsert (missão principal, metas, nota de corte)"""
+    supabase.table("user_settings").upsert({
+        "user_id": user_id,
+        **campos,
+        "updated_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+    }, on_conflict="user_id").execute()
+    get_snapshot_usuario.clear()
+
+configuracoes = get_snapshot_usuario(user_id)["settings"]
+
+# --- INICIALIZAÇÃO OBRIGATÓRIA (ÚNICA) ---
+if 'missao_ativa' not in st.session_state:
+    # Missão principal (user_settings) se ainda existir; senão, a primeira do edital
+    ed = get_snapshot_usuario(user_id)["editais"]
+    missao_principal = configuracoes.get('missao_principal')
+    if missao_principal in ed:
+        st.session_state.missao_ativa = missao_principal
+    else:
+        st.session_state.missao_ativa = list(ed.keys())[0] if ed else None
 
 if 'nota_corte_alvo' not in st.session_state:
-    st.session_state.nota_corte_alvo = 80
+    st.session_state.nota_corte_alvo = configuracoes.get('nota_corte_alvo', 80)
 
 # Helper function to load all data
 # --- CACHE DE QUERIES SUPABASE (Performance Boost) ---
-@st.cache_data(ttl=300)  # Cache de 5 minutos
-def get_estudos_cached(missao):
-    """Busca registros de estudos com cache para melhor performance"""
+# Colunas declaradas por página. O carregamento principal busca uma única vez o
+# superset (união, COLUNAS_ESTUDOS) em cache — é essa a projeção real do select; o texto livre ('comentarios') nunca entra nele e é
+# buscado sob demanda apenas para os registros exibidos (Histórico, edição, etc).
+COLUNAS_METRICAS = ["id", "data_estudo", "materia", "assunto", "acertos", "total", "tempo", "taxa"]
+COLUNAS_REVISAO = ["dificuldade", "relevancia", "rev_24h", "rev_07d", "rev_15d", "rev_30d"]
+COLUNAS_POR_PAGINA = {
+    "Home": COLUNAS_METRICAS,
+    "Templates": [],
+    "Guia Semanal": COLUNAS_METRICAS + ["relevancia"],
+    "Revisões": COLUNAS_METRICAS + COLUNAS_REVISAO,
+    "Questões": [],
+    "Registrar": [],
+    "Dashboard": COLUNAS_METRICAS + ["relevancia"],
+    "Simulados": COLUNAS_METRICAS,
+    "Histórico": COLUNAS_METRICAS + COLUNAS_REVISAO,
+    "Relatórios": COLUNAS_METRICAS,
+    "Configurar": [],
+}
+COLUNAS_ESTUDOS = list(dict.fromkeys(["concurso"] + [c for cols in COLUNAS_POR_PAGINA.values() for c in cols]))
+COLUNAS_TEXTO = ["comentarios"]
+
+@st.cache_data(ttl=300)
+def get_comentarios_cached(ids, user_id):
+    """Busca sob demanda as anotações (texto livre) de um conjunto de registros"""
+    if not supabase or not ids:
+        return {}
+    comentarios = {}
+    try:
+        # Lotes pequenos para não estourar o tamanho da URL do filtro 'in'
+        ids = list(ids)
+        for i in range(0, len(ids), 200):
+            response = supabase.table("registros_estudos").select("id, " + ", ".join(COLUNAS_TEXTO)).in_("id", ids[i:i + 200]).eq("user_id", user_id).execute()
+            for r in response.data:
+                comentarios[r['id']] = r.get('comentarios') or ''
+        return comentarios
+    except Exception:
+        return comentarios
+
+def anexar_comentarios(df_base):
+    """Retorna uma cópia do DataFrame com a coluna 'comentarios' dos registros exibidos"""
+    if df_base.empty:
+        return df_base
+    df_com = df_base.copy()
+    ids = tuple(sorted(df_com['id'].tolist()))
+    df_com['comentarios'] = df_com['id'].map(get_comentarios_cached(ids, user_id)).fillna('')
+    return df_com
+
+def medir_payload_bytes(df_base, colunas=None):
+    """Tamanho aproximado, em bytes JSON, dos registros (opcionalmente projetados)"""
+    if df_base.empty:
+        return 0
+    if colunas is not None:
+        df_base = df_base[[c for c in colunas if c in df_base.columns]]
+        if df_base.columns.empty:
+            return 0
+    return len(df_base.to_json(orient="records", force_ascii=False).encode("utf-8"))
+
+@st.cache_data(ttl=300)
+def get_amostra_payload(missao, user_id, versao, limite=200):
+    """Bytes JSON de select("*") vs a projeção COLUNAS_ESTUDOS, medidos na mesma amostra de registros"""
+    if not supabase or not missao:
+        return 0, 0, 0
+    response = supabase.table("registros_estudos").select("*")\
+        .eq("user_id", user_id).eq("concurso", missao).eq("tipo", "estudo")\
+        .limit(limite).execute()
+    amostra = pd.DataFrame(response.data or [])
+    return len(amostra), medir_payload_bytes(amostra), medir_payload_bytes(amostra, COLUNAS_ESTUDOS)
+
+# Ordenações do Histórico: (coluna da chave, decrescente?) — desempate sempre por id
+ORDENACAO_HISTORICO = {
+    "Mais Recente": ("data_estudo", True),
+    "Mais Antigo": ("data_estudo", False),
+    "Maior Taxa": ("taxa", True),
+    "Menor Taxa": ("taxa", False),
+    "Maior Relevância": ("relevancia", True),
+}
+
+@st.cache_data(ttl=300)
+def get_historico_pagina(missao, user_id, materia, relevancia, ordem, cursor, tamanho):
+    """Busca uma página do histórico via paginação por chave (coluna de ordenação, id)"""
     if not supabase:
-        return []
+        return [], False
+    coluna, desc = ORDENACAO_HISTORICO.get(ordem, ("data_estudo", True))
     try:
-        response = supabase.table("registros_estudos").select("*").eq("concurso", missao).order("data_estudo", desc=True).eq("user_id", user_id).execute()
-        return response.data
+        colunas = ", ".join(COLUNAS_POR_PAGINA["Histórico"] + COLUNAS_TEXTO)
+        query = supabase.table("registros_estudos").select(colunas).eq("concurso", missao).eq("tipo", "estudo").eq("user_id", user_id)
+        if materia != "Todas":
+            query = query.eq("materia", materia)
+        if relevancia != "Todas":
+            query = query.eq("relevancia", int(relevancia))
+        if cursor is not None:
+            # Continua estritamente depois da última linha da página anterior
+            valor, ultimo_id = cursor
+            op = "lt" if desc else "gt"
+            query = query.or_(f"{coluna}.{op}.{valor},and({coluna}.eq.{valor},id.{op}.{ultimo_id})")
+        # Busca uma linha extra só para saber se existe próxima página
+        response = query.order(coluna, desc=desc).order("id", desc=desc).limit(tamanho + 1).execute()
+        registros = response.data
+        return registros[:tamanho], len(registros) > tamanho
     except Exception:
-        return []
+        return [], False
+
+@st.cache_resource
+def get_versoes_dados():
+    """Registro de versões de dados compartilhado pelo processo"""
+    return VersoesDados()
+
+@st.cache_resource
+def get_indices_cobertura():
+    """Índices de cobertura por (user_id, missao) -> (versão, índice)"""
+    return {}
+
+def get_indice_cobertura(missao, df_base):
+    """Índice de cobertura da missão, reconstruído apenas quando a versão dos dados muda"""
+    versao = get_versoes_dados().atual(user_id, missao, "estudos")
+    indices = get_indices_cobertura()
+    atual = indices.get((user_id, missao))
+    if atual is None or atual[0] != versao:
+        atual = (versao, IndiceCobertura.construir(df_base))
+        indices[(user_id, missao)] = atual
+    return atual[1]
+
+def registrar_no_indice(missao, registro):
+    """Aplica um registro recém-gravado ao índice e o mantém válido na próxima versão"""
+    versao = get_versoes_dados().atual(user_id, missao, "estudos")
+    indices = get_indices_cobertura()
+    atual = indices.get((user_id, missao))
+    if atual is not None and atual[0] == versao:
+        atual[1].registrar(registro)
+        indices[(user_id, missao)] = (versao + 1, atual[1])
+
+def flash(mensagem, tipo="success"):
+    """Agenda uma mensagem (success/info/warning/error) para o próximo rerun, sem bloquear o script"""
+    st.session_state.setdefault('flash_mensagens', []).append((tipo, mensagem))
+
+def exibir_flash():
+    """Mostra (uma única vez) as mensagens agendadas antes do último st.rerun()"""
+    for tipo, mensagem in st.session_state.pop('flash_mensagens', []):
+        getattr(st, tipo)(mensagem)
+
+def limpar_cache_dados(escopo="estudos"):
+    """Limpa os caches após uma escrita e avança a versão dos dados da missão ativa"""
+    st.cache_data.clear()
+    get_versoes_dados().incrementar(user_id, st.session_state.get('missao_ativa'), escopo)
+
+@st.cache_resource(max_entries=200)
+def get_simulado_materias(missao, user_id, versao):
+    """Notas por matéria de cada simulado ({simulado_id: [linhas]}) na versão informada"""
+    if not supabase:
+        return {}
+    try:
+        response = supabase.table("simulado_materias").select("simulado_id, materia, acertos, total").eq("concurso", missao).eq("user_id", user_id).order("id").execute()
+        por_simulado = {}
+        for linha in response.data:
+            por_simulado.setdefault(linha['simulado_id'], []).append(linha)
+        return por_simulado
+    except Exception:
+        return {}
 
-@st.cache_data(ttl=600)  # Cache de 10 minutos (dados menos voláteis)
-def get_editais_cached(user_id):
-    """Busca editais com cache"""
+@st.cache_resource(max_entries=200)
+def get_analise_vertical(missao, user_id, versao):
+    """Consolidado por matéria de todos os simulados, agregado no servidor"""
+    if not supabase:
+        return {}
+    try:
+        response = supabase.rpc("simulado_materias_consolidado", {"p_concurso": missao, "p_user_id": user_id}).execute()
+        return {linha['materia']: {"ac": int(linha['acertos']), "to": int(linha['total'])} for linha in response.data}
+    except Exception:
+        return {}
+
+def salvar_notas_simulado(simulado_id, missao, notas_por_materia):
+    """Grava as notas por matéria de um simulado e invalida a análise vertical"""
+    supabase.table("simulado_materias").delete().eq("simulado_id", simulado_id).eq("user_id", user_id).execute()
+    linhas = [
+        {"simulado_id": simulado_id, "user_id": user_id, "concurso": missao, "materia": m_name, "acertos": v['ac'], "total": v['to']}
+        for m_name, v in notas_por_materia.items() if v['to'] > 0
+    ]
+    if linhas:
+        supabase.table("simulado_materias").insert(linhas).execute()
+    get_versoes_dados().incrementar(user_id, missao, "simulados")
+
+RESUMO_SEMANA_VAZIO = {
+    "minutos": 0, "questoes": 0, "acertos": 0, "registros": 0,
+    "simulados": 0, "questoes_simulados": 0, "acertos_simulados": 0,
+}
+
+@st.cache_resource(max_entries=200)
+def get_resumo_semanal(missao, user_id, versao):
+    """Rollup por semana ISO ({segunda-feira: linha}) mantido por trigger no banco"""
     if not supabase:
         return {}
     try:
-        return get_editais(supabase, user_id)
+        response = supabase.table("resumo_semanal")\
+            .select("semana, minutos, questoes, acertos, registros, simulados, questoes_simulados, acertos_simulados")\
+            .eq("concurso", missao)\
+            .eq("user_id", user_id)\
+            .order("semana")\
+            .execute()
+        return {datetime.date.fromisoformat(linha.pop('semana')): linha for linha in response.data}
     except Exception:
         return {}
 
+def get_resumo_da_semana(missao, data=None, semanas_atras=0):
+    """Linha do rollup da semana que contém a data (ou de N semanas antes), em O(1)"""
+    data = data or get_br_date()
+    inicio = data - timedelta(days=data.weekday(), weeks=semanas_atras)
+    versoes = get_versoes_dados()
+    # O rollup soma estudos e simulados: muda com a versão de qualquer um dos dois stores
+    versao = (versoes.atual(user_id, missao, "estudos"), versoes.atual(user_id, missao, "registros_simulados"))
+    return get_resumo_semanal(missao, user_id, versao).get(inicio, RESUMO_SEMANA_VAZIO)
+
+@st.cache_resource
+def get_estudos_multi_stores():
+    """Stores de estudos de todas as missões por user_id, compartilhados entre reruns.
+
+    Sem TTL: cada partição é relida só quando a versão dos dados muda.
+    """
+    return {}
+
+def get_estudos_multi(user_id):
+    """Retorna (criando se preciso) o store particionado por concurso do usuário"""
+    stores = get_estudos_multi_stores()
+    if user_id not in stores:
+        stores[user_id] = EstudosMultiMissao(supabase, user_id, get_versoes_dados(), COLUNAS_ESTUDOS)
+    return stores[user_id]
+
+@st.cache_resource
+def get_simulados_multi_stores():
+    """Stores de simulados de todas as missões por user_id, compartilhados entre reruns"""
+    return {}
+
+def get_simulados_multi(user_id):
+    """Retorna (criando se preciso) o store de simulados (tipo = 'simulado') do usuário.
+
+    Usa um escopo de versão próprio: "simulados" continua sendo o das notas por matéria.
+    """
+    stores = get_simulados_multi_stores()
+    if user_id not in stores:
+        stores[user_id] = EstudosMultiMissao(supabase, user_id, get_versoes_dados(), COLUNAS_ESTUDOS,
+                                             tipo="simulado", escopo="registros_simulados")
+    return stores[user_id]
+
+@st.cache_resource
+def get_filas_escrita():
+    """Filas write-behind de inserts por user_id (vivem enquanto o processo viver)"""
+    return {}
+
+def get_fila_escrita(user_id):
+    """Retorna (criando se preciso) a fila de escrita do usuário, persistida em .fila_escrita/"""
+    filas = get_filas_escrita()
+    if user_id not in filas:
+        estudos = get_estudos_multi(user_id)
+
+        def ao_confirmar(tabela, payload, linhas):
+            # Chamado pela thread da fila: o registro já está no banco
+            get_historico_pagina.clear()
+            if linhas:
+                estudos.anexar_local(linhas[0])
+            else:
+                # Reenvio de um insert que já tinha passado: a partição é relida
+                estudos.versoes.incrementar(user_id, payload.get('concurso'), "estudos")
+
+        caminho = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".fila_escrita", f"{user_id}.json")
+        filas[user_id] = FilaEscrita(supabase, caminho, ao_confirmar)
+    return filas[user_id]
+
+@st.cache_resource(ttl=300)
+def get_questoes_stores():
+    """Stores de questões por (user_id, concurso), compartilhados entre reruns"""
+    return {}
+
+def get_questoes_store(user_id, missao):
+    """Retorna (criando se preciso) o store de questões do usuário para o concurso"""
+    stores = get_questoes_stores()
+    chave = (user_id, missao)
+    if chave not in stores:
+        stores[chave] = QuestoesStore(supabase, user_id, missao)
+    return stores[chave]
+
+@st.cache_data(ttl=300)
+def get_revisoes_log_cached(missao, user_id):
+    """Busca o log de revisões (uma linha por revisão concluída) da missão"""
+    if not supabase:
+        return []
+    try:
+        response = supabase.table("revisoes_log")\
+            .select("registro_id, fase, acertos, total, tempo, taxa, data_revisao")\
+            .eq("concurso", missao)\
+            .eq("user_id", user_id)\
+            .order("data_revisao")\
+            .order("id")\
+            .execute()
+        return response.data
+    except Exception:
+        return []
+
+def get_editais_cached(user_id):
+    """Editais do snapshot do usuário (cache de 10 minutos, dados menos voláteis)"""
+    return get_snapshot_usuario(user_id)["editais"]
+
 def carregar_dados():
     if not supabase:
         return {}, pd.DataFrame()
@@ -1528,10 +1754,17 @@ def carregar_dados():
         # Load editais com cache
         editais_data = get_editais_cached(user_id)
         
-        # Load all study records for the active mission com cache
+        # Registros de estudo (sem simulados) da missão ativa: partição do store
+        # multi-missão, carregado uma vez para todos os concursos do usuário
         if st.session_state.missao_ativa:
-            cached_data = get_estudos_cached(st.session_state.missao_ativa)
-            df_raw = pd.DataFrame(cached_data)
+            cached_data = get_estudos_multi(user_id).particao(st.session_state.missao_ativa)
+            # UI otimista: registros ainda na fila de escrita entram no frame local
+            pendentes = get_fila_escrita(user_id).pendentes("registros_estudos", concurso=st.session_state.missao_ativa)
+            # (sem id até a confirmação: 'pendente' os tira das ações por id, como as revisões)
+            pendentes = [{**{c: linha.get(c) for c in COLUNAS_ESTUDOS}, "pendente": True} for linha in pendentes]
+            df_raw = pd.DataFrame(cached_data + pendentes)
+            if 'pendente' in df_raw.columns:
+                df_raw['pendente'] = df_raw['pendente'].fillna(False).astype(bool)
         else:
             df_raw = pd.DataFrame()
         
@@ -1541,24 +1774,18 @@ def carregar_dados():
         return {}, pd.DataFrame()
 
 # Carregar dados
-dados, df_raw = carregar_dados()
+dados, df_estudos = carregar_dados()
+if not df_estudos.empty and 'materia' in df_estudos.columns:
+    df_estudos['materia'] = df_estudos['materia'].fillna("Desconhecido")
 
 # --- INTEGRAÇÃO: SEPARAÇÃO DE ESTUDOS vs SIMULADOS ---
-if not df_raw.empty:
-    # Garantir que a coluna 'materia' existe e tratar nulos
-    if 'materia' in df_raw.columns:
-        df_raw['materia'] = df_raw['materia'].fillna("Desconhecido")
-        
-        # Filtros Flexíveis para Simulados (Insensível a maiúsculas e variações)
-        simulado_mask = df_raw['materia'].str.upper().str.contains('SIMULADO', na=False)
-        df_simulados = df_raw[simulado_mask].copy()
-        df_estudos = df_raw[~simulado_mask].copy()
-    else:
-        df_simulados = pd.DataFrame()
-        df_estudos = df_raw.copy()
-else:
-    df_simulados = pd.DataFrame()
-    df_estudos = pd.DataFrame()
+# A separação é feita no servidor pela coluna 'tipo'; simulados só são
+# baixados pelas páginas que os exibem.
+def carregar_simulados():
+    """Partição de simulados da missão ativa (carregada sob demanda, sempre com as colunas)"""
+    if not supabase or not st.session_state.missao_ativa:
+        return pd.DataFrame(columns=COLUNAS_ESTUDOS)
+    return pd.DataFrame(get_simulados_multi(user_id).particao(st.session_state.missao_ativa), columns=COLUNAS_ESTUDOS)
 
 # Alias para compatibilidade com código existente (que usa 'df')
 # ONDE O CÓDIGO USA 'df', ELE DEVE USAR 'df_estudos' AGORA PARA MÉTRICAS DE ROTINA
@@ -1568,7 +1795,7 @@ df = df_estudos
 if not dados.get('missoes'):
     if 'missao_ativa' not in st.session_state:
         try:
-            ed = get_editais(supabase, user_id)
+            ed = get_editais_cached(user_id)
             if ed:
                 st.session_state.missao_ativa = list(ed.keys())[0]
             else:
@@ -1582,12 +1809,12 @@ if 'edit_id' not in st.session_state:
 if 'edit_id_simulado' not in st.session_state:
     st.session_state.edit_id_simulado = None
 
-# Inicializar estados das metas semanais
+# Inicializar estados das metas semanais (persistidas em user_settings)
 if 'meta_horas_semana' not in st.session_state:
-    st.session_state.meta_horas_semana = 22
+    st.session_state.meta_horas_semana = configuracoes.get('meta_horas_semana', 22)
 
 if 'meta_questoes_semana' not in st.session_state:
-    st.session_state.meta_questoes_semana = 350
+    st.session_state.meta_questoes_semana = configuracoes.get('meta_questoes_semana', 350)
 
 # Inicializar estados para controle de interface
 if 'editando_metas' not in st.session_state:
@@ -2105,41 +2332,65 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # --- NOVA FUNÇÃO: Processar assuntos em massa ---
-def processar_assuntos_em_massa(texto, separador=";"):
+# Separadores aceitos na importação de assuntos (quebra de linha sempre separa)
+SEPARADORES_ASSUNTOS = {";": ";", ",": ",", ".": ".", "-": "-", "|": "|", "linha": "\n", "ponto": "."}
+PADROES_ASSUNTOS = {
+    chave: re.compile(r"[^" + re.escape(sep) + r"\r\n]+") for chave, sep in SEPARADORES_ASSUNTOS.items()
+}
+# Pontuação/símbolos nas bordas (mantém letras acentuadas e dígitos)
+RE_BORDAS_ASSUNTO = re.compile(r"^[\W_]+|[\W_]+$")
+LOTE_TOPICOS = 200
+
+def processar_assuntos_em_massa(texto, separador=";", existentes=()):
     """
-    Processa um texto com múltiplos assuntos separados por um separador.
-    Retorna uma lista limpa de assuntos.
+    Separa um texto colado (ex.: conteúdo programático de um PDF) em assuntos numa
+    única passada de regex, limpa as bordas e deduplica sem diferenciar acentos e
+    maiúsculas, inclusive contra os assuntos já existentes.
+    Retorna (novos, ignorados).
     """
     if not texto:
-        return []
-    
-    # Remove espaços em branco no início e fim
-    texto = texto.strip()
-    
-    # Processa baseado no separador
-    if separador == ";":
-        assuntos = texto.split(";")
-    elif separador == ",":
-        assuntos = texto.split(",")
-    elif separador == "linha":
-        # Divide por quebras de linha
-        assuntos = texto.split("\n")
-    elif separador == "ponto":
-        # Divide por ponto
-        assuntos = texto.split(".")
-    else:
-        assuntos = [texto]
-    
-    # Limpa cada assunto
-    assuntos_limpos = []
-    for assunto in assuntos:
-        assunto = assunto.strip()
-        # Remove caracteres especiais no início/fim
-        assunto = re.sub(r'^[^a-zA-Z0-9]*|[^a-zA-Z0-9]*$', '', assunto)
-        if assunto:  # Só adiciona se não estiver vazio
-            assuntos_limpos.append(assunto)
-    
-    return assuntos_limpos
+        return [], []
+    
+    padrao = PADROES_ASSUNTOS.get(separador, PADROES_ASSUNTOS["linha"])
+    vistos = {normalizar_nome(t) for t in existentes}
+    novos, ignorados = [], []
+    for trecho in padrao.finditer(texto):
+        assunto = RE_BORDAS_ASSUNTO.sub("", trecho.group())
+        if not assunto:
+            continue
+        chave = normalizar_nome(assunto)
+        if chave in vistos:
+            ignorados.append(assunto)
+        else:
+            vistos.add(chave)
+            novos.append(assunto)
+    return novos, ignorados
+
+def criar_materias(linhas):
+    """Insere matérias (editais_materias) e os tópicos de cada uma como linhas de topicos.
+
+    Cada linha pode trazer "topicos": [...]; a lista vai para a tabela topicos
+    (em lotes) e não para o array legado editais_materias.topicos.
+    """
+    linhas = [dict(linha) for linha in linhas]
+    nomes_por_linha = [linha.pop('topicos', None) or [] for linha in linhas]
+    criadas = supabase.table("editais_materias").insert(linhas).execute().data or []
+    topicos = [
+        {"materia_id": criada['id'], "user_id": criada.get('user_id', user_id), "nome": nome, "ordem": ordem}
+        for criada, nomes in zip(criadas, nomes_por_linha)
+        for ordem, nome in enumerate(dict.fromkeys(n.strip() for n in nomes if n and n.strip()), start=1)
+    ]
+    for inicio in range(0, len(topicos), LOTE_TOPICOS):
+        supabase.table("topicos").insert(topicos[inicio:inicio + LOTE_TOPICOS]).execute()
+    return criadas
+
+def inserir_topicos(materia_id, assuntos, ordem_inicial=0):
+    """Insere os assuntos como linhas de topicos em lotes (a ordem continua a existente)"""
+    for inicio in range(0, len(assuntos), LOTE_TOPICOS):
+        supabase.table("topicos").insert([
+            {"materia_id": materia_id, "user_id": user_id, "nome": assunto, "ordem": ordem_inicial + inicio + i + 1}
+            for i, assunto in enumerate(assuntos[inicio:inicio + LOTE_TOPICOS])
+        ]).execute()
 
 # --- 2. FUNÇÕES AUXILIARES ---
 def calcular_countdown(data_str):
@@ -2258,100 +2509,51 @@ def calcular_datas_streak(df):
     
     return inicio_streak, fim_streak
 
-def calcular_estudos_semana(df):
-    """Calcula o total de horas e questões da semana atual."""
-    if df is None or df.empty:
-        return 0, 0
-    
-    hoje = datetime.date.today()
-    inicio_semana = hoje - datetime.timedelta(days=hoje.weekday())  # Segunda-feira
-    fim_semana = inicio_semana + datetime.timedelta(days=6)  # Domingo
-    
-    try:
-        df['data_estudo_date'] = pd.to_datetime(df['data_estudo']).dt.date
-        df_semana = df[(df['data_estudo_date'] >= inicio_semana) & (df['data_estudo_date'] <= fim_semana)]
-        
-        horas_semana = df_semana['tempo'].sum() / 60
-        questoes_semana = df_semana['total'].sum()
-        
-        return horas_semana, questoes_semana
-    except (ValueError, TypeError, KeyError):
+def calcular_estudos_semana(resumo):
+    """Total de horas e questões de estudo de uma linha do rollup semanal."""
+    if not resumo:
         return 0, 0
+    return resumo['minutos'] / 60, resumo['questoes']
 
-# --- FUNÇÃO CORRIGIDA: calcular_projecao_conclusao (BUG FIXED) ---
-def calcular_projecao_conclusao(df, dados_edital):
+# --- FUNÇÃO CORRIGIDA: calcular_projecao_conclusao (motor de séries temporais) ---
+def calcular_projecao_conclusao(df, dados_edital, indice=None):
     """
-    Calcula o ritmo de estudo e projeta a data de conclusão do edital.
-    CORRIGIDO: Agora calcula corretamente o ritmo (tópicos únicos por dia de estudo).
+    Projeta a data de conclusão do edital com ritmo em janelas móveis (7/30/90 dias),
+    datas de término por matéria e comparação com a data da prova.
+    Usa o índice de cobertura (montado a partir de df se não for informado).
     """
     if not dados_edital or 'materias' not in dados_edital:
         return None
-    
-    # 1. Total de Tópicos no Edital
-    total_topicos = 0
-    for materia, topicos in dados_edital['materias'].items():
-        total_topicos += len(topicos)
-    
-    if total_topicos == 0:
-        return None
-        
-    # 2. Tópicos Estudados (Únicos)
-    if df.empty:
-        estudados = 0
-    else:
-        # Consideramos apenas tópicos que existem no edital atual
-        todos_topicos_edital = []
-        for materia, topicos in dados_edital['materias'].items():
-            todos_topicos_edital.extend(topicos)
-        
-        # Filtra registros que batem com o edital e conta únicos
-        estudados = df[df['assunto'].isin(todos_topicos_edital)]['assunto'].nunique()
-    
-    restantes = total_topicos - estudados
-    progresso_pct = (estudados / total_topicos * 100) if total_topicos > 0 else 0
-    
-    # 3. Ritmo (Pace) - CORREÇÃO DO BUG AQUI
-    if df.empty or estudados == 0:
-        ritmo_diario = 0
-    else:
-        # Calcular ritmo REAL: tópicos únicos por dia de estudo
-        # Buscar datas únicas com estudo (apenas para tópicos do edital)
-        df_filtrado = df[df['assunto'].isin(todos_topicos_edital)] if not df.empty else df
-        if not df_filtrado.empty and 'data_estudo' in df_filtrado.columns:
-            try:
-                # Converter datas e pegar únicas
-                datas_estudo = pd.to_datetime(df_filtrado['data_estudo']).dt.date
-                dias_com_estudo = len(set(datas_estudo))
-                
-                if dias_com_estudo > 0:
-                    ritmo_diario = estudados / dias_com_estudo  # Tópicos únicos por dia de estudo
-                else:
-                    ritmo_diario = 0
-            except Exception:
-                ritmo_diario = 0
-        else:
-            ritmo_diario = 0
-    
-    # Garantir ritmo mínimo para não dividir por zero
-    ritmo_diario = max(ritmo_diario, 0.001)
-    
-    # 4. Calcular projeção
-    if ritmo_diario > 0:
-        dias_para_fim = int(restantes / ritmo_diario)
-        data_fim = get_br_date() + timedelta(days=dias_para_fim)
-    else:
-        dias_para_fim = None
-        data_fim = None
-    
-    return {
-        "total": total_topicos,
-        "estudados": estudados,
-        "restantes": restantes,
-        "progresso": progresso_pct,
-        "ritmo": ritmo_diario * 7, # Tópicos por semana para exibição
-        "dias_para_fim": dias_para_fim,
-        "data_fim": data_fim
-    }
+    if indice is None:
+        indice = IndiceCobertura.construir(df)
+    try:
+        data_prova = pd.to_datetime(dados_edital['data_prova']).date() if dados_edital.get('data_prova') else None
+    except (ValueError, TypeError):
+        data_prova = None
+    return projetar_edital(indice, dados_edital['materias'], get_br_date(), data_prova)
+
+@st.cache_resource(ttl=300, max_entries=100)
+def get_prioridades_cached(user_id, missao, versao, hoje, _df_estudos):
+    """Matrizes do motor de prioridades por versão dos dados (Home, Guia Semanal e PDF)"""
+    return construir_matrizes(_df_estudos, hoje)
+
+def versao_estudos(missao):
+    """Chave dos caches derivados: versão dos dados + registros ainda na fila de escrita.
+
+    Os registros pendentes entram no df_estudos (UI otimista) antes de mudar a
+    versão, então a chave muda ao enfileirar, ao confirmar e ao rejeitar.
+    """
+    pendentes = get_fila_escrita(user_id).pendentes("registros_estudos", concurso=missao)
+    return (get_versoes_dados().atual(user_id, missao, "estudos"), tuple(p['idempotency_key'] for p in pendentes))
+
+def get_prioridades(missao, df_base):
+    """Atalho para as matrizes de prioridade da missão na versão atual dos dados"""
+    return get_prioridades_cached(user_id, missao, versao_estudos(missao), get_br_date(), df_base)
+
+@st.cache_resource(ttl=300, max_entries=100)
+def get_projecao_cached(user_id, missao, versao, hoje, edital_chave, _df_estudos, _dados_edital, _indice):
+    """Projeção do edital por versão dos dados: compartilhada por Relatórios e PDF"""
+    return calcular_projecao_conclusao(_df_estudos, _dados_edital, _indice)
 
 # --- FUNÇÃO REMOVIDA: gerar_calendario_estudos (bolinhas) ---
 
@@ -2394,6 +2596,8 @@ def calcular_revisoes_pendentes(df_estudos, filtro_rev, filtro_dif):
         return pend
         
     for _, row in df_estudos.iterrows():
+        if row.get('pendente', False):
+            continue  # Ainda na fila de escrita: sem id para concluir a revisão
         dt_est = pd.to_datetime(row['data_estudo']).date()
         dias = (hoje - dt_est).days
         tx = row.get('taxa', 0)
@@ -2438,9 +2642,130 @@ def calcular_revisoes_pendentes(df_estudos, filtro_rev, filtro_dif):
     
     return pend
 
+# --- DASHBOARD: PREPARAÇÃO MEMOIZADA ---
+PERIODOS_DASHBOARD = {"Última Semana": 7, "Último Mês": 30, "Últimos 3 Meses": 90, "Tudo": None}
+DIAS_ORDEM = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+DIAS_TRAD = {"Monday": "Seg", "Tuesday": "Ter", "Wednesday": "Qua", "Thursday": "Qui", "Friday": "Sex", "Saturday": "Sáb", "Sunday": "Dom"}
+
+@st.cache_resource(ttl=300, max_entries=100)
+def get_dashboard_cached(user_id, missao, versao, periodo, hoje, edital_chave, _df_estudos, _indice):
+    """Dados e figuras (JSON Plotly) do Dashboard por (usuário, missão, versão, período)"""
+    df_base = _df_estudos
+    dias = PERIODOS_DASHBOARD.get(periodo)
+    if not df_base.empty:
+        datas = pd.to_datetime(df_base['data_estudo']).dt.date
+        if dias is not None:
+            df_base = df_base[datas >= (hoje - timedelta(days=dias))]
+            datas = datas[datas >= (hoje - timedelta(days=dias))]
+    painel = {"registros": len(df_base), "cobertura": [], "relevancia": [], "pareto": None, "semana": None, "evolucao": None}
+    
+    # Cobertura do edital: assuntos únicos estudados por matéria (consulta ao índice)
+    desde = (hoje - timedelta(days=dias)) if dias is not None else None
+    for materia, count_total in edital_chave:
+        count_estudados = _indice.assuntos_estudados(materia, desde)
+        porcentagem = (count_estudados / count_total * 100) if count_total > 0 else 0
+        painel["cobertura"].append((materia, count_estudados, count_total, porcentagem))
+    
+    if df_base.empty:
+        painel["metricas"] = {"t_q": 0, "a_q": 0, "minutos": 0, "ontem": None}
+        return painel
+    
+    df_ontem = df_base[datas == hoje - timedelta(days=1)]
+    painel["metricas"] = {
+        "t_q": df_base['total'].sum(),
+        "a_q": df_base['acertos'].sum(),
+        "minutos": int(df_base['tempo'].sum()),
+        "ontem": None if df_ontem.empty else {
+            "t_q": df_ontem['total'].sum(),
+            "a_q": df_ontem['acertos'].sum(),
+            "minutos": int(df_ontem['tempo'].sum()),
+        },
+    }
+    
+    # Desempenho por relevância (média ponderada)
+    if 'relevancia' in df_base.columns:
+        df_rel_dash = df_base.groupby('relevancia').agg({'acertos': 'sum', 'total': 'sum'}).reset_index()
+        df_rel_dash['taxa'] = (df_rel_dash['acertos'] / df_rel_dash['total'] * 100).fillna(0)
+        df_rel_dash['relevancia'] = df_rel_dash['relevancia'].astype(int)
+        painel["relevancia"] = df_rel_dash.sort_values('relevancia', ascending=False)[['relevancia', 'taxa', 'total']].to_dict('records')
+    
+    # Pareto de erros: top 10 assuntos com mais erros
+    df_errors = df_base.groupby(['materia', 'assunto']).agg({'total': 'sum', 'acertos': 'sum'}).reset_index()
+    df_errors['erros'] = df_errors['total'] - df_errors['acertos']
+    df_errors = df_errors.sort_values('erros', ascending=False).head(10)
+    df_errors = df_errors[df_errors['erros'] > 0]
+    if not df_errors.empty:
+        df_errors['label'] = df_errors['assunto'].apply(lambda x: x[:25] + '...' if len(x) > 25 else x)
+        fig_pareto = px.bar(
+            df_errors, x='erros', y='label', orientation='h',
+            template="plotly_dark",
+            color='erros',
+            color_continuous_scale=["#F43F5E", "#E11D48"], # Tons de vermelho
+            text='erros'
+        )
+        fig_pareto.update_layout(
+            paper_bgcolor='rgba(0,0,0,0)',
+            plot_bgcolor='rgba(0,0,0,0)',
+            margin=dict(t=0, b=0, l=0, r=0),
+            xaxis_visible=False,
+            yaxis_title=None,
+            coloraxis_showscale=False,
+            height=280,
+            yaxis={'categoryorder':'total ascending'}
+        )
+        painel["pareto"] = fig_pareto.to_json()
+    
+    # Produtividade por dia da semana (sem alterar o DataFrame de origem)
+    dia_semana = pd.to_datetime(df_base['data_estudo']).dt.day_name()
+    df_week = df_base['tempo'].groupby(dia_semana).sum().reindex(DIAS_ORDEM).fillna(0).rename_axis('weekday').reset_index()
+    df_week['horas'] = df_week['tempo'] / 60
+    df_week['dia_pt'] = df_week['weekday'].map(DIAS_TRAD)
+    fig_bar = px.bar(df_week, x='dia_pt', y='horas', 
+                    template="plotly_dark",
+                    color='horas',
+                    color_continuous_scale=["#8B5CF6", "#06B6D4"])
+    fig_bar.update_layout(
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        margin=dict(t=10, b=0, l=0, r=0),
+        xaxis_title=None,
+        yaxis_title="Horas",
+        coloraxis_showscale=False,
+        height=250
+    )
+    painel["semana"] = fig_bar.to_json()
+    
+    # Evolução de precisão diária (taxa ponderada)
+    df_ev = df_base.sort_values('data_estudo').groupby('data_estudo').agg({'acertos': 'sum', 'total': 'sum'}).reset_index()
+    df_ev['taxa'] = (df_ev['acertos'] / df_ev['total'] * 100).fillna(0)
+    fig_evo = go.Figure()
+    fig_evo.add_trace(go.Scatter(
+        x=df_ev['data_estudo'], y=df_ev['taxa'],
+        name='Precisão Diária',
+        line=dict(color='#8B5CF6', width=2),
+        mode='lines+markers',
+        marker=dict(size=6)
+    ))
+    fig_evo.update_layout(
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        margin=dict(t=10, b=0, l=0, r=0),
+        xaxis_title=None,
+        yaxis_title="Taxa %",
+        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
+        font=dict(color="#fff"),
+        height=400,
+        yaxis=dict(range=[0, 105], gridcolor='rgba(255,255,255,0.05)')
+    )
+    painel["evolucao"] = fig_evo.to_json()
+    return painel
+
 # --- 3. LÓGICA DE NAVEGAÇÃO ---
+# Mensagens das ações do rerun anterior (ver flash), com ou sem missão ativa
+exibir_flash()
+
 # Verificar se existe pelo menos uma missão cadastrada
-ed = get_editais(supabase, user_id)
+ed = get_editais_cached(user_id)
 
 if not ed and st.session_state.missao_ativa is None:
     # Primeira vez no app - mostrar tela de boas-vindas
@@ -2480,14 +2805,15 @@ if not ed and st.session_state.missao_ativa is None:
                         "cargo": cargo_concurso,
                         "materia": "Geral",
                         "topicos": ["Introdução"],
-                        "is_principal": marcar_principal,
                         "user_id": user_id
                     }
                     if data_prova_input:
                         payload["data_prova"] = data_prova_input.strftime("%Y-%m-%d")
-                    supabase.table("editais_materias").insert(payload).execute()
-                    st.success(f"✅ Missão '{nome_concurso}' criada com sucesso!")
-                    time.sleep(1)
+                    criar_materias([payload])
+                    if marcar_principal:
+                        salvar_configuracoes(missao_principal=nome_concurso)
+                    limpar_cache_dados()
+                    flash(f"✅ Missão '{nome_concurso}' criada com sucesso!")
                     st.session_state.missao_ativa = nome_concurso
                     st.rerun()
                 except Exception as e:
@@ -2596,11 +2922,60 @@ if st.session_state.missao_ativa is not None:
             st.session_state.menu_force = None  # Reset após uso
         else:
             menu = mapa_menu.get(menu_selecionado, "Home")
+        
+        # Diagnóstico (admins): bytes da projeção em cache vs o que um select("*") traria
+        if usuario_admin:
+            with st.expander("📦 Payload de dados", expanded=False):
+                bytes_superset = medir_payload_bytes(df_estudos, COLUNAS_ESTUDOS)
+                st.caption(f"Projeção em cache ({len(df_estudos)} registros, {len(COLUNAS_ESTUDOS)} colunas): {bytes_superset / 1024:.1f} KB")
+                try:
+                    n_amostra, bytes_total, bytes_projecao = get_amostra_payload(
+                        st.session_state.missao_ativa, user_id,
+                        get_versoes_dados().atual(user_id, st.session_state.missao_ativa, "estudos")
+                    )
+                    if bytes_projecao:
+                        fator = bytes_total / bytes_projecao
+                        st.caption(f"select(\"*\") estimado: {bytes_superset * fator / 1024:.1f} KB ({fator:.1f}× — amostra de {n_amostra} registros)")
+                except Exception as e:
+                    st.caption(f"select(\"*\"): amostra indisponível ({e})")
+                st.caption("Texto livre (anotações): carregado sob demanda")
+                chamadas_auth = auth.get_auth_calls()
+                st.caption(f"Chamadas de autenticação: {chamadas_auth['rerun']} neste rerun ({chamadas_auth['total']} na sessão)")
+                metricas_login = get_limitador_login().metrics()
+                st.caption(f"Logins no processo: {metricas_login['allowed']} permitidos, {metricas_login['rejected']} bloqueados")
+
+        # Sincronização da fila de escrita (registros salvos de forma otimista)
+        status_fila = get_fila_escrita(user_id).status()
+        if status_fila['pendentes'] == 0:
+            if status_fila['ultima_sincronizacao']:
+                st.caption("☁️ Registros sincronizados")
+        else:
+            if status_fila['com_falha']:
+                espera = max(0, int((status_fila['proxima_tentativa'] or time.time()) - time.time()))
+                st.warning(f"📴 {status_fila['pendentes']} registro(s) aguardando conexão. Nova tentativa em {espera}s.")
+            else:
+                st.info(f"⏳ Enviando {status_fila['pendentes']} registro(s)...")
+            if st.button("🔄 Sincronizar agora", key="btn_sincronizar_fila", use_container_width=True):
+                get_fila_escrita(user_id).sincronizar_agora()
+                st.rerun()
+        if status_fila['rejeitados']:
+            with st.expander(f"❌ {status_fila['rejeitados']} registro(s) recusado(s) pelo servidor", expanded=True):
+                for item in get_fila_escrita(user_id).rejeitados():
+                    reg = item['payload']
+                    st.caption(f"**{reg.get('materia')}** · {reg.get('assunto')} · {reg.get('data_estudo')}")
+                    st.caption(f"Erro: {item['erro']}")
+                    col_reenviar, col_descartar = st.columns(2)
+                    if col_reenviar.button("🔄 Reenviar", key=f"reenviar_{item['chave']}", use_container_width=True):
+                        get_fila_escrita(user_id).reenviar(item['chave'])
+                        st.rerun()
+                    if col_descartar.button("🗑️ Descartar", key=f"descartar_{item['chave']}", use_container_width=True):
+                        get_fila_escrita(user_id).descartar(item['chave'])
+                        st.rerun()
 
     # --- ABA: HOME (PAINEL GERAL) ---
     if menu == "Home":
         # SELETOR DE MISSÃO no topo
-        ed = get_editais(supabase, user_id)
+        ed = get_editais_cached(user_id)
         if len(ed) > 1:
             st.markdown('<div class="modern-card" style="padding: 15px; margin-bottom: 20px;">', unsafe_allow_html=True)
             col_select, col_btn_trocar = st.columns([4, 1])
@@ -2629,6 +3004,39 @@ if st.session_state.missao_ativa is not None:
                     st.rerun()
             
             st.markdown('</div>', unsafe_allow_html=True)
+            
+            # Comparativo entre missões: lido das partições já em memória (sem nova consulta).
+            # Atrás de um checkbox: o corpo de um expander roda mesmo fechado.
+            if st.checkbox("🔀 Comparativo entre missões", key="mostrar_comparativo_missoes"):
+                multi = get_estudos_multi(user_id)
+                resumo_missoes = multi.resumo_por_concurso()
+                linhas_comp = []
+                for concurso in missoes_disponiveis:
+                    r = resumo_missoes.get(concurso, {"registros": 0, "tempo": 0, "total": 0, "taxa": 0})
+                    topicos_edital = {a for topicos in ed[concurso].get('materias', {}).values() for a in topicos}
+                    cobertura = 0
+                    if topicos_edital and r["registros"]:
+                        indice_c = get_indice_cobertura(concurso, pd.DataFrame(multi.particao(concurso)))
+                        cobertura = indice_c.resumo_edital(ed[concurso]['materias'])[0] / len(topicos_edital) * 100
+                    linhas_comp.append({
+                        "Missão": concurso,
+                        "Tempo": formatar_minutos(r["tempo"]),
+                        "Questões": r["total"],
+                        "Precisão (%)": round(r["taxa"], 1),
+                        "Cobertura do edital (%)": round(cobertura, 1),
+                    })
+                st.dataframe(pd.DataFrame(linhas_comp), hide_index=True, use_container_width=True)
+                
+                compartilhadas = [m for m in multi.materias_compartilhadas() if m["concursos"] & set(missoes_disponiveis)]
+                if compartilhadas:
+                    st.markdown("**Matérias compartilhadas** (somadas uma única vez entre as missões)")
+                    st.dataframe(pd.DataFrame([{
+                        "Matéria": m["materia"],
+                        "Missões": ", ".join(sorted(m["concursos"])),
+                        "Tempo": formatar_minutos(m["tempo"]),
+                        "Questões": m["total"],
+                        "Precisão (%)": round(m["taxa"], 1),
+                    } for m in compartilhadas]), hide_index=True, use_container_width=True)
         
         # Header compacto com título
         st.markdown(f'<h1 style="background: linear-gradient(135deg, #8B5CF6, #06B6D4); -webkit-background-clip: text; -webkit-text-fill-color: transparent; font-size:2rem; margin-bottom:0;">{missao}</h1>', unsafe_allow_html=True)
@@ -2876,11 +3284,8 @@ if st.session_state.missao_ativa is not None:
             
             # Calcular dados da semana
             hoje = get_br_date()
-            inicio_semana = hoje - timedelta(days=hoje.weekday())
-            df_semana = df_estudos[pd.to_datetime(df_estudos['data_estudo']).dt.date >= inicio_semana]
-            
-            horas_semana = df_semana['tempo'].sum() / 60
-            questoes_semana = df_semana['total'].sum()
+            resumo_semana = get_resumo_da_semana(missao, hoje)
+            horas_semana, questoes_semana = calcular_estudos_semana(resumo_semana)
             
             # Meta semanal (usar do session_state ou padrão)
             meta_horas = st.session_state.get('meta_horas_semana', 20)
@@ -2963,15 +3368,8 @@ if st.session_state.missao_ativa is not None:
             st.markdown('<h3 style="margin-top:2rem; color:#fff;">📊 PAINEL DE DESEMPENHO</h3>', unsafe_allow_html=True)
             
             if not df_estudos.empty:
-                # Calcular totais por disciplina
-                df_disciplinas = df_estudos.groupby('materia').agg({
-                    'tempo': 'sum',
-                    'acertos': 'sum',
-                    'total': 'sum'
-                }).reset_index()
-                
-                # Recalcular taxa global por disciplina (média ponderada)
-                df_disciplinas['taxa'] = (df_disciplinas['acertos'] / df_disciplinas['total'] * 100).fillna(0)
+                # Totais e taxa ponderada por disciplina (matriz do motor de prioridades)
+                df_disciplinas = get_prioridades(missao, df_estudos)['materias'][['materia', 'tempo', 'acertos', 'total', 'taxa']].copy()
                 
                 df_disciplinas['erros'] = df_disciplinas['total'] - df_disciplinas['acertos']
                 df_disciplinas['tempo_formatado'] = df_disciplinas['tempo'].apply(formatar_horas_minutos)
@@ -3026,7 +3424,8 @@ if st.session_state.missao_ativa is not None:
             if 'editando_metas' not in st.session_state:
                 st.session_state.editando_metas = False
             
-            horas_semana, questoes_semana = calcular_estudos_semana(df_estudos)
+            horas_semana, questoes_semana = calcular_estudos_semana(resumo_semana)
+            horas_anterior, questoes_anterior = calcular_estudos_semana(get_resumo_da_semana(missao, hoje, semanas_atras=1))
             meta_horas = st.session_state.meta_horas_semana
             meta_questoes = st.session_state.meta_questoes_semana
             
@@ -3069,12 +3468,15 @@ if st.session_state.missao_ativa is not None:
                         col_btn1, col_btn2 = st.columns(2)
                         
                         if col_btn1.form_submit_button("💾 Salvar Metas", use_container_width=True, type="primary"):
-                            st.session_state.meta_horas_semana = nova_meta_horas
-                            st.session_state.meta_questoes_semana = nova_meta_questoes
-                            st.session_state.editando_metas = False
-                            st.success("✅ Metas atualizadas com sucesso!")
-                            time.sleep(1)
-                            st.rerun()
+                            try:
+                                salvar_configuracoes(meta_horas_semana=int(nova_meta_horas), meta_questoes_semana=int(nova_meta_questoes))
+                                st.session_state.meta_horas_semana = nova_meta_horas
+                                st.session_state.meta_questoes_semana = nova_meta_questoes
+                                st.session_state.editando_metas = False
+                                flash("✅ Metas atualizadas com sucesso!")
+                                st.rerun()
+                            except Exception as e:
+                                st.error(f"Erro ao salvar metas: {e}")
                         
                         if col_btn2.form_submit_button("❌ Cancelar", use_container_width=True, type="secondary"):
                             st.session_state.editando_metas = False
@@ -3096,7 +3498,7 @@ if st.session_state.missao_ativa is not None:
                             <div class="modern-progress-fill" style="width: {progresso_horas}%;"></div>
                         </div>
                     </div>
-                    <div class="meta-subtitle">{progresso_horas:.0f}% da meta alcançada</div>
+                    <div class="meta-subtitle">{progresso_horas:.0f}% da meta alcançada · {horas_semana - horas_anterior:+.1f}h vs semana anterior</div>
                 </div>
                 ''', unsafe_allow_html=True)
             
@@ -3111,7 +3513,7 @@ if st.session_state.missao_ativa is not None:
                             <div class="modern-progress-fill" style="width: {progresso_questoes}%;"></div>
                         </div>
                     </div>
-                    <div class="meta-subtitle">{progresso_questoes:.0f}% da meta alcançada</div>
+                    <div class="meta-subtitle">{progresso_questoes:.0f}% da meta alcançada · {int(questoes_semana - questoes_anterior):+d} vs semana anterior</div>
                 </div>
                 ''', unsafe_allow_html=True)
 
@@ -3142,13 +3544,13 @@ if st.session_state.missao_ativa is not None:
             if not templates:
                 st.info("📭 Nenhum template público disponível no momento.")
             else:
-                for concurso, info in templates.items():
-                    with st.expander(f"📚 {info['nome']} ({info['clones']} clone(s))"):
+                for template_id, info in templates.items():
+                    with st.expander(f"📚 {info['nome']} ({info['materias']} matéria(s) · {info['clones']} clone(s))"):
                         st.markdown(f"**Cargo:** {info['cargo']}")
                         if info['descricao']:
                             st.markdown(f"**Descrição:** {info['descricao']}")
                         
-                        materias = visualizar_template(supabase, concurso)
+                        materias = visualizar_template(supabase, template_id)
                         if materias:
                             st.markdown("**Matérias incluídas:**")
                             for mat in materias:
@@ -3162,7 +3564,7 @@ if st.session_state.missao_ativa is not None:
                         
                         st.markdown("---")
                         
-                        with st.form(f"form_clonar_{concurso.replace(' ', '_')}"):
+                        with st.form(f"form_clonar_{template_id}"):
                             st.markdown("#### 🎯 Clonar este template")
                             
                             col1, col2 = st.columns(2)
@@ -3170,26 +3572,26 @@ if st.session_state.missao_ativa is not None:
                                 novo_nome = st.text_input(
                                     "Nome do seu concurso",
                                     placeholder="Ex: TJ-GO 2026",
-                                    key=f"nome_{concurso}"
+                                    key=f"nome_{template_id}"
                                 )
                             with col2:
                                 novo_cargo = st.text_input(
                                     "Cargo",
                                     value=info['cargo'],
-                                    key=f"cargo_{concurso}"
+                                    key=f"cargo_{template_id}"
                                 )
                             
                             data_prova = st.date_input(
                                 "Data da prova (opcional)",
                                 value=None,
-                                key=f"data_{concurso}"
+                                key=f"data_{template_id}"
                             )
                             
                             if st.form_submit_button("🎯 Clonar Template", use_container_width=True):
                                 if novo_nome and novo_cargo:
                                     result = clonar_template(
                                         supabase,
-                                        concurso,
+                                        template_id,
                                         novo_nome,
                                         novo_cargo,
                                         user_id,
@@ -3197,10 +3599,8 @@ if st.session_state.missao_ativa is not None:
                                     )
                                     
                                     if result['success']:
-                                        st.success(result['message'])
-                                        st.balloons()
-                                        time.sleep(2)
-                                        st.cache_data.clear()
+                                        flash(result['message'])
+                                        limpar_cache_dados()
                                         st.rerun()
                                     else:
                                         st.error(result['message'])
@@ -3211,7 +3611,7 @@ if st.session_state.missao_ativa is not None:
         with tab2:
             st.markdown("### 📤 Transformar Meu Edital em Template")
             
-            meus_editais = get_editais(supabase, user_id)
+            meus_editais = get_editais_cached(user_id)
             
             if not meus_editais:
                 st.info("📭 Você ainda não tem editais cadastrados.")
@@ -3251,10 +3651,9 @@ if st.session_state.missao_ativa is not None:
                             )
                             
                             if result['success']:
-                                st.success(result['message'])
-                                st.info("💡 Seu edital agora aparece nos templates públicos!")
-                                time.sleep(2)
-                                st.cache_data.clear()
+                                flash(result['message'])
+                                flash("💡 Seu edital agora aparece nos templates públicos!", "info")
+                                limpar_cache_dados()
                                 st.rerun()
                             else:
                                 st.error(result['message'])
@@ -3277,7 +3676,8 @@ if st.session_state.missao_ativa is not None:
                 </div>
                 """, unsafe_allow_html=True)
                 
-                for concurso, info in meus_templates.items():
+                for template_id, info in meus_templates.items():
+                    concurso = info['concurso']
                     with st.expander(f"📚 {info['nome']} ({info['clones']} clone(s))"):
                         st.markdown(f"**Concurso:** {concurso}")
                         st.markdown(f"**Cargo:** {info['cargo']}")
@@ -3288,7 +3688,7 @@ if st.session_state.missao_ativa is not None:
                         st.metric("Clones realizados", info['clones'])
                         
                         # Mostrar matérias do template
-                        materias = visualizar_template(supabase, concurso)
+                        materias = visualizar_template(supabase, template_id)
                         if materias:
                             st.markdown("**Matérias incluídas:**")
                             materias_nomes = [mat['materia'] for mat in materias]
@@ -3316,10 +3716,9 @@ if st.session_state.missao_ativa is not None:
                                     result = remover_de_templates(supabase, concurso, user_id)
                                     
                                     if result['success']:
-                                        st.success(result['message'])
-                                        st.info("💡 Seu edital agora é privado novamente!")
-                                        time.sleep(2)
-                                        st.cache_data.clear()
+                                        flash(result['message'])
+                                        flash("💡 Seu edital agora é privado novamente!", "info")
+                                        limpar_cache_dados()
                                         st.rerun()
                                     else:
                                         st.error(result['message'])
@@ -3346,16 +3745,11 @@ if st.session_state.missao_ativa is not None:
         if df_estudos.empty:
             st.info("Registre alguns estudos para que eu possa planejar sua semana estrategicamente.")
         else:
-            # Lógica de Recomendação (Priority Engine)
-            df_matriz = df_estudos.groupby('materia').agg({
-                'acertos': 'sum',
-                'total': 'sum',
-                'relevancia': 'mean'
-            }).reset_index()
-            df_matriz['taxa'] = (df_matriz['acertos'] / df_matriz['total'] * 100).fillna(0)
+            # Lógica de Recomendação (Priority Engine, em cache por versão dos dados)
+            matrizes = get_prioridades(missao, df_estudos)
             
-            # Quadrante: Foco Crítico (Taxa < 75 e Relevância > 5)
-            criticos = df_matriz[(df_matriz['taxa'] < 75) & (df_matriz['relevancia'] >= 5)].sort_values(['relevancia', 'taxa'], ascending=[False, True])
+            # Quadrante: Foco Crítico (Taxa < 75 e Relevância >= 5), ordenado pelo score
+            criticos = ranquear_alvos(matrizes['materias'], taxa_max=75, relevancia_min=5)
             
             col_rec1, col_rec2 = st.columns([2, 1])
             
@@ -3365,9 +3759,8 @@ if st.session_state.missao_ativa is not None:
                     st.success("✨ Sem gargalos críticos no momento! Recomendo avançar em novos tópicos do edital.")
                 else:
                     for _, row in criticos.head(3).iterrows():
-                        # Buscar o pior assunto desta materia
-                        df_ass = df_estudos[df_estudos['materia'] == row['materia']].groupby('assunto').agg({'taxa': 'mean'}).reset_index()
-                        pior_ass = df_ass.sort_values('taxa').iloc[0]['assunto']
+                        # Pior assunto desta materia (já calculado na matriz)
+                        pior_ass = row['pior_assunto']
                         
                         st.markdown(f"""
                         <div class="modern-card" style="border-left: 5px solid #EF4444;">
@@ -3390,11 +3783,11 @@ if st.session_state.missao_ativa is not None:
             with col_rec2:
                 # 1. LÓGICA DE DADOS (Cálculos de Metas)
                 hoje = get_br_date()
-                in_sem = hoje - timedelta(days=hoje.weekday())
                 
-                df_s = df_raw[pd.to_datetime(df_raw['data_estudo']).dt.date >= in_sem] if not df_raw.empty else pd.DataFrame()
-                df_e = df_estudos[pd.to_datetime(df_estudos['data_estudo']).dt.date >= in_sem] if not df_estudos.empty else pd.DataFrame()
-                df_sim_s = df_simulados[pd.to_datetime(df_simulados['data_estudo']).dt.date >= in_sem] if not df_simulados.empty else pd.DataFrame()
+                # Recorte da semana: matérias/assuntos vêm das matrizes; totais e simulados do rollup semanal
+                semana = matrizes['semana']
+                resumo_semana = get_resumo_da_semana(missao, hoje)
+                questoes_semana_total = resumo_semana['questoes'] + resumo_semana['questoes_simulados']
                 
                 # Definir itens do checklist
                 m_labels = []
@@ -3404,12 +3797,12 @@ if st.session_state.missao_ativa is not None:
                     pm = criticos.iloc[0]['materia']
                     lbl_c = f"Revisar {pm}"
                     m_labels.append(lbl_c)
-                    st_auto[lbl_c] = not df_e[df_e['materia'] == pm].empty if not df_e.empty else False
+                    st_auto[lbl_c] = pm in semana['materias']
                 
                 m_labels.extend(["Realizar 1 Simulado de Elite", "Manter meta de questões diária", "Zerar 2 novos tópicos do edital"])
-                st_auto["Realizar 1 Simulado de Elite"] = not df_sim_s.empty
-                st_auto["Manter meta de questões diária"] = df_s['total'].sum() >= st.session_state.get('meta_questoes_semana', 350) if not df_s.empty else False
-                st_auto["Zerar 2 novos tópicos do edital"] = len(df_e['assunto'].unique()) >= 2 if not df_e.empty else False
+                st_auto["Realizar 1 Simulado de Elite"] = resumo_semana['simulados'] > 0
+                st_auto["Manter meta de questões diária"] = questoes_semana_total >= st.session_state.get('meta_questoes_semana', 350)
+                st_auto["Zerar 2 novos tópicos do edital"] = semana['assuntos'] >= 2
 
                 # Contagem de Progresso (Calculado ANTES de desenhar a UI)
                 v_done = 0
@@ -3454,9 +3847,9 @@ if st.session_state.missao_ativa is not None:
                     for i, m in enumerate(m_labels):
                         st.session_state.checklist_status[f"check_{i}_{m[:10]}"] = st.session_state[f"guia_check_{i}"]
                     st.session_state.missao_semanal_status = "EM EXECUÇÃO"
-                    st.toast("Plano Ativado!", icon="🚀")
+                    flash("🚀 Plano Ativado!")
                     # LIMPAR CACHE APÓS OPERAÇÃO
-                    st.cache_data.clear()
+                    limpar_cache_dados()
                     st.rerun()
                 st.markdown('</div>', unsafe_allow_html=True)
             
@@ -3514,6 +3907,14 @@ if st.session_state.missao_ativa is not None:
             # Ordenar por score de prioridade (maior primeiro)
             pend = sorted(pend, key=lambda x: x['priority_score'], reverse=True)
             
+            # Anotações (texto livre) e histórico de revisões, buscados sob demanda
+            comentarios_rev = get_comentarios_cached(tuple(sorted({p['id'] for p in pend})), user_id)
+            revisoes_por_registro = {}
+            for rev in get_revisoes_log_cached(missao, user_id):
+                revisoes_por_registro.setdefault(rev['registro_id'], []).append(rev)
+            for p in pend:
+                p['coment'] = comentarios_rev.get(p['id'], '')
+            
             (f"**{len(pend)} revisões encontradas** (ordenadas por prioridade)")
             st.markdown("---")
             
@@ -3582,6 +3983,15 @@ if st.session_state.missao_ativa is not None:
                     </div>
                     """, unsafe_allow_html=True)
                     
+                    # Evolução da precisão ao longo das revisões anteriores
+                    revs_anteriores = revisoes_por_registro.get(p['id'], [])
+                    if revs_anteriores:
+                        evolucao = " → ".join(
+                            f"{i}ª: {r['acertos']}/{r['total']} ({(r['acertos'] / r['total'] * 100) if r['total'] else 0:.0f}%)"
+                            for i, r in enumerate(revs_anteriores, start=1)
+                        )
+                        st.caption(f"🔁 Revisões anteriores: {evolucao}")
+                    
                     # Área de Ação
                     st.markdown("#### 📊 Registrar Revisão")
                     
@@ -3599,28 +4009,29 @@ if st.session_state.missao_ativa is not None:
                         if st.button("✅ Concluir", key=f"btn_{p['id']}_{p['col']}_{idx}", use_container_width=True, type="primary"):
                             if total == 0:
                                 st.error("⚠️ Informe o total de questões!")
+                            elif acertos > total:
+                                st.error("⚠️ Os acertos não podem passar do total de questões!")
                             else:
                                 try:
-                                    res_db = supabase.table("registros_estudos").select("acertos, total, tempo").eq("id", p['id']).eq("user_id", user_id).execute()
-                                    if res_db.data:
-                                        n_ac = res_db.data[0]['acertos'] + acertos
-                                        n_to = res_db.data[0]['total'] + total
-                                        n_tempo = (res_db.data[0].get('tempo') or 0) + tempo_rev
-                                        
-                                        supabase.table("registros_estudos").update({
-                                            p['col']: True, 
-                                            "comentarios": f"{p['coment']} | Rev: {acertos}/{total} ({tempo_rev}min)", 
-                                            "acertos": n_ac, 
-                                            "total": n_to, 
-                                            "tempo": n_tempo,
-                                            "taxa": (n_ac/n_to*100 if n_to > 0 else 0)
-                                        }).eq("id", p['id']).execute()
-                                        
-                                        # LIMPAR CACHE APÓS OPERAÇÃO
-                                        st.cache_data.clear()
+                                    # Registro + log tipado (append-only) no mesmo statement, no servidor
+                                    res_upd = supabase.rpc("concluir_revisao", {
+                                        "p_registro_id": p['id'],
+                                        "p_user_id": user_id,
+                                        "p_fase": p['col'],
+                                        "p_acertos": acertos,
+                                        "p_total": total,
+                                        "p_tempo": tempo_rev,
+                                        "p_data": hoje.strftime('%Y-%m-%d'),
+                                    }).execute()
+                                    if not res_upd.data:
+                                        st.error("❌ Registro não encontrado: a revisão não foi gravada.")
+                                    else:
+                                        # Aplica a linha devolvida pelo servidor no store (sem recarregar a missão)
+                                        get_estudos_multi(user_id).atualizar_local(p['id'], res_upd.data[0], missao)
+                                        get_revisoes_log_cached.clear()
+                                        get_historico_pagina.clear()
                                         
-                                        st.success(f"✅ Revisão concluída! +{tempo_rev}min registrados")
-                                        time.sleep(1.5)
+                                        flash(f"✅ Revisão concluída! +{tempo_rev}min registrados")
                                         st.rerun()
                                 except Exception as e:
                                     st.error(f"❌ Erro: {e}")
@@ -3634,57 +4045,46 @@ if st.session_state.missao_ativa is not None:
         
         # ========== TAB: LISTA DE QUESTÕES ==========
         with tab_lista:
-            # Buscar questões do Supabase
-            try:
-                response = supabase.table("questoes_revisao").select("*").eq("concurso", missao).eq("user_id", user_id).execute()
-                questoes = response.data if response.data else []
-            except Exception as e:
-                st.error(f"❌ Erro ao carregar questões: {e}")
-                questoes = []
+            # Store em cache: páginas e contagens agrupadas (sem baixar o banco inteiro)
+            store_q = get_questoes_store(user_id, missao)
+            contagens_q = store_q.contagens()
             
-            if questoes:
+            if contagens_q["total"] > 0:
                 # Filtros
                 st.markdown("### 🔍 Filtros")
-                col_f1, col_f2, col_f3, col_f4 = st.columns(4)
+                col_f1, col_f2, col_f3, col_f4, col_f5 = st.columns(5)
                 
                 with col_f1:
-                    materias_disponiveis = sorted(list(set([q.get('materia', '') for q in questoes if q.get('materia')])))
+                    materias_disponiveis = sorted([m for m in contagens_q["materia"] if m])
                     filtro_materia = st.selectbox("Matéria", ["Todas"] + materias_disponiveis, key="filtro_materia_q")
                 
                 with col_f2:
                     filtro_status = st.selectbox("Status", ["Todas", "Pendente", "Em andamento", "Concluída"], key="filtro_status_q")
                 
                 with col_f3:
-                    filtro_relevancia = st.selectbox("Relevância", ["Todas", "Alta (8-10)", "Média (5-7)", "Baixa (1-4)"], key="filtro_rel_q")
+                    filtro_relevancia = st.selectbox("Relevância", ["Todas"] + list(FAIXAS_RELEVANCIA_QUESTOES.keys()), key="filtro_rel_q")
                 
                 with col_f4:
-                    ordem = st.selectbox("Ordenar por", ["Data (mais recente)", "Data (mais antiga)", "Relevância (maior)", "Relevância (menor)"], key="ordem_q")
+                    ordem = st.selectbox("Ordenar por", list(ORDENACAO_QUESTOES.keys()), key="ordem_q")
                 
-                # Aplicar filtros
-                questoes_filtradas = questoes.copy()
+                with col_f5:
+                    tamanho_pagina_q = st.selectbox("Por página", [10, 20, 50], index=1, key="tam_pagina_q")
                 
-                if filtro_materia != "Todas":
-                    questoes_filtradas = [q for q in questoes_filtradas if q.get('materia') == filtro_materia]
+                # Página atual: volta para a primeira quando filtros/ordem mudam
+                assinatura_q = (missao, filtro_materia, filtro_status, filtro_relevancia, ordem, tamanho_pagina_q)
+                if st.session_state.get('assinatura_q') != assinatura_q:
+                    st.session_state.assinatura_q = assinatura_q
+                    st.session_state.pagina_q = 0
                 
-                if filtro_status != "Todas":
-                    questoes_filtradas = [q for q in questoes_filtradas if q.get('status', 'Pendente') == filtro_status]
-                
-                if filtro_relevancia == "Alta (8-10)":
-                    questoes_filtradas = [q for q in questoes_filtradas if q.get('relevancia', 5) >= 8]
-                elif filtro_relevancia == "Média (5-7)":
-                    questoes_filtradas = [q for q in questoes_filtradas if 5 <= q.get('relevancia', 5) <= 7]
-                elif filtro_relevancia == "Baixa (1-4)":
-                    questoes_filtradas = [q for q in questoes_filtradas if q.get('relevancia', 5) <= 4]
-                
-                # Ordenar
-                if ordem == "Data (mais recente)":
-                    questoes_filtradas = sorted(questoes_filtradas, key=lambda x: x.get('data', ''), reverse=True)
-                elif ordem == "Data (mais antiga)":
-                    questoes_filtradas = sorted(questoes_filtradas, key=lambda x: x.get('data', ''))
-                elif ordem == "Relevância (maior)":
-                    questoes_filtradas = sorted(questoes_filtradas, key=lambda x: x.get('relevancia', 5), reverse=True)
-                elif ordem == "Relevância (menor)":
-                    questoes_filtradas = sorted(questoes_filtradas, key=lambda x: x.get('relevancia', 5))
+                # Filtros, ordenação e paginação aplicados no servidor
+                try:
+                    questoes_filtradas, total_filtradas = store_q.pagina(
+                        filtro_materia, filtro_status, filtro_relevancia,
+                        ordem, st.session_state.pagina_q, tamanho_pagina_q
+                    )
+                except Exception as e:
+                    st.error(f"❌ Erro ao carregar questões: {e}")
+                    questoes_filtradas, total_filtradas = [], 0
                 
                 st.markdown("---")
                 
@@ -3698,11 +4098,10 @@ if st.session_state.missao_ativa is not None:
                         with col_a1:
                             if st.button("✅ Marcar todas como concluídas", use_container_width=True):
                                 try:
-                                    ids_para_atualizar = [q['id'] for q in questoes_filtradas]
-                                    for qid in ids_para_atualizar:
-                                        supabase.table("questoes_revisao").update({"status": "Concluída"}).eq("id", qid).eq("user_id", user_id).execute()
-                                    st.success(f"✅ {len(ids_para_atualizar)} questões marcadas como concluídas!")
-                                    time.sleep(1)
+                                    query = supabase.table("questoes_revisao").update({"status": "Concluída"})
+                                    aplicar_filtros_questoes(query, missao, user_id, filtro_materia, filtro_status, filtro_relevancia).execute()
+                                    store_q.invalidar()
+                                    flash(f"✅ {total_filtradas} questões marcadas como concluídas!")
                                     st.rerun()
                                 except Exception as e:
                                     st.error(f"❌ Erro: {e}")
@@ -3710,11 +4109,10 @@ if st.session_state.missao_ativa is not None:
                         with col_a2:
                             if st.button("🔄 Reiniciar revisões", use_container_width=True):
                                 try:
-                                    ids_para_atualizar = [q['id'] for q in questoes_filtradas]
-                                    for qid in ids_para_atualizar:
-                                        supabase.table("questoes_revisao").update({"status": "Pendente"}).eq("id", qid).eq("user_id", user_id).execute()
-                                    st.success(f"✅ {len(ids_para_atualizar)} questões reiniciadas!")
-                                    time.sleep(1)
+                                    query = supabase.table("questoes_revisao").update({"status": "Pendente"})
+                                    aplicar_filtros_questoes(query, missao, user_id, filtro_materia, filtro_status, filtro_relevancia).execute()
+                                    store_q.invalidar()
+                                    flash(f"✅ {total_filtradas} questões reiniciadas!")
                                     st.rerun()
                                 except Exception as e:
                                     st.error(f"❌ Erro: {e}")
@@ -3722,16 +4120,16 @@ if st.session_state.missao_ativa is not None:
                         with col_a3:
                             if st.button("🗑️ Limpar concluídas", use_container_width=True, type="primary"):
                                 try:
-                                    ids_concluidas = [q['id'] for q in questoes_filtradas if q.get('status') == 'Concluída']
-                                    for qid in ids_concluidas:
-                                        supabase.table("questoes_revisao").delete().eq("id", qid).eq("user_id", user_id).execute()
-                                    st.success(f"✅ {len(ids_concluidas)} questões concluídas removidas!")
-                                    time.sleep(1)
+                                    query = supabase.table("questoes_revisao").delete()
+                                    query = aplicar_filtros_questoes(query, missao, user_id, filtro_materia, filtro_status, filtro_relevancia)
+                                    response = query.eq("status", "Concluída").execute()
+                                    store_q.invalidar()
+                                    flash(f"✅ {len(response.data or [])} questões concluídas removidas!")
                                     st.rerun()
                                 except Exception as e:
                                     st.error(f"❌ Erro: {e}")
                     
-                    st.markdown(f"### 📚 {len(questoes_filtradas)} questões encontradas")
+                    st.markdown(f"### 📚 {total_filtradas} questões encontradas")
                     
                     # Exibir questões em cards
                     for idx, q in enumerate(questoes_filtradas):
@@ -3828,9 +4226,8 @@ if st.session_state.missao_ativa is not None:
                                 )
                                 if novo_status != status:
                                     try:
-                                        supabase.table("questoes_revisao").update({"status": novo_status}).eq("id", questao_id).eq("user_id", user_id).execute()
-                                        st.success("✅ Status atualizado!")
-                                        time.sleep(0.5)
+                                        store_q.atualizar(questao_id, {"status": novo_status})
+                                        flash("✅ Status atualizado!")
                                         st.rerun()
                                     except Exception as e:
                                         st.error(f"❌ Erro: {e}")
@@ -3843,9 +4240,8 @@ if st.session_state.missao_ativa is not None:
                             with col_a3:
                                 if st.button("🗑️ Excluir", key=f"del_{questao_id}", use_container_width=True, type="primary"):
                                     try:
-                                        supabase.table("questoes_revisao").delete().eq("id", questao_id).eq("user_id", user_id).execute()
-                                        st.success("✅ Questão excluída!")
-                                        time.sleep(0.5)
+                                        store_q.excluir(questao_id)
+                                        flash("✅ Questão excluída!")
                                         st.rerun()
                                     except Exception as e:
                                         st.error(f"❌ Erro: {e}")
@@ -3855,9 +4251,8 @@ if st.session_state.missao_ativa is not None:
                                 if st.button("➕ Meta", key=f"meta_{questao_id}", use_container_width=True):
                                     try:
                                         nova_meta = meta + 1
-                                        supabase.table("questoes_revisao").update({"meta": nova_meta}).eq("id", questao_id).eq("user_id", user_id).execute()
-                                        st.success(f"✅ Meta: {nova_meta}")
-                                        time.sleep(0.5)
+                                        store_q.atualizar(questao_id, {"meta": nova_meta})
+                                        flash(f"✅ Meta: {nova_meta}")
                                         st.rerun()
                                     except Exception as e:
                                         st.error(f"❌ Erro: {e}")
@@ -3901,10 +4296,9 @@ if st.session_state.missao_ativa is not None:
                                                     "tags": tags_list
                                                 }
                                                 
-                                                supabase.table("questoes_revisao").update(payload).eq("id", questao_id).eq("user_id", user_id).execute()
-                                                st.success("✅ Questão atualizada!")
+                                                store_q.atualizar(questao_id, payload)
+                                                flash("✅ Questão atualizada!")
                                                 st.session_state[f"editando_{questao_id}"] = False
-                                                time.sleep(1)
                                                 st.rerun()
                                             except Exception as e:
                                                 st.error(f"❌ Erro: {e}")
@@ -3914,11 +4308,25 @@ if st.session_state.missao_ativa is not None:
                                             st.session_state[f"editando_{questao_id}"] = False
                                             st.rerun()
                 
-                # Exportar para CSV
+                    # Navegação entre páginas
+                    total_paginas_q = max(1, -(-total_filtradas // tamanho_pagina_q))
+                    col_p1, col_p2, col_p3 = st.columns([1, 2, 1])
+                    if col_p1.button("◀ Anterior", key="q_anterior", disabled=st.session_state.pagina_q == 0, use_container_width=True):
+                        st.session_state.pagina_q -= 1
+                        st.rerun()
+                    col_p2.markdown(f"<p style='text-align: center; color: {COLORS['text_secondary']}; margin-top: 8px;'>Página {st.session_state.pagina_q + 1} de {total_paginas_q}</p>", unsafe_allow_html=True)
+                    if col_p3.button("Próxima ▶", key="q_proxima", disabled=st.session_state.pagina_q + 1 >= total_paginas_q, use_container_width=True):
+                        st.session_state.pagina_q += 1
+                        st.rerun()
+                
+                # Exportar para CSV (todas as questões filtradas, buscadas só sob demanda)
                 st.markdown("---")
                 if st.button("📥 Exportar para CSV", use_container_width=True):
                     try:
-                        df_export = pd.DataFrame(questoes_filtradas)
+                        coluna_ord, desc_ord = ORDENACAO_QUESTOES[ordem]
+                        query = supabase.table("questoes_revisao").select("*")
+                        query = aplicar_filtros_questoes(query, missao, user_id, filtro_materia, filtro_status, filtro_relevancia)
+                        df_export = pd.DataFrame(query.order(coluna_ord, desc=desc_ord).execute().data or [])
                         csv = df_export.to_csv(index=False)
                         st.download_button(
                             label="💾 Baixar CSV",
@@ -4008,10 +4416,9 @@ if st.session_state.missao_ativa is not None:
                                 "user_id": user_id
                             }
                             
-                            supabase.table("questoes_revisao").insert(payload).execute()
-                            st.success("✅ Questão adicionada com sucesso! Formulário limpo para nova entrada.")
+                            get_questoes_store(user_id, missao).inserir(payload)
+                            flash("✅ Questão adicionada com sucesso! Formulário limpo para nova entrada.")
                             st.session_state.limpar_form_questao = True
-                            time.sleep(1.5)
                             st.rerun()
                         except Exception as e:
                             st.error(f"❌ Erro ao salvar questão: {e}")
@@ -4020,20 +4427,17 @@ if st.session_state.missao_ativa is not None:
         with tab_stats:
             st.markdown("### 📊 Estatísticas do Banco de Questões")
             
-            try:
-                response = supabase.table("questoes_revisao").select("*").eq("concurso", missao).eq("user_id", user_id).execute()
-                todas_questoes = response.data if response.data else []
-            except:
-                todas_questoes = []
+            store_q = get_questoes_store(user_id, missao)
+            contagens_q = store_q.contagens()
             
-            if todas_questoes:
+            if contagens_q["total"] > 0:
                 # Métricas gerais
                 col_m1, col_m2, col_m3, col_m4 = st.columns(4)
                 
-                total = len(todas_questoes)
-                pendentes = len([q for q in todas_questoes if q.get('status') == 'Pendente'])
-                em_andamento = len([q for q in todas_questoes if q.get('status') == 'Em andamento'])
-                concluidas = len([q for q in todas_questoes if q.get('status') == 'Concluída'])
+                total = contagens_q["total"]
+                pendentes = contagens_q["status"].get('Pendente', 0)
+                em_andamento = contagens_q["status"].get('Em andamento', 0)
+                concluidas = contagens_q["status"].get('Concluída', 0)
                 
                 with col_m1:
                     render_circular_progress(100, "TOTAL", str(total), COLORS["primary"], COLORS["secondary"], 100, "📚")
@@ -4058,10 +4462,7 @@ if st.session_state.missao_ativa is not None:
                 with col_g1:
                     # Gráfico por matéria
                     st.markdown("#### 📚 Questões por Matéria")
-                    materias_count = {}
-                    for q in todas_questoes:
-                        mat = q.get('materia', 'Sem matéria')
-                        materias_count[mat] = materias_count.get(mat, 0) + 1
+                    materias_count = {(mat or 'Sem matéria'): qtd for mat, qtd in contagens_q["materia"].items()}
                     
                     if materias_count:
                         df_materias = pd.DataFrame(list(materias_count.items()), columns=['Matéria', 'Quantidade'])
@@ -4079,9 +4480,9 @@ if st.session_state.missao_ativa is not None:
                     # Gráfico por relevância
                     st.markdown("#### ⭐ Distribuição de Relevância")
                     relevancia_count = {i: 0 for i in range(1, 11)}
-                    for q in todas_questoes:
-                        rel = q.get('relevancia', 5)
-                        relevancia_count[rel] = relevancia_count.get(rel, 0) + 1
+                    for rel, qtd in contagens_q["relevancia"].items():
+                        rel = int(rel) if rel else 5
+                        relevancia_count[rel] = relevancia_count.get(rel, 0) + qtd
                     
                     df_rel = pd.DataFrame(list(relevancia_count.items()), columns=['Relevância', 'Quantidade'])
                     fig_rel = px.line(df_rel, x='Relevância', y='Quantidade', markers=True)
@@ -4097,7 +4498,10 @@ if st.session_state.missao_ativa is not None:
                 st.markdown("---")
                 st.markdown("#### 🔥 Top 5 Questões Mais Relevantes")
                 
-                questoes_ordenadas = sorted(todas_questoes, key=lambda x: x.get('relevancia', 0), reverse=True)[:5]
+                try:
+                    questoes_ordenadas, _ = store_q.pagina("Todas", "Todas", "Todas", "Relevância (maior)", 0, 5)
+                except Exception:
+                    questoes_ordenadas = []
                 
                 for q in questoes_ordenadas:
                     col_t1, col_t2, col_t3 = st.columns([3, 1, 1])
@@ -4207,13 +4611,13 @@ if st.session_state.missao_ativa is not None:
                                     "rev_30d": not gerar_rev_reg,
                                     "user_id": user_id  # MULTI-USER: Essencial para filtrar dados por usuário
                                 }
-                                supabase.table("registros_estudos").insert(payload).execute()
+                                # Write-behind: o registro entra no frame local já neste
+                                # rerun; o insert (com retry) e a invalidação dos caches
+                                # ficam com a fila em segundo plano
+                                get_fila_escrita(user_id).enfileirar("registros_estudos", payload)
+                                registrar_no_indice(missao, payload)
                                 
-                                # LIMPAR CACHE APÓS OPERAÇÃO
-                                st.cache_data.clear()
-                                
-                                st.success("✅ Registro salvo com sucesso!")
-                                time.sleep(1)
+                                flash("✅ Registro salvo! Sincronizando em segundo plano.")
                                 st.rerun()
                             except Exception as e:
                                 st.error(f"❌ Erro ao salvar: {e}")
@@ -4235,19 +4639,16 @@ if st.session_state.missao_ativa is not None:
                 key="filtro_periodo_dashboard"
             )
         
-        # Filtrar df_estudos baseado no período
+        # Dados e figuras memoizados por (usuário, missão, versão dos dados, período)
         hoje = get_br_date()
-        df_estudos_filtrado = df_estudos.copy()
-        
-        if periodo == "Última Semana" and not df_estudos.empty:
-            df_estudos_filtrado = df_estudos[pd.to_datetime(df_estudos['data_estudo']).dt.date >= (hoje - timedelta(days=7))]
-        elif periodo == "Último Mês" and not df_estudos.empty:
-            df_estudos_filtrado = df_estudos[pd.to_datetime(df_estudos['data_estudo']).dt.date >= (hoje - timedelta(days=30))]
-        elif periodo == "Últimos 3 Meses" and not df_estudos.empty:
-            df_estudos_filtrado = df_estudos[pd.to_datetime(df_estudos['data_estudo']).dt.date >= (hoje - timedelta(days=90))]
+        edital_chave = tuple((m, len(a)) for m, a in dados.get('materias', {}).items())
+        painel = get_dashboard_cached(
+            user_id, missao, versao_estudos(missao),
+            periodo, hoje, edital_chave, df_estudos, get_indice_cobertura(missao, df_estudos)
+        )
         
         with col_info:
-            registros_filtrados = len(df_estudos_filtrado)
+            registros_filtrados = painel["registros"]
             st.markdown(f"""
             <div style="text-align: right; padding-top: 8px;">
                 <span style="color: {COLORS['secondary']}; font-size: 0.9rem; font-weight: 600;">
@@ -4258,30 +4659,15 @@ if st.session_state.missao_ativa is not None:
         
         st.markdown('</div>', unsafe_allow_html=True)
         
-        # Usar df_estudos_filtrado daqui em diante
-        df_estudos = df_estudos_filtrado
-        
         # --- NOVO: EDITAL VERTICALIZADO (COBERTURA) ---
         if dados.get('materias'):
             st.markdown('<div class="modern-card">', unsafe_allow_html=True)
             st.markdown("##### 📜 Progresso do Edital (Syllabus)")
             st.markdown("<p style='font-size: 0.8rem; color: #94A3B8;'>Percentual de assuntos únicos estudados por matéria.</p>", unsafe_allow_html=True)
             
-            # Calcular cobertura para cada materia cadastrada
             cols_edital = st.columns(3)
-            col_idx = 0
             
-            for materia, assuntos_previstos in dados.get('materias', {}).items():
-                # Assuntos estudados nessa materia (filtrando do df_estudos)
-                if not df_estudos.empty and 'materia' in df_estudos.columns and 'assunto' in df_estudos.columns:
-                    assuntos_estudados = df_estudos[df_estudos['materia'] == materia]['assunto'].unique()
-                    count_estudados = len(assuntos_estudados)
-                else:
-                    count_estudados = 0
-                
-                count_total = len(assuntos_previstos)
-                porcentagem = (count_estudados / count_total * 100) if count_total > 0 else 0
-                
+            for col_idx, (materia, count_estudados, count_total, porcentagem) in enumerate(painel["cobertura"]):
                 # Cor da barra
                 bar_color = "#EF4444" if porcentagem < 30 else "#F59E0B" if porcentagem < 70 else "#10B981"
                 
@@ -4298,32 +4684,23 @@ if st.session_state.missao_ativa is not None:
                         <div style="font-size: 0.7rem; color: #64748B; text-align: right; margin-top: 2px;">{count_estudados}/{count_total} tópicos</div>
                     </div>
                     """, unsafe_allow_html=True)
-                col_idx += 1
             st.markdown('</div>', unsafe_allow_html=True)
             st.divider()
 
 
 
         # Métricas Gerais
-        if df_estudos.empty:
-            t_q, precisao, minutos_totais, ritmo = 0, 0, 0, 0
-        else:
-            t_q = df_estudos['total'].sum()
-            a_q = df_estudos['acertos'].sum()
-            precisao = (a_q/t_q*100 if t_q > 0 else 0)
-            minutos_totais = int(df_estudos['tempo'].sum())
-            ritmo = (minutos_totais / t_q) if t_q > 0 else 0
+        metricas = painel["metricas"]
+        t_q, a_q, minutos_totais = metricas["t_q"], metricas["a_q"], metricas["minutos"]
+        precisao = (a_q/t_q*100 if t_q > 0 else 0)
+        ritmo = (minutos_totais / t_q) if t_q > 0 else 0
 
         # Calcular deltas (comparação com ontem)
-        hoje = get_br_date()
-        ontem = hoje - timedelta(days=1)
-        df_ontem = df_estudos[pd.to_datetime(df_estudos['data_estudo']).dt.date == ontem] if not df_estudos.empty else pd.DataFrame()
-
-        if not df_ontem.empty:
-            t_q_ontem = df_ontem['total'].sum()
-            a_q_ontem = df_ontem['acertos'].sum()
+        if metricas["ontem"]:
+            t_q_ontem = metricas["ontem"]["t_q"]
+            a_q_ontem = metricas["ontem"]["a_q"]
             precisao_ontem = (a_q_ontem / t_q_ontem * 100) if t_q_ontem > 0 else 0
-            minutos_ontem = int(df_ontem['tempo'].sum())
+            minutos_ontem = metricas["ontem"]["minutos"]
 
             delta_tempo = minutos_totais - minutos_ontem
             delta_precisao = precisao - precisao_ontem
@@ -4419,45 +4796,32 @@ if st.session_state.missao_ativa is not None:
         st.divider()
         
         # --- NOVO: DESEMPENHO POR RELEVÂNCIA ---
-        if not df_estudos.empty and 'relevancia' in df_estudos.columns:
+        if painel["relevancia"]:
             st.markdown('<div class="modern-card">', unsafe_allow_html=True)
             st.markdown("##### ⭐ Desempenho por Nível de Relevância")
             st.markdown("<p style='font-size: 0.8rem; color: #94A3B8;'>Precisão média agrupada pela importância da matéria (1-10).</p>", unsafe_allow_html=True)
             
-            # Agrupar por relevância
-            df_rel_dash = df_estudos.groupby('relevancia').agg({
-                'acertos': 'sum',
-                'total': 'sum'
-            }).reset_index()
-            
-            # Recalcular taxa por nível de relevância (média ponderada)
-            df_rel_dash['taxa'] = (df_rel_dash['acertos'] / df_rel_dash['total'] * 100).fillna(0)
-            df_rel_dash['relevancia'] = df_rel_dash['relevancia'].astype(int)
-            df_rel_dash = df_rel_dash.sort_values('relevancia', ascending=False)
-            
             # Usar colunas dinâmicas para os níveis de relevância
-            n_cols = len(df_rel_dash)
-            if n_cols > 0:
-                c_rel = st.columns(n_cols)
-                for idx, row in enumerate(df_rel_dash.iterrows()):
-                    r_val = row[1]['relevancia']
-                    r_taxa = row[1]['taxa']
-                    r_total = row[1]['total']
-                    
-                    with c_rel[idx]:
-                        color = "#10B981" if r_taxa >= 75 else "#F59E0B" if r_taxa >= 50 else "#EF4444"
-                        st.markdown(f"""
-                            <div style="text-align: center; border: 1px solid rgba(255,255,255,0.05); padding: 10px; border-radius: 8px; background: rgba(255,255,255,0.02); cursor: help;" title="Nível {r_val}: {r_taxa:.1f}% de acerto em {int(r_total)} questões">
-                                <div style="font-size: 0.7rem; color: #94A3B8;">NÍVEL {r_val}</div>
-                                <div style="font-size: 1.2rem; font-weight: 800; color: {color};">{r_taxa:.1f}%</div>
-                                <div style="font-size: 0.65rem; color: #64748B;">{int(r_total)} questões</div>
-                            </div>
-                        """, unsafe_allow_html=True)
+            c_rel = st.columns(len(painel["relevancia"]))
+            for idx, nivel in enumerate(painel["relevancia"]):
+                r_val = nivel['relevancia']
+                r_taxa = nivel['taxa']
+                r_total = nivel['total']
+                
+                with c_rel[idx]:
+                    color = "#10B981" if r_taxa >= 75 else "#F59E0B" if r_taxa >= 50 else "#EF4444"
+                    st.markdown(f"""
+                        <div style="text-align: center; border: 1px solid rgba(255,255,255,0.05); padding: 10px; border-radius: 8px; background: rgba(255,255,255,0.02); cursor: help;" title="Nível {r_val}: {r_taxa:.1f}% de acerto em {int(r_total)} questões">
+                            <div style="font-size: 0.7rem; color: #94A3B8;">NÍVEL {r_val}</div>
+                            <div style="font-size: 1.2rem; font-weight: 800; color: {color};">{r_taxa:.1f}%</div>
+                            <div style="font-size: 0.65rem; color: #64748B;">{int(r_total)} questões</div>
+                        </div>
+                    """, unsafe_allow_html=True)
             st.markdown('</div>', unsafe_allow_html=True)
             st.divider()
 
         # 2. PONTOS FRACOS & EVOLUÇÃO
-        if not df_estudos.empty:
+        if painel["registros"]:
             c_main1, c_main2 = st.columns([1, 1])
             
             with c_main1:
@@ -4465,37 +4829,8 @@ if st.session_state.missao_ativa is not None:
                 st.markdown("##### 📉 Pareto de Erros: Onde você mais perde pontos")
                 st.markdown("<p style='font-size: 0.8rem; color: #94A3B8;'>Top 10 assuntos com maior volume absoluto de erros.</p>", unsafe_allow_html=True)
                 
-                # Calcular erros brutos por assunto
-                df_errors = df_estudos.groupby(['materia', 'assunto']).agg({
-                    'total': 'sum', 
-                    'acertos': 'sum'
-                }).reset_index()
-                df_errors['erros'] = df_errors['total'] - df_errors['acertos']
-                df_errors = df_errors.sort_values('erros', ascending=False).head(10)
-                # Filtrar apenas assuntos com erros
-                df_errors = df_errors[df_errors['erros'] > 0]
-                
-                if not df_errors.empty:
-                    # Gráfico de barras horizontais (Pareto)
-                    df_errors['label'] = df_errors['assunto'].apply(lambda x: x[:25] + '...' if len(x) > 25 else x)
-                    fig_pareto = px.bar(
-                        df_errors, x='erros', y='label', orientation='h',
-                        template="plotly_dark",
-                        color='erros',
-                        color_continuous_scale=["#F43F5E", "#E11D48"], # Tons de vermelho
-                        text='erros'
-                    )
-                    fig_pareto.update_layout(
-                        paper_bgcolor='rgba(0,0,0,0)',
-                        plot_bgcolor='rgba(0,0,0,0)',
-                        margin=dict(t=0, b=0, l=0, r=0),
-                        xaxis_visible=False,
-                        yaxis_title=None,
-                        coloraxis_showscale=False,
-                        height=280,
-                        yaxis={'categoryorder':'total ascending'}
-                    )
-                    st.plotly_chart(fig_pareto, use_container_width=True)
+                if painel["pareto"]:
+                    st.plotly_chart(pio.from_json(painel["pareto"]), use_container_width=True)
                 else:
                     st.success("🎉 Nenhum erro registrado! Continue com a precisão em 100%.")
                 st.markdown('</div>', unsafe_allow_html=True)
@@ -4504,75 +4839,15 @@ if st.session_state.missao_ativa is not None:
                 st.markdown('<div class="modern-card">', unsafe_allow_html=True)
                 st.markdown("##### 📅 Produtividade Semanal")
                 st.markdown("<p style='font-size: 0.8rem; color: #94A3B8;'>Horas de estudo por dia da semana.</p>", unsafe_allow_html=True)
-                
-                # Preparar dados por dia da semana
-                df_estudos['weekday'] = pd.to_datetime(df_estudos['data_estudo']).dt.day_name()
-                # Traduzir dias (opcional, ou usar ordem fixa)
-                dias_ordem = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
-                dias_trad = {"Monday": "Seg", "Tuesday": "Ter", "Wednesday": "Qua", "Thursday": "Qui", "Friday": "Sex", "Saturday": "Sáb", "Sunday": "Dom"}
-                
-                df_week = df_estudos.groupby('weekday')['tempo'].sum().reindex(dias_ordem).fillna(0).reset_index()
-                df_week['horas'] = df_week['tempo'] / 60
-                df_week['dia_pt'] = df_week['weekday'].map(dias_trad)
-                
-                fig_bar = px.bar(df_week, x='dia_pt', y='horas', 
-                                template="plotly_dark",
-                                color='horas',
-                                color_continuous_scale=["#8B5CF6", "#06B6D4"])
-                
-                fig_bar.update_layout(
-                    paper_bgcolor='rgba(0,0,0,0)',
-                    plot_bgcolor='rgba(0,0,0,0)',
-                    margin=dict(t=10, b=0, l=0, r=0),
-                    xaxis_title=None,
-                    yaxis_title="Horas",
-                    coloraxis_showscale=False,
-                    height=250
-                )
-                st.plotly_chart(fig_bar, use_container_width=True)
+                st.plotly_chart(pio.from_json(painel["semana"]), use_container_width=True)
                 st.markdown('</div>', unsafe_allow_html=True)
 
         # 3. GRÁFICO DE EVOLUÇÃO (Precisão)
-        if not df_estudos.empty:
+        if painel["registros"]:
             st.markdown('<div class="modern-card">', unsafe_allow_html=True)
             st.markdown("##### 📈 Evolução de Precisão")
             st.markdown("<p style='font-size: 0.8rem; color: #94A3B8;'>Precisão diária (%).</p>", unsafe_allow_html=True)
-
-            # Preparar dados de evolução
-            # Agrupar por data calculando somas para taxa ponderada
-            df_ev = df_estudos.sort_values('data_estudo').groupby('data_estudo').agg({
-                'acertos': 'sum',
-                'total': 'sum'
-            }).reset_index()
-
-            # Calcular taxa diária
-            df_ev['taxa'] = (df_ev['acertos'] / df_ev['total'] * 100).fillna(0)
-
-            # Criar gráfico Plotly
-            fig_evo = go.Figure()
-
-            # Linha de Precisão Diária
-            fig_evo.add_trace(go.Scatter(
-                x=df_ev['data_estudo'], y=df_ev['taxa'],
-                name='Precisão Diária',
-                line=dict(color='#8B5CF6', width=2),
-                mode='lines+markers',
-                marker=dict(size=6)
-            ))
-
-            fig_evo.update_layout(
-                paper_bgcolor='rgba(0,0,0,0)',
-                plot_bgcolor='rgba(0,0,0,0)',
-                margin=dict(t=10, b=0, l=0, r=0),
-                xaxis_title=None,
-                yaxis_title="Taxa %",
-                legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
-                font=dict(color="#fff"),
-                height=400,
-                yaxis=dict(range=[0, 105], gridcolor='rgba(255,255,255,0.05)')
-            )
-
-            st.plotly_chart(fig_evo, use_container_width=True)
+            st.plotly_chart(pio.from_json(painel["evolucao"]), use_container_width=True)
             st.markdown('</div>', unsafe_allow_html=True)
         else:
             st.info("📚 Registre seus primeiros estudos para ver o gráfico de evolução!")
@@ -4583,6 +4858,12 @@ if st.session_state.missao_ativa is not None:
     elif menu == "Simulados":
         st.markdown('<h2 class="main-title">🏆 Área de Simulados</h2>', unsafe_allow_html=True)
         
+        df_simulados = carregar_simulados()
+        
+        # Detalhamento por matéria vem da tabela simulado_materias (cache por versão dos dados)
+        versao_sim = get_versoes_dados().atual(user_id, missao, "simulados")
+        notas_simulados = get_simulado_materias(missao, user_id, versao_sim)
+        
         col_sim1, col_sim2 = st.columns([1, 2])
         
         with col_sim1:
@@ -4634,9 +4915,6 @@ if st.session_state.missao_ativa is not None:
                             if total_questoes == 0:
                                 st.error("❌ O total de questões não pode ser zero.")
                             else:
-                                # Gerar string de detalhes
-                                detalhes = " | ".join([f"{k}: {v['ac']}/{v['to']}" for k, v in notas_por_materia.items() if v['to'] > 0])
-                                
                                 simulado_data = {
                                     "data_estudo": data_sim.strftime("%Y-%m-%d"),
                                     "materia": "SIMULADO",
@@ -4648,17 +4926,16 @@ if st.session_state.missao_ativa is not None:
                                     "concurso": st.session_state.missao_ativa,
                                     "rev_24h": True, "rev_07d": True, "rev_15d": True, "rev_30d": True,
                                     "dificuldade": "Simulado",
-                                    "comentarios": f"Banca: {banca_sim} | Detalhes: {detalhes}",
+                                    "tipo": "simulado",
+                                    "comentarios": f"Banca: {banca_sim}",
                                     "user_id": user_id  # MULTI-USER: Essencial para filtrar dados por usuário
                                 }
                                 try:
-                                    supabase.table("registros_estudos").insert(simulado_data).execute()
-                                    
-                                    # LIMPAR CACHE APÓS OPERAÇÃO
-                                    st.cache_data.clear()
+                                    res_sim = supabase.table("registros_estudos").insert(simulado_data).execute()
+                                    salvar_notas_simulado(res_sim.data[0]['id'], st.session_state.missao_ativa, notas_por_materia)
+                                    get_simulados_multi(user_id).anexar_local(res_sim.data[0])
                                     
-                                    st.success(f"🏆 Simulado registrado! Total: {total_acertos}/{total_questoes}")
-                                    time.sleep(1)
+                                    flash(f"🏆 Simulado registrado! Total: {total_acertos}/{total_questoes}")
                                     st.rerun()
                                 except Exception as e:
                                     st.error(f"❌ Erro: {e}")
@@ -4688,26 +4965,8 @@ if st.session_state.missao_ativa is not None:
                 st.markdown("##### 📈 Análise Vertical Acumulada")
                 st.markdown("<p style='font-size: 0.8rem; color: #94A3B8; margin-bottom: 15px;'>Desempenho consolidado de todas as disciplinas em todos os simulados.</p>", unsafe_allow_html=True)
                 
-                # Consolidar dados de todas as matérias de todos os simulados
-                consolidado = {}
-                for _, row in df_simulados.iterrows():
-                    coments = row.get('comentarios', '')
-                    if "Detalhes:" in coments:
-                        try:
-                            det_str = coments.split("Detalhes:")[1].strip()
-                            items = [it.strip() for it in det_str.split("|")]
-                            for item in items:
-                                if ":" in item:
-                                    mat, score = item.split(":", 1)
-                                    if "/" in score:
-                                        ac, to = score.split("/")
-                                        m_name = mat.strip()
-                                        if m_name not in consolidado:
-                                            consolidado[m_name] = {"ac": 0, "to": 0}
-                                        consolidado[m_name]["ac"] += int(ac)
-                                        consolidado[m_name]["to"] += int(to)
-                        except Exception:
-                            continue
+                # Consolidado de todas as matérias de todos os simulados (agregado em cache)
+                consolidado = get_analise_vertical(missao, user_id, versao_sim)
                 
                 if consolidado:
                     st.markdown("<div style='display: grid; grid-template-columns: 1fr 1fr; gap: 15px; margin-bottom: 25px;'>", unsafe_allow_html=True)
@@ -4762,16 +5021,11 @@ if st.session_state.missao_ativa is not None:
                         st.divider()
                         st.markdown("##### 📊 Desempenho por Disciplina")
                         
-                        # Extrair notas atuais dos comentários
-                        coments = registro_sim_edit.get('comentarios', '')
-                        notas_atuais = {}
-                        if "Detalhes:" in coments:
-                            det_str = coments.split("Detalhes:")[1].strip()
-                            for item in det_str.split("|"):
-                                if ":" in item:
-                                    m, s = item.split(":", 1)
-                                    if "/" in s:
-                                        notas_atuais[m.strip()] = s.strip().split("/")
+                        # Notas atuais por matéria
+                        notas_atuais = {
+                            n['materia']: [n['acertos'], n['total']]
+                            for n in notas_simulados.get(st.session_state.edit_id_simulado, [])
+                        }
                         
                         novas_notas = {}
                         for m_name in mats_edital:
@@ -4794,24 +5048,23 @@ if st.session_state.missao_ativa is not None:
                                 tot_to = sum(v['to'] for v in novas_notas.values())
                                 
                                 if tot_to > 0:
-                                    det_novos = " | ".join([f"{k}: {v['ac']}/{v['to']}" for k, v in novas_notas.items() if v['to'] > 0])
-                                    
                                     try:
-                                        supabase.table("registros_estudos").update({
+                                        res_upd = supabase.table("registros_estudos").update({
                                             "data_estudo": data_sim_ed.strftime("%Y-%m-%d"),
                                             "assunto": f"{nome_sim_ed} | {banca_sim_ed}",
                                             "tempo": t_b_ed,
                                             "acertos": tot_ac,
                                             "total": tot_to,
                                             "taxa": (tot_ac/tot_to*100),
-                                            "comentarios": f"Banca: {banca_sim_ed} | Detalhes: {det_novos}"
+                                            "comentarios": f"Banca: {banca_sim_ed}"
                                         }).eq("id", st.session_state.edit_id_simulado).execute()
+                                        salvar_notas_simulado(st.session_state.edit_id_simulado, missao, novas_notas)
+                                        if res_upd.data:
+                                            get_simulados_multi(user_id).atualizar_local(st.session_state.edit_id_simulado, res_upd.data[0], missao)
+                                        else:
+                                            get_simulados_multi(user_id).invalidar()
                                         
-                                        # LIMPAR CACHE APÓS OPERAÇÃO
-                                        st.cache_data.clear()
-                                        
-                                        st.success("✅ Simulado atualizado!")
-                                        time.sleep(1)
+                                        flash("✅ Simulado atualizado!")
                                         st.session_state.edit_id_simulado = None
                                         st.rerun()
                                     except Exception as e:
@@ -4849,39 +5102,27 @@ if st.session_state.missao_ativa is not None:
                             </div>
                         """, unsafe_allow_html=True)
                         
-                        # Extrair detalhamento do comentário
-                        # Formato: "Banca: X | Detalhes: Materia: A/B | Materia2: C/D"
-                        comentario = row.get('comentarios', '')
-                        if "Detalhes:" in comentario:
-                            try:
-                                detalhes_str = comentario.split("Detalhes:")[1].strip()
-                                items = [it.strip() for it in detalhes_str.split("|")]
+                        # Detalhamento por matéria
+                        notas_row = notas_simulados.get(row['id'], [])
+                        if notas_row:
+                            st.markdown("<div style='display: grid; grid-template-columns: 1fr 1fr; gap: 10px;'>", unsafe_allow_html=True)
+                            for nota in notas_row:
+                                mat, ac, to = nota['materia'], int(nota['acertos']), int(nota['total'])
+                                perc = (ac / to * 100) if to > 0 else 0
+                                bar_color = "#10B981" if perc >= 75 else "#F59E0B" if perc >= 50 else "#EF4444"
                                 
-                                st.markdown("<div style='display: grid; grid-template-columns: 1fr 1fr; gap: 10px;'>", unsafe_allow_html=True)
-                                for item in items:
-                                    if ":" in item:
-                                        mat, score = item.split(":", 1)
-                                        if "/" in score:
-                                            ac, to = score.split("/")
-                                            perc = (int(ac)/int(to)*100) if int(to) > 0 else 0
-                                            bar_color = "#10B981" if perc >= 75 else "#F59E0B" if perc >= 50 else "#EF4444"
-                                            
-                                            st.markdown(f"""
-                                            <div style="background: rgba(255,255,255,0.05); padding: 10px; border-radius: 8px; cursor: help;" title="{mat}: {score.strip()} acertos ({int(perc)}%)">
-                                                <div style="display: flex; justify-content: space-between; font-size: 0.75rem; color: #E2E8F0; margin-bottom: 4px;">
-                                                    <span>{mat}</span>
-                                                    <span style="font-weight: 700;">{score.strip()} ({int(perc)}%)</span>
-                                                </div>
-                                                <div style="height: 4px; background: rgba(255,255,255,0.1); border-radius: 2px; overflow: hidden;">
-                                                    <div style="width: {perc}%; height: 100%; background: {bar_color};"></div>
-                                                </div>
-                                            </div>
-                                            """, unsafe_allow_html=True)
-                                st.markdown("</div>", unsafe_allow_html=True)
-                            except Exception:
-                                (f"Ref: {comentario}")
-                        else:
-                            (f"Notas: {comentario}")
+                                st.markdown(f"""
+                                <div style="background: rgba(255,255,255,0.05); padding: 10px; border-radius: 8px; cursor: help;" title="{mat}: {ac}/{to} acertos ({int(perc)}%)">
+                                    <div style="display: flex; justify-content: space-between; font-size: 0.75rem; color: #E2E8F0; margin-bottom: 4px;">
+                                        <span>{mat}</span>
+                                        <span style="font-weight: 700;">{ac}/{to} ({int(perc)}%)</span>
+                                    </div>
+                                    <div style="height: 4px; background: rgba(255,255,255,0.1); border-radius: 2px; overflow: hidden;">
+                                        <div style="width: {perc}%; height: 100%; background: {bar_color};"></div>
+                                    </div>
+                                </div>
+                                """, unsafe_allow_html=True)
+                            st.markdown("</div>", unsafe_allow_html=True)
                             
                         st.markdown("</div>", unsafe_allow_html=True)
                         
@@ -4895,13 +5136,12 @@ if st.session_state.missao_ativa is not None:
                             if st.session_state.get(f"confirm_del_sim_{row['id']}", False):
                                 try:
                                     supabase.table("registros_estudos").delete().eq("id", row['id']).eq("user_id", user_id).execute()
+                                    # Notas por matéria saem em cascata (FK)
+                                    get_versoes_dados().incrementar(user_id, missao, "simulados")
+                                    get_simulados_multi(user_id).remover_local(row['id'], missao)
                                     
-                                    # LIMPAR CACHE APÓS OPERAÇÃO
-                                    st.cache_data.clear()
-                                    
-                                    st.toast("✅ Simulado excluído!")
+                                    flash("✅ Simulado excluído!")
                                     st.session_state[f"confirm_del_sim_{row['id']}"] = False
-                                    time.sleep(1)
                                     st.rerun()
                                 except Exception as e:
                                     st.error(f"❌ Erro ao excluir: {e}")
@@ -4922,54 +5162,48 @@ if st.session_state.missao_ativa is not None:
             st.markdown('<h2 class="main-title">📜 Histórico de Estudos</h2>', unsafe_allow_html=True)
         
             if not df.empty:
-                df_h = df.copy()
-                df_h['data_estudo_display'] = pd.to_datetime(df_h['data_estudo']).dt.strftime('%d/%m/%Y')
-            
                 st.markdown('<div class="modern-card">', unsafe_allow_html=True)
             
-                # Filtros
+                # Filtros (aplicados no servidor)
                 col_f1, col_f2, col_f3, col_f4 = st.columns(4)
                 with col_f1:
-                    mat_filter = st.selectbox("Filtrar por Matéria:", ["Todas"] + list(df_h['materia'].unique()), key="mat_hist_filter")
+                    mat_filter = st.selectbox("Filtrar por Matéria:", ["Todas"] + list(df['materia'].unique()), key="mat_hist_filter")
                 with col_f2:
                     rel_options = ["Todas"] + list(range(1, 11))
                     rel_filter = st.selectbox("Filtrar por Relevância:", rel_options, index=0, key="rel_hist_filter")
                 with col_f3:
-                    ordem = st.selectbox("Ordenar por:", ["Mais Recente", "Mais Antigo", "Maior Taxa", "Menor Taxa", "Maior Relevância"], key="ord_hist")
+                    ordem = st.selectbox("Ordenar por:", list(ORDENACAO_HISTORICO.keys()), key="ord_hist")
                 with col_f4:
-                    ("")  # Espaçamento
-            
-                # Aplicar filtros
-                df_filtered = df_h.copy()
-                if mat_filter != "Todas":
-                    df_filtered = df_filtered[df_filtered['materia'] == mat_filter]
+                    tamanho_pagina = st.selectbox("Registros por página:", [10, 25, 50, 100], index=1, key="tam_hist")
                 
-                # Filtrar por relevância (considerando 5 como padrão se nulo ou coluna ausente)
-                df_filtered['rel_val'] = df_filtered['relevancia'].fillna(5).astype(int) if 'relevancia' in df_filtered.columns else 5
+                # Pilha de cursores da paginação: reinicia quando filtros/ordem mudam
+                assinatura_hist = (missao, mat_filter, rel_filter, ordem, tamanho_pagina)
+                if st.session_state.get('hist_assinatura') != assinatura_hist:
+                    st.session_state.hist_assinatura = assinatura_hist
+                    st.session_state.hist_cursores = [None]
+                cursores = st.session_state.hist_cursores
                 
-                if rel_filter != "Todas":
-                    df_filtered = df_filtered[df_filtered['rel_val'] == int(rel_filter)]
-            
-                # Aplicar ordenação
-                if ordem == "Mais Recente":
-                    df_filtered = df_filtered.sort_values('data_estudo', ascending=False)
-                elif ordem == "Mais Antigo":
-                    df_filtered = df_filtered.sort_values('data_estudo', ascending=True)
-                elif ordem == "Maior Taxa":
-                    df_filtered = df_filtered.sort_values('taxa', ascending=False)
-                elif ordem == "Menor Taxa":
-                    df_filtered = df_filtered.sort_values('taxa', ascending=True)
-                elif ordem == "Maior Relevância":
-                    df_filtered = df_filtered.sort_values('rel_val', ascending=False)
+                registros_pagina, tem_proxima = get_historico_pagina(
+                    missao, user_id, mat_filter, rel_filter, ordem, cursores[-1], tamanho_pagina
+                )
+                df_filtered = pd.DataFrame(registros_pagina)
+                if not df_filtered.empty:
+                    df_filtered['data_estudo_display'] = pd.to_datetime(df_filtered['data_estudo']).dt.strftime('%d/%m/%Y')
             
                 st.divider()
             
-                # Resumo
-                total_registros = len(df_filtered)
-                total_acertos_hist = df_filtered['acertos'].sum()
-                total_questoes_hist = df_filtered['total'].sum()
+                # Resumo de todos os registros filtrados (agregado sobre o cache, sem renderizar linhas)
+                mascara = pd.Series(True, index=df.index)
+                if mat_filter != "Todas":
+                    mascara &= df['materia'] == mat_filter
+                if rel_filter != "Todas":
+                    mascara &= df['relevancia'].fillna(5).astype(int) == int(rel_filter)
+                df_resumo = df.loc[mascara, ['acertos', 'total', 'tempo']]
+                total_registros = len(df_resumo)
+                total_acertos_hist = df_resumo['acertos'].sum()
+                total_questoes_hist = df_resumo['total'].sum()
                 taxa_media = (total_acertos_hist / total_questoes_hist * 100) if total_questoes_hist > 0 else 0
-                tempo_total = df_filtered['tempo'].sum() / 60
+                tempo_total = df_resumo['tempo'].sum() / 60
             
                 col_info1, col_info2, col_info3 = st.columns(3)
                 col_info1.metric("📝 Registros", total_registros)
@@ -4980,7 +5214,10 @@ if st.session_state.missao_ativa is not None:
             
                 # --- MODAL DE EDIÇÃO ---
                 if st.session_state.edit_id is not None:
-                    registro_edit = df[df['id'] == st.session_state.edit_id].iloc[0]
+                    if not df_filtered.empty and st.session_state.edit_id in df_filtered['id'].values:
+                        registro_edit = df_filtered[df_filtered['id'] == st.session_state.edit_id].iloc[0]
+                    else:
+                        registro_edit = anexar_comentarios(df[df['id'] == st.session_state.edit_id]).iloc[0]
                 
                     st.markdown('<div class="modern-card" style="border: 2px solid rgba(255, 75, 75, 0.3); background: rgba(255, 75, 75, 0.05);">', unsafe_allow_html=True)
                     st.markdown("### ✏️ Editar Registro")
@@ -5076,7 +5313,7 @@ if st.session_state.missao_ativa is not None:
                                 try:
                                     taxa = (ac_edit/to_edit*100 if to_edit > 0 else 0)
                                 
-                                    supabase.table("registros_estudos").update({
+                                    res_upd = supabase.table("registros_estudos").update({
                                         "data_estudo": dt_edit.strftime('%Y-%m-%d'),
                                         "materia": mat_edit,
                                         "assunto": ass_edit,
@@ -5093,11 +5330,15 @@ if st.session_state.missao_ativa is not None:
                                         "rev_30d": bool(not gerar_rev_edit if not gerar_rev_edit else (False if foi_concluido else registro_edit['rev_30d']))
                                     }).eq("id", st.session_state.edit_id).execute()
                                 
-                                    # LIMPAR CACHE APÓS OPERAÇÃO
-                                    st.cache_data.clear()
+                                    # Só a linha editada muda no store; páginas do histórico e anotações são relidas
+                                    if res_upd.data:
+                                        get_estudos_multi(user_id).atualizar_local(st.session_state.edit_id, res_upd.data[0], missao)
+                                    else:
+                                        get_estudos_multi(user_id).invalidar()
+                                    get_historico_pagina.clear()
+                                    get_comentarios_cached.clear()
                                 
-                                    st.success("✅ Registro atualizado com sucesso!")
-                                    time.sleep(1)
+                                    flash("✅ Registro atualizado com sucesso!")
                                     st.session_state.edit_id = None
                                     st.rerun()
                                 except Exception as e:
@@ -5179,11 +5420,10 @@ if st.session_state.missao_ativa is not None:
                                         if st.session_state.get(f"confirm_delete_{row['id']}", False):
                                             supabase.table("registros_estudos").delete().eq("id", row['id']).eq("user_id", user_id).execute()
                                             
-                                            # LIMPAR CACHE APÓS OPERAÇÃO
-                                            st.cache_data.clear()
+                                            get_estudos_multi(user_id).remover_local(row['id'], missao)
+                                            get_historico_pagina.clear()
                                             
-                                            st.toast("✅ Registro excluído com sucesso!", icon="✅")
-                                            time.sleep(0.5)
+                                            flash("✅ Registro excluído com sucesso!")
                                             st.session_state[f"confirm_delete_{row['id']}"] = False
                                             st.rerun()
                                         else:
@@ -5198,6 +5438,18 @@ if st.session_state.missao_ativa is not None:
                         
                             st.markdown('</div>', unsafe_allow_html=True)
             
+                # Navegação entre páginas
+                col_p1, col_p2, col_p3 = st.columns([1, 2, 1])
+                if col_p1.button("◀ Anterior", key="hist_anterior", disabled=len(cursores) == 1, use_container_width=True):
+                    cursores.pop()
+                    st.rerun()
+                col_p2.markdown(f"<p style='text-align: center; color: #adb5bd; margin-top: 8px;'>Página {len(cursores)}</p>", unsafe_allow_html=True)
+                if col_p3.button("Próxima ▶", key="hist_proxima", disabled=not tem_proxima, use_container_width=True):
+                    ultimo = registros_pagina[-1]
+                    coluna_chave = ORDENACAO_HISTORICO[ordem][0]
+                    cursores.append((ultimo[coluna_chave], ultimo['id']))
+                    st.rerun()
+            
                 st.markdown('</div>', unsafe_allow_html=True)
             else:
                 st.info("📚 Nenhum registro de estudo encontrado ainda. Comece a estudar!")
@@ -5207,10 +5459,16 @@ if st.session_state.missao_ativa is not None:
         st.markdown(f'<h1 style="background: linear-gradient(135deg, #8B5CF6, #06B6D4); -webkit-background-clip: text; -webkit-text-fill-color: transparent; font-size:2.5rem; margin-bottom:1rem;">📑 Central de Relatórios</h1>', unsafe_allow_html=True)
         st.markdown("<p style='color: #94A3B8; font-size: 1.1rem;'>Gere documentos consolidados e análises estratégicas para o seu estudo.</p>", unsafe_allow_html=True)
         
+        df_simulados = carregar_simulados()
+        
         st.divider()
         
         # Calcular Projeção (USANDO FUNÇÃO CORRIGIDA)
-        proj = calcular_projecao_conclusao(df_estudos, dados)
+        edital_chave = (dados.get('data_prova'), tuple((m, tuple(a)) for m, a in dados.get('materias', {}).items()))
+        proj = get_projecao_cached(
+            user_id, missao, versao_estudos(missao), get_br_date(),
+            edital_chave, df_estudos, dados, get_indice_cobertura(missao, df_estudos)
+        )
         
         # VISUALIZAÇÃO DE PROJEÇÃO (FULL WIDTH)
         if proj:
@@ -5233,10 +5491,27 @@ if st.session_state.missao_ativa is not None:
                         <div style="flex: 1; min-width: 200px;">
                             <div style="color: #94A3B8; font-size: 0.7rem;">RITMO (Tópicos/sem)</div>
                             <div style="color: #10B981; font-size: 1.2rem; font-weight: 700;">{proj['ritmo']:.1f}</div>
+                            <div style="color: #64748B; font-size: 0.7rem;">7d: {proj['ritmos'][7]:.1f} · 30d: {proj['ritmos'][30]:.1f} · 90d: {proj['ritmos'][90]:.1f}</div>
                         </div>
                     </div>
                 </div>
             """, unsafe_allow_html=True)
+            
+            if proj['data_prova']:
+                if proj['no_prazo']:
+                    st.success(f"✅ No ritmo atual, o edital termina antes da prova ({proj['data_prova'].strftime('%d/%m/%Y')}).")
+                else:
+                    st.warning(f"⚠️ No ritmo atual, o edital termina depois da prova ({proj['data_prova'].strftime('%d/%m/%Y')}).")
+            
+            with st.expander("📈 Cobertura acumulada e término por matéria", expanded=False):
+                st.line_chart(proj['serie'][['cobertura']], height=220)
+                df_proj_mat = pd.DataFrame(proj['materias'])
+                df_proj_mat['Término'] = df_proj_mat['data_fim'].apply(lambda d: d.strftime('%d/%m/%Y') if pd.notna(d) else '—')
+                colunas_proj = {'materia': 'Matéria', 'estudados': 'Estudados', 'total': 'Tópicos', 'Término': 'Término'}
+                if 'no_prazo' in df_proj_mat.columns:
+                    df_proj_mat['Antes da prova'] = df_proj_mat['no_prazo'].map({True: '✅', False: '⚠️'})
+                    colunas_proj['Antes da prova'] = 'Antes da prova'
+                st.dataframe(df_proj_mat[list(colunas_proj)].rename(columns=colunas_proj), hide_index=True, use_container_width=True)
         else:
             st.info("Cadastre o edital para ver a previsão.")
 
@@ -5260,7 +5535,7 @@ if st.session_state.missao_ativa is not None:
             # Botão fora do HTML para funcionar o Streamlit
             if st.button("🚀 Gerar PDF Estratégico", use_container_width=True, key="btn_gerar_pdf"):
                 try:
-                    pdf_bytes = gerar_pdf_estratégico(df_estudos, missao, df_raw, proj)
+                    pdf_bytes = gerar_pdf_estratégico(df_estudos, missao, pd.concat([df_estudos, df_simulados], ignore_index=True), proj, get_prioridades(missao, df_estudos))
                     st.success("✅ Relatório gerado!")
                     st.download_button(
                         label="📥 Baixar (PDF)",
@@ -5316,7 +5591,6 @@ if st.session_state.missao_ativa is not None:
             
             if st.button("📜 Gerar Histórico Simulados", use_container_width=True, key="btn_gerar_pdf_sim"):
                 try:
-                    # Garantir que df_simulados esteja disponível
                     pdf_bytes_s = gerar_pdf_simulados(df_simulados, missao)
                     st.success("✅ Histórico gerado!")
                     st.download_button(
@@ -5334,7 +5608,6 @@ if st.session_state.missao_ativa is not None:
         # --- SEÇÃO: BENCHMARK DE SIMULADOS ---
         st.markdown('<h3 style="color: #fff; margin-bottom: 20px;">📈 Benchmark de Simulados</h3>', unsafe_allow_html=True)
         
-        # Usar df_simulados carregado no início da aplicação
         df_sim_bench = df_simulados.sort_values('data_estudo')
         
         if df_sim_bench.empty:
@@ -5345,12 +5618,18 @@ if st.session_state.missao_ativa is not None:
             with col_b1:
                 st.markdown('<div class="modern-card">', unsafe_allow_html=True)
                 # Configurar Nota de Corte
-                st.session_state.nota_corte_alvo = st.slider(
+                nova_nota_corte = st.slider(
                     "Sua Nota de Corte Alvo (%)", 
                     min_value=50, max_value=100, 
                     value=st.session_state.nota_corte_alvo,
                     step=1
                 )
+                if nova_nota_corte != st.session_state.nota_corte_alvo:
+                    st.session_state.nota_corte_alvo = nova_nota_corte
+                    try:
+                        salvar_configuracoes(nota_corte_alvo=int(nova_nota_corte))
+                    except Exception as e:
+                        st.warning(f"⚠️ Nota de corte não foi salva: {e}")
                 
                 # Métricas de Evolução
                 ult_nota = df_sim_bench['taxa'].iloc[-1]
@@ -5426,21 +5705,12 @@ if st.session_state.missao_ativa is not None:
         st.markdown('### ⭐ Missão Principal', unsafe_allow_html=True)
         st.markdown('<p style="color: #94A3B8; font-size: 0.9rem; margin-bottom: 15px;">A missão marcada como principal será carregada automaticamente quando você abrir o app.</p>', unsafe_allow_html=True)
         
-        ed = get_editais(supabase, user_id)
+        ed = get_editais_cached(user_id)
         if ed:
-            # Buscar qual é a missão principal atual (com verificação mais robusta)
-            try:
-                res_principal = supabase.table("editais_materias").select("concurso, is_principal").eq("is_principal", True).eq("user_id", user_id).execute()
-                if res_principal.data and len(res_principal.data) > 0:
-                    missao_principal_atual = res_principal.data[0]['concurso']
-                    # Debug: mostrar quantas linhas têm is_principal = True
-                    if len(res_principal.data) > 1:
-                        st.info(f"🔍 Debug: {len(res_principal.data)} registros marcados como principal para '{missao_principal_atual}'")
-                else:
-                    missao_principal_atual = None
-            except Exception as e:
+            # Missão principal atual (já veio no snapshot do usuário)
+            missao_principal_atual = get_snapshot_usuario(user_id)["settings"].get('missao_principal')
+            if missao_principal_atual not in ed:
                 missao_principal_atual = None
-                st.warning(f"⚠️ Erro ao buscar missão principal: {e}")
             
             col_principal1, col_principal2 = st.columns([3, 1])
             
@@ -5460,25 +5730,11 @@ if st.session_state.missao_ativa is not None:
                 ("")  # Espaçamento
                 if st.button("⭐ Definir", use_container_width=True, type="primary", key="btn_definir_principal"):
                     try:
-                        # PASSO 1: Remover is_principal de TODAS as linhas
-                        update_all = supabase.table("editais_materias").update({"is_principal": False}).neq("id", 0).eq("user_id", user_id).execute()
-                        
-                        # PASSO 2: Marcar TODAS as linhas da missão escolhida como principal
-                        update_principal = supabase.table("editais_materias").update({"is_principal": True}).eq("concurso", nova_principal).eq("user_id", user_id).execute()
-                        
-                        # Verificar se funcionou
-                        verificacao = supabase.table("editais_materias").select("concurso").eq("is_principal", True).eq("user_id", user_id).execute()
-                        
-                        if verificacao.data and verificacao.data[0]['concurso'] == nova_principal:
-                            st.success(f"✅ '{nova_principal}' definida como missão principal!")
-                            st.info(f"💡 {len(verificacao.data)} registro(s) marcado(s). Esta missão será carregada automaticamente.")
-                            
-                            # LIMPAR CACHE APÓS OPERAÇÃO
-                            st.cache_data.clear()
-                        else:
-                            st.warning("⚠️ Missão salva, mas verificação falhou. Tente novamente.")
+                        # Um único upsert na linha de configurações do usuário
+                        salvar_configuracoes(missao_principal=nova_principal)
+                        flash(f"✅ '{nova_principal}' definida como missão principal!")
+                        flash("💡 Esta missão será carregada automaticamente.", "info")
                         
-                        time.sleep(2)
                         st.rerun()
                     except Exception as e:
                         st.error(f"❌ Erro ao definir missão principal: {e}")
@@ -5503,7 +5759,7 @@ if st.session_state.missao_ativa is not None:
         
         # TAB 1: SELECIONAR MISSÃO
         with tabs_missoes[0]:
-            ed = get_editais(supabase, user_id)
+            ed = get_editais_cached(user_id)
             if ed:
                 nomes_missoes = list(ed.keys())
                 try:
@@ -5522,8 +5778,7 @@ if st.session_state.missao_ativa is not None:
                 if st.button("✅ Aplicar Mudança", use_container_width=True, type="primary"):
                     if nova_missao != missao:
                         st.session_state.missao_ativa = nova_missao
-                        st.success(f"✅ Missão alterada para: {nova_missao}")
-                        time.sleep(1)
+                        flash(f"✅ Missão alterada para: {nova_missao}")
                         st.rerun()
                     else:
                         st.info("Esta missão já está ativa.")
@@ -5567,32 +5822,28 @@ if st.session_state.missao_ativa is not None:
                             if check_existente.data:
                                 st.error(f"❌ Já existe uma missão com o nome '{nome_novo_concurso}'!")
                             else:
-                                # Se marcar como principal, desmarcar todas as outras primeiro
-                                if marcar_como_principal:
-                                    supabase.table("editais_materias").update({"is_principal": False}).neq("id", 0).eq("user_id", user_id).execute()
-                                
         # MULTI-USER: user_id adicionado ✅
                                 payload = {
                                     "concurso": nome_novo_concurso,
                                     "cargo": cargo_novo_concurso,
                                     "materia": "Geral",
                                     "topicos": ["Introdução"],
-                                    "is_principal": marcar_como_principal,
                                     "user_id": user_id
                                 }
                                 if data_nova_prova:
                                     payload["data_prova"] = data_nova_prova.strftime("%Y-%m-%d")
                                 
-                                supabase.table("editais_materias").insert(payload).execute()
+                                criar_materias([payload])
+                                if marcar_como_principal:
+                                    salvar_configuracoes(missao_principal=nome_novo_concurso)
                                 
                                 msg_principal = " e definida como principal" if marcar_como_principal else ""
-                                st.success(f"✅ Missão '{nome_novo_concurso}' criada{msg_principal}!")
-                                st.info("💡 Você pode ativá-la na aba 'Selecionar Missão' ou no HOME.")
+                                flash(f"✅ Missão '{nome_novo_concurso}' criada{msg_principal}!")
+                                flash("💡 Você pode ativá-la na aba 'Selecionar Missão' ou no HOME.", "info")
                                 
                                 # LIMPAR CACHE APÓS OPERAÇÃO
-                                st.cache_data.clear()
+                                limpar_cache_dados()
                                 
-                                time.sleep(2)
                                 st.rerun()
                         except Exception as e:
                             st.error(f"❌ Erro ao criar missão: {e}")
@@ -5601,7 +5852,7 @@ if st.session_state.missao_ativa is not None:
         
         # TAB 3: EXCLUIR MISSÃO
         with tabs_missoes[2]:
-            ed_exclusao = get_editais(supabase, user_id)
+            ed_exclusao = get_editais_cached(user_id)
             if not ed_exclusao:
                 st.info("Nenhuma missão disponível para exclusão.")
             else:
@@ -5622,16 +5873,16 @@ if st.session_state.missao_ativa is not None:
                     if st.button("🗑️ EXCLUIR MISSÃO PERMANENTEMENTE", type="primary", use_container_width=True):
                         try:
                             if excluir_concurso_completo(supabase, missao_para_excluir):
-                                st.success(f"✅ Missão '{missao_para_excluir}' excluída com sucesso!")
+                                flash(f"✅ Missão '{missao_para_excluir}' excluída com sucesso!")
                                 
                                 # Se era a missão ativa, resetar
                                 if missao_para_excluir == missao:
                                     st.session_state.missao_ativa = None
                                 
                                 # LIMPAR CACHE APÓS OPERAÇÃO
-                                st.cache_data.clear()
+                                limpar_cache_dados()
+                                get_versoes_dados().incrementar(user_id, missao_para_excluir, "estudos")
                                 
-                                time.sleep(2)
                                 st.rerun()
                             else:
                                 st.error("❌ Erro ao excluir missão.")
@@ -5680,13 +5931,12 @@ if st.session_state.missao_ativa is not None:
                 
                     if res.data:
                         # 2. LIMPA A MEMÓRIA DO APP
-                        st.cache_data.clear() 
+                        limpar_cache_dados()
                     
                         # 3. ATUALIZA O ESTADO PARA FORÇAR RECARREGAMENTO
                         st.session_state.missao_ativa = missao
                     
-                        st.success(f"✅ Data atualizada no banco! Recarregando...")
-                        time.sleep(1)
+                        flash(f"✅ Data atualizada no banco! Recarregando...")
                         st.rerun()
                 except Exception as e:
                     st.error(f"❌ Erro ao salvar: {e}")
@@ -5700,8 +5950,7 @@ if st.session_state.missao_ativa is not None:
         
             # Buscar matérias do banco de dados
             try:
-                res_materias = supabase.table("editais_materias").select("id, materia, topicos").eq("concurso", missao).eq("user_id", user_id).execute()
-                registros_materias = res_materias.data
+                registros_materias = get_materias_edital(supabase, user_id, missao)
             except Exception as e:
                 st.error(f"Erro ao buscar matérias: {e}")
                 registros_materias = []
@@ -5739,50 +5988,23 @@ if st.session_state.missao_ativa is not None:
                         with col_btn1:
                             if st.button("🚨 EXCLUIR MATÉRIAS SELECIONADAS", type="primary", use_container_width=True):
                                 try:
-                                    contador_exclusoes = 0
-                                    contador_registros = 0
+                                    # Cascata atômica no servidor (matérias + registros) em uma chamada
+                                    resultado = supabase.rpc("excluir_materias", {
+                                        "p_ids": [mat['id'] for mat in materias_selecionadas],
+                                        "p_user_id": user_id,
+                                    }).execute()
+                                    contagens = resultado.data[0] if resultado.data else {}
+                                    contador_exclusoes = contagens.get('materias', 0)
+                                    contador_registros = contagens.get('registros', 0)
                                 
-                                    for mat in materias_selecionadas:
-                                        # Primeiro, contar registros de estudos associados a esta matéria
-                                        try:
-                                            res_contagem = supabase.table("registros_estudos")\
-                                                .select("id", count="exact")\
-                                                .eq("concurso", missao)\
-                                                .eq("materia", mat['materia'])\
-                                                .execute()
-                                        
-                                            # CORREÇÃO: Verificar se count existe e não é None
-                                            if hasattr(res_contagem, 'count') and res_contagem.count is not None:
-                                                contador_registros += res_contagem.count
-                                        except Exception:
-                                            # Se não conseguir contar, continuar mesmo assim
-                                            pass
-                                    
-                                        # Excluir registros de estudos dessa matéria
-                                        try:
-                                            supabase.table("registros_estudos").delete()\
-                                                .eq("concurso", missao)\
-                                                .eq("materia", mat['materia'])\
-                                                .execute()
-                                        except Exception as e:
-                                            st.warning(f"Aviso: Não foi possível excluir todos os registros de '{mat['materia']}': {e}")
-                                    
-                                        # Excluir a matéria da tabela editais_materias
-                                        try:
-                                            supabase.table("editais_materias").delete().eq("id", mat['id']).eq("user_id", user_id).execute()
-                                            contador_exclusoes += 1
-                                        except Exception as e:
-                                            st.error(f"Erro ao excluir matéria '{mat['materia']}': {e}")
-                                
-                                    st.success(f"✅ **{contador_exclusoes} matéria(s) excluída(s) com sucesso!**")
+                                    flash(f"✅ **{contador_exclusoes} matéria(s) excluída(s) com sucesso!**")
                                     if contador_registros > 0:
-                                        st.info(f"🗑️ **{contador_registros} registro(s) de estudo relacionados foram removidos.**")
+                                        flash(f"🗑️ **{contador_registros} registro(s) de estudo relacionados foram removidos.**", "info")
                                 
                                     # LIMPAR CACHE APÓS OPERAÇÃO
-                                    st.cache_data.clear()
+                                    limpar_cache_dados()
                                     
                                     # Recarregar
-                                    time.sleep(2)
                                     st.rerun()
                                 
                                 except Exception as e:
@@ -5802,6 +6024,8 @@ if st.session_state.missao_ativa is not None:
                 for reg in registros_materias:
                     materia = reg['materia']
                     topicos = reg['topicos'] if reg['topicos'] else []
+                    topico_ids = reg.get('topico_ids') or []
+                    ultima_ordem = reg.get('ultima_ordem', len(topicos))
                     id_registro = reg['id']
                 
                     with st.expander(f"📖 {materia} ({len(topicos)} assuntos)"):
@@ -5814,16 +6038,17 @@ if st.session_state.missao_ativa is not None:
                                 # Botão para remover assunto
                                 if col2.button("🗑️", key=f"del_{id_registro}_{i}", help="Remover assunto", use_container_width=True):
                                     try:
-                                        # Remover o tópico da lista
-                                        novos_topicos = [t for t in topicos if t != topico]
-                                        # Atualizar no banco
-                                        supabase.table("editais_materias").update({"topicos": novos_topicos}).eq("id", id_registro).eq("user_id", user_id).execute()
-                                        st.success(f"✅ Assunto '{topico}' removido!")
+                                        # Exclusão lógica de uma única linha em topicos
+                                        supabase.table("topicos")\
+                                            .update({"excluido_em": datetime.datetime.now(datetime.timezone.utc).isoformat()})\
+                                            .eq("id", topico_ids[i])\
+                                            .eq("user_id", user_id)\
+                                            .execute()
+                                        flash(f"✅ Assunto '{topico}' removido!")
                                         
                                         # LIMPAR CACHE APÓS OPERAÇÃO
-                                        st.cache_data.clear()
+                                        limpar_cache_dados()
                                         
-                                        time.sleep(1)
                                         st.rerun()
                                     except Exception as e:
                                         st.error(f"❌ Erro ao remover assunto: {e}")
@@ -5843,13 +6068,13 @@ if st.session_state.missao_ativa is not None:
                                 key=f"metodo_{id_registro}"
                             )
                         
-                            # Inicializar variável para evitar NameError
-                            assuntos_para_adicionar = []
+                            # Inicializar variáveis para evitar NameError
+                            assuntos_para_adicionar, assuntos_ignorados = [], []
                         
                             if metodo_entrada == "Um por um":
                                 # Modo tradicional
                                 novo_assunto = st.text_input("Nome do assunto", placeholder="Ex: Princípios fundamentais", key=f"novo_assunto_single_{id_registro}")
-                                assuntos_para_adicionar = [novo_assunto] if novo_assunto else []
+                                assuntos_para_adicionar, assuntos_ignorados = processar_assuntos_em_massa(novo_assunto, "linha", topicos)
                             
                             elif metodo_entrada == "Vários com separador":
                                 # Modo com separador
@@ -5867,29 +6092,9 @@ if st.session_state.missao_ativa is not None:
                                         ["; (ponto e vírgula)", ", (vírgula)", ". (ponto)", "- (hífen)", "| (pipe)"],
                                         key=f"separador_{id_registro}"
                                     )
-                                    # Mapear separador
-                                    separador_map = {
-                                        "; (ponto e vírgula)": ";",
-                                        ", (vírgula)": ",",
-                                        ". (ponto)": ".",
-                                        "- (hífen)": "-",
-                                        "| (pipe)": "|"
-                                    }
-                                    separador_char = separador_map[separador]
                             
-                                if texto_assuntos:
-                                    # Processar os assuntos
-                                    assuntos_brutos = texto_assuntos.split(separador_char)
-                                    assuntos_para_adicionar = [a.strip() for a in assuntos_brutos if a.strip()]
-                                else:
-                                    assuntos_para_adicionar = []
-                                
-                                    # Mostrar prévia
-                                    if assuntos_para_adicionar:
-                                        st.info(f"**Prévia:** Serão adicionados {len(assuntos_para_adicionar)} assuntos")
-                                        with st.expander("Ver assuntos"):
-                                            for a in assuntos_para_adicionar:
-                                                st.write(f"• {a}")
+                                # Processar os assuntos (o primeiro caractere da opção é o separador)
+                                assuntos_para_adicionar, assuntos_ignorados = processar_assuntos_em_massa(texto_assuntos, separador[0], topicos)
                             else:  # "Vários por linhas"
                                 # Modo com múltiplas linhas
                                 texto_assuntos = st.text_area(
@@ -5899,45 +6104,35 @@ if st.session_state.missao_ativa is not None:
                                     height=120
                                 )
                             
-                                if texto_assuntos:
-                                    # Processar os assuntos (uma por linha)
-                                    assuntos_brutos = texto_assuntos.split("\n")
-                                    assuntos_para_adicionar = [a.strip() for a in assuntos_brutos if a.strip()]
-                                else:
-                                    assuntos_para_adicionar = []
-                                
-                                    # Mostrar prévia
-                                    if assuntos_para_adicionar:
-                                        st.info(f"**Prévia:** Serão adicionados {len(assuntos_para_adicionar)} assuntos")
-                                        with st.expander("Ver assuntos"):
-                                            for a in assuntos_para_adicionar:
-                                                st.write(f"• {a}")
+                                # Processar os assuntos (uma por linha)
+                                assuntos_para_adicionar, assuntos_ignorados = processar_assuntos_em_massa(texto_assuntos, "linha", topicos)
+                        
+                            # Mostrar prévia (novos x ignorados por já existirem ou estarem repetidos)
+                            if assuntos_para_adicionar or assuntos_ignorados:
+                                st.info(f"**Prévia:** {len(assuntos_para_adicionar)} assunto(s) novo(s), {len(assuntos_ignorados)} ignorado(s) (já existentes ou repetidos)")
+                                with st.expander("Ver assuntos"):
+                                    for a in assuntos_para_adicionar:
+                                        st.write(f"• {a}")
+                                    for a in assuntos_ignorados:
+                                        st.caption(f"↷ {a} (ignorado)")
                         
                             col_btn1, col_btn2 = st.columns(2)
                             if col_btn1.form_submit_button("➕ Adicionar Assuntos", use_container_width=True):
                                 if assuntos_para_adicionar:
                                     try:
-                                        # Buscar tópicos atuais
-                                        if not topicos:
-                                            topicos = []
-                                        # Adicionar novos tópicos à lista (evitar duplicados)
-                                        for assunto in assuntos_para_adicionar:
-                                            if assunto not in topicos:
-                                                topicos.append(assunto)
-                                            else:
-                                                st.warning(f"Assunto '{assunto}' já existe e foi ignorado.")
-                                    
-                                        # Atualizar no banco
-                                        supabase.table("editais_materias").update({"topicos": topicos}).eq("id", id_registro).eq("user_id", user_id).execute()
-                                        st.success(f"✅ {len(assuntos_para_adicionar)} assunto(s) adicionado(s) com sucesso!")
+                                        # Só os assuntos novos viram linhas, inseridas em lotes após o último tópico
+                                        inserir_topicos(id_registro, assuntos_para_adicionar, ultima_ordem)
+                                        msg_ignorados = f" ({len(assuntos_ignorados)} ignorado(s))" if assuntos_ignorados else ""
+                                        flash(f"✅ {len(assuntos_para_adicionar)} assunto(s) adicionado(s) com sucesso!{msg_ignorados}")
                                         
                                         # LIMPAR CACHE APÓS OPERAÇÃO
-                                        st.cache_data.clear()
+                                        limpar_cache_dados()
                                         
-                                        time.sleep(1)
                                         st.rerun()
                                     except Exception as e:
                                         st.error(f"❌ Erro ao adicionar assuntos: {e}")
+                                elif assuntos_ignorados:
+                                    st.warning(f"⚠️ Todos os {len(assuntos_ignorados)} assunto(s) já existem e foram ignorados.")
                                 else:
                                     st.warning("⚠️ Nenhum assunto válido para adicionar.")
                         
@@ -5955,18 +6150,19 @@ if st.session_state.missao_ativa is not None:
                             if col_r1.button("💾 Salvar", key=f"salvar_nome_{id_registro}", use_container_width=True):
                                 if novo_nome and novo_nome != materia:
                                     try:
-                                        # Atualizar o nome da matéria
-                                        supabase.table("editais_materias").update({"materia": novo_nome}).eq("id", id_registro).eq("user_id", user_id).execute()
+                                        # Renomeia no edital, nos registros de estudo e no log de revisões (atômico)
+                                        resultado = supabase.rpc("renomear_materia", {
+                                            "p_id": id_registro,
+                                            "p_novo_nome": novo_nome,
+                                            "p_user_id": user_id,
+                                        }).execute()
+                                        contagens = resultado.data[0] if resultado.data else {}
                                     
-                                        # Atualizar também nos registros de estudo
-                                        supabase.table("registros_estudos").update({"materia": novo_nome}).eq("concurso", missao).eq("materia", materia).eq("user_id", user_id).execute()
-                                    
-                                        st.success(f"✅ Matéria renomeada para '{novo_nome}'!")
-                                        time.sleep(1)
+                                        flash(f"✅ Matéria renomeada para '{novo_nome}' ({contagens.get('registros', 0)} registro(s) atualizados)!")
                                         st.session_state[f"renomear_{id_registro}"] = False
                                         
                                         # LIMPAR CACHE APÓS OPERAÇÃO
-                                        st.cache_data.clear()
+                                        limpar_cache_dados()
                                         
                                         st.rerun()
                                     except Exception as e:
@@ -6007,8 +6203,7 @@ if st.session_state.missao_ativa is not None:
             
                 if metodo_assuntos == "Um por um":
                     assunto_inicial = st.text_input("Assunto inicial", placeholder="Ex: Princípios fundamentais", key="assunto_inicial_single")
-                    if assunto_inicial:
-                        assuntos_iniciais = [assunto_inicial]
+                    assuntos_iniciais, _ = processar_assuntos_em_massa(assunto_inicial, "linha")
                     
                 elif metodo_assuntos == "Vários com separador":
                     col_sep1, col_sep2 = st.columns([2, 1])
@@ -6025,20 +6220,9 @@ if st.session_state.missao_ativa is not None:
                             ["; (ponto e vírgula)", ", (vírgula)", ". (ponto)", "- (hífen)", "| (pipe)"],
                             key="separador_nova"
                         )
-                        # Mapear separador
-                        separador_map = {
-                            "; (ponto e vírgula)": ";",
-                            ", (vírgula)": ",",
-                            ". (ponto)": ".",
-                            "- (hífen)": "-",
-                            "| (pipe)": "|"
-                        }
-                        separador_char = separador_map[separador]
                 
-                    if texto_assuntos:
-                        # Processar os assuntos
-                        assuntos_brutos = texto_assuntos.split(separador_char)
-                        assuntos_iniciais = [a.strip() for a in assuntos_brutos if a.strip()]
+                    # Processar os assuntos (o primeiro caractere da opção é o separador)
+                    assuntos_iniciais, _ = processar_assuntos_em_massa(texto_assuntos, separador[0])
                     
                 elif metodo_assuntos == "Vários por linhas":
                     texto_assuntos = st.text_area(
@@ -6048,10 +6232,8 @@ if st.session_state.missao_ativa is not None:
                         height=120
                     )
                 
-                    if texto_assuntos:
-                        # Processar os assuntos (uma por linha)
-                        assuntos_brutos = texto_assuntos.split("\n")
-                        assuntos_iniciais = [a.strip() for a in assuntos_brutos if a.strip()]
+                    # Processar os assuntos (uma por linha)
+                    assuntos_iniciais, _ = processar_assuntos_em_massa(texto_assuntos, "linha")
             
                 # Mostrar prévia se houver assuntos
                 if assuntos_iniciais and metodo_assuntos != "Sem assuntos iniciais":
@@ -6088,13 +6270,12 @@ if st.session_state.missao_ativa is not None:
                                 if data_prova_direta:
                                     payload["data_prova"] = data_prova_direta
                             
-                                supabase.table("editais_materias").insert(payload).execute()
-                                st.success(f"✅ Matéria '{nova_materia}' adicionada com {len(assuntos_iniciais)} assunto(s) inicial(is)!")
+                                criar_materias([payload])
+                                flash(f"✅ Matéria '{nova_materia}' adicionada com {len(assuntos_iniciais)} assunto(s) inicial(is)!")
                                 
                                 # LIMPAR CACHE APÓS OPERAÇÃO
-                                st.cache_data.clear()
+                                limpar_cache_dados()
                                 
-                                time.sleep(1)
                                 st.rerun()
                         except Exception as e:
                             st.error(f"❌ Erro ao adicionar matéria: {e}")
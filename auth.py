@@ -1,15 +1,102 @@
 import streamlit as st
 from supabase import Client
 from typing import Dict, Optional
+from collections import OrderedDict
+import threading
 import re
 import time
 
 
+# Renova o token quando faltar menos que isto para expirar (segundos)
+REFRESH_MARGIN_SECONDS = 120
+
+# Proxies confiáveis na frente do app: cada um acrescenta um IP ao fim do
+# X-Forwarded-For (o começo do header é controlado pelo cliente)
+TRUSTED_PROXY_HOPS = 1
+
+
+def client_ip(headers, ip_address=None, trusted_hops=TRUSTED_PROXY_HOPS) -> Optional[str]:
+    """IP do cliente: o hop gravado pelo proxy confiável no X-Forwarded-For.
+
+    Atrás do proxy, o endereço da conexão (ip_address) é o do próprio proxy;
+    ele só é usado quando o header não existe (acesso direto, sem proxy).
+    """
+    forwarded = (headers or {}).get("X-Forwarded-For")
+    if not forwarded:
+        return ip_address or None
+    hops = [h.strip() for h in forwarded.split(",") if h.strip()]
+    # Menos hops que proxies confiáveis: header inteiro veio do cliente
+    return hops[-trusted_hops] if len(hops) >= trusted_hops else None
+
+
+class LoginRateLimiter:
+    """Token bucket por chave (email e IP), compartilhado pelo processo.
+
+    Cada chave tem `capacity` tentativas que se recompõem a `refill_per_second`.
+    A memória é limitada: acima de `max_keys` as chaves menos usadas são
+    descartadas (LRU). Rejeições não chegam ao Supabase Auth.
+    """
+
+    def __init__(self, max_keys=10000, email_capacity=5, email_refill_per_second=1 / 60,
+                 ip_capacity=20, ip_refill_per_second=1 / 15):
+        self.max_keys = max_keys
+        self.limits = {
+            "email": (email_capacity, email_refill_per_second),
+            "ip": (ip_capacity, ip_refill_per_second),
+        }
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()  # (tipo, chave) -> [tokens, atualizado_em]
+        self._metrics = {"allowed": 0, "rejected": 0, "evicted": 0}
+
+    def allow(self, email: str, ip: Optional[str] = None) -> float:
+        """Consome uma tentativa de cada chave; retorna 0 se permitido ou os segundos de espera"""
+        keys = [("email", email.strip().lower())]
+        if ip:
+            keys.append(("ip", ip))
+        now = time.monotonic()
+        with self._lock:
+            buckets = [self._bucket(key, now) for key in keys]
+            wait = 0.0
+            for (kind, _), bucket in zip(keys, buckets):
+                if bucket[0] < 1:
+                    _, refill = self.limits[kind]
+                    wait = max(wait, (1 - bucket[0]) / refill)
+            if wait:
+                self._metrics["rejected"] += 1
+                return wait
+            for bucket in buckets:
+                bucket[0] -= 1
+            self._metrics["allowed"] += 1
+            return 0.0
+
+    def metrics(self) -> Dict:
+        with self._lock:
+            return {**self._metrics, "keys": len(self._buckets)}
+
+    def _bucket(self, key, now):
+        capacity, refill = self.limits[key[0]]
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = [capacity, now]
+            self._buckets[key] = bucket
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+                self._metrics["evicted"] += 1
+        else:
+            bucket[0] = min(capacity, bucket[0] + (now - bucket[1]) * refill)
+            bucket[1] = now
+            self._buckets.move_to_end(key)
+        return bucket
+
+
 class AuthManager:
     """Gerenciador de autenticação com Supabase"""
 
-    def __init__(self, supabase_client: Client):
+    def __init__(self, supabase_client: Client, rate_limiter: Optional[LoginRateLimiter] = None):
         self.supabase = supabase_client
+        self.rate_limiter = rate_limiter
+        # Contador de chamadas ao Supabase Auth neste rerun (diagnóstico)
+        st.session_state.auth_calls_run = 0
         self._restore_session()
 
     # ------------------------------------------------------------------
@@ -28,12 +115,53 @@ class AuthManager:
         for k, v in defaults.items():
             st.session_state.setdefault(k, v)
 
+        # Sessão já validada e token longe de expirar: nenhuma chamada ao Auth
+        cached = st.session_state.get("auth_session")
+        if cached and st.session_state.get("authenticated"):
+            if cached["expires_at"] - time.time() > REFRESH_MARGIN_SECONDS:
+                return
+            if self._refresh_session(cached["refresh_token"]):
+                return
+
         try:
+            self._count_auth_call()
             session = self.supabase.auth.get_session()
             if session and session.user:
                 self._set_user(session.user)
+                self._cache_session(session)
+                return
+        except Exception:
+            pass
+
+        # Renovação/restauração falhou: sem JWT válido as queries dariam 401 e o
+        # app apareceria vazio, então volta para a tela de login
+        if st.session_state.get("authenticated"):
+            self._clear_user()
+
+    def _refresh_session(self, refresh_token) -> bool:
+        """Renova o token perto da expiração; False se a renovação falhar"""
+        try:
+            self._count_auth_call()
+            response = self.supabase.auth.refresh_session(refresh_token)
+            if response and response.session and response.user:
+                self._set_user(response.user)
+                self._cache_session(response.session)
+                return True
         except Exception:
             pass
+        st.session_state.auth_session = None
+        return False
+
+    def _cache_session(self, session):
+        st.session_state.auth_session = {
+            "access_token": session.access_token,
+            "refresh_token": session.refresh_token,
+            "expires_at": session.expires_at or time.time() + (session.expires_in or 0),
+        }
+
+    def _count_auth_call(self):
+        st.session_state.auth_calls_run = st.session_state.get("auth_calls_run", 0) + 1
+        st.session_state.auth_calls_total = st.session_state.get("auth_calls_total", 0) + 1
 
     def _set_user(self, user):
         st.session_state.authenticated = True
@@ -42,6 +170,10 @@ class AuthManager:
         st.session_state.user_name = user.email.split("@")[0]
         st.session_state.login_attempts = 0
 
+    def _clear_user(self):
+        for k in ["authenticated", "user_id", "user_email", "user_name", "auth_session"]:
+            st.session_state[k] = None
+
     def is_authenticated(self) -> bool:
         return bool(st.session_state.get("authenticated"))
 
@@ -57,11 +189,40 @@ class AuthManager:
     def get_user_name(self) -> str:
         return st.session_state.get("user_name", "Usuário")
 
+    def get_access_token(self) -> Optional[str]:
+        """JWT da sessão em cache (usado nos headers das queries do usuário)"""
+        cached = st.session_state.get("auth_session")
+        return cached["access_token"] if cached else None
+
+    def get_auth_calls(self) -> Dict:
+        """Chamadas ao Supabase Auth neste rerun e desde o início da sessão"""
+        return {
+            "rerun": st.session_state.get("auth_calls_run", 0),
+            "total": st.session_state.get("auth_calls_total", 0),
+        }
+
     # ------------------------------------------------------------------
     # LOGIN / SIGNUP
     # ------------------------------------------------------------------
+    def _client_ip(self) -> Optional[str]:
+        """IP do cliente da sessão atual (ver client_ip)"""
+        try:
+            return client_ip(st.context.headers, getattr(st.context, "ip_address", None))
+        except Exception:
+            return None
+
     def login(self, email: str, password: str) -> Dict:
+        if self.rate_limiter is not None:
+            wait = self.rate_limiter.allow(email, self._client_ip())
+            if wait:
+                st.session_state.login_attempts += 1
+                return {
+                    "success": False,
+                    "message": f"Muitas tentativas. Tente novamente em {int(wait) + 1} segundos."
+                }
+
         try:
+            self._count_auth_call()
             response = self.supabase.auth.sign_in_with_password({
                 "email": email,
                 "password": password
@@ -69,6 +230,8 @@ class AuthManager:
 
             if response and response.user:
                 self._set_user(response.user)
+                if response.session:
+                    self._cache_session(response.session)
                 return {"success": True, "message": "Login realizado com sucesso"}
 
             return {"success": False, "message": "Credenciais inválidas"}
@@ -85,6 +248,7 @@ class AuthManager:
             return {"success": False, "message": "Senha mínima de 6 caracteres"}
 
         try:
+            self._count_auth_call()
             response = self.supabase.auth.sign_up({
                 "email": email,
                 "password": password
@@ -101,16 +265,41 @@ class AuthManager:
         except Exception as e:
             return {"success": False, "message": str(e)}
 
+    def render_login_page(self):
+        """Tela de login / cadastro"""
+        st.markdown("## 🔐 Entrar")
+        tab_login, tab_signup = st.tabs(["Entrar", "Criar conta"])
+
+        with tab_login:
+            with st.form("form_login"):
+                email = st.text_input("Email")
+                password = st.text_input("Senha", type="password")
+                if st.form_submit_button("Entrar", use_container_width=True, type="primary"):
+                    result = self.login(email, password)
+                    if result["success"]:
+                        st.rerun()
+                    st.error(result["message"])
+
+        with tab_signup:
+            with st.form("form_signup"):
+                email = st.text_input("Email", key="signup_email")
+                password = st.text_input("Senha", type="password", key="signup_password")
+                if st.form_submit_button("Criar conta", use_container_width=True):
+                    result = self.signup(email, password)
+                    if result["success"]:
+                        st.success(result["message"])
+                    else:
+                        st.error(result["message"])
+
     # ------------------------------------------------------------------
     # LOGOUT
     # ------------------------------------------------------------------
     def logout(self) -> Dict:
         try:
+            self._count_auth_call()
             self.supabase.auth.sign_out()
         except Exception:
             pass
 
-        for k in ["authenticated", "user_id", "user_email", "user_name"]:
-            st.session_state[k] = None
-
+        self._clear_user()
         return {"success": True}
@@ -1,14 +1,120 @@
 import os
-from supabase import create_client, Client
-
-# Configurar conexão com Supabase
-SUPABASE_URL = os.environ.get("SUPABASE_URL", "https://seu-projeto.supabase.co")
-SUPABASE_KEY = os.environ.get("SUPABASE_KEY", "sua-chave-supabase")
-
-# Inicializar cliente Supabase
-try:
-    supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-    print("✅ Conectado ao Supabase")
-except Exception as e:
-    print(f"❌ Erro ao conectar ao Supabase: {e}")
-    supabase = None
+import threading
+import httpx
+from gotrue import SyncGoTrueClient
+from postgrest import SyncPostgrestClient
+from typing import Dict, Optional, Tuple
+
+
+def ler_credenciais(secrets=None) -> Tuple[Optional[str], Optional[str]]:
+    """URL e chave do Supabase: st.secrets (Streamlit Cloud) ou variáveis de ambiente"""
+    url = key = None
+    try:
+        if secrets is not None:
+            url, key = secrets.get("SUPABASE_URL"), secrets.get("SUPABASE_KEY")
+    except Exception:
+        pass  # Sem secrets.toml: usa o ambiente
+    url = (url or os.environ.get("SUPABASE_URL") or "").strip()
+    key = (key or os.environ.get("SUPABASE_KEY") or "").strip()
+    if not url or not key:
+        return None, None
+    if not url.startswith("https://"):
+        raise ValueError("SUPABASE_URL inválida")
+    return url, key
+
+
+def ler_admins(secrets=None) -> frozenset:
+    """Ids de usuário com acesso aos diagnósticos do processo (ADMIN_USER_IDS: lista ou texto separado por vírgulas)"""
+    valor = None
+    try:
+        if secrets is not None:
+            valor = secrets.get("ADMIN_USER_IDS")
+    except Exception:
+        pass  # Sem secrets.toml: usa o ambiente
+    if valor is None:
+        valor = os.environ.get("ADMIN_USER_IDS", "")
+    if isinstance(valor, str):
+        valor = valor.split(",")
+    return frozenset(str(v).strip() for v in valor if str(v).strip())
+
+
+class _PostgrestCompartilhado(SyncPostgrestClient):
+    """Cliente PostgREST que usa o pool de conexões (keep-alive) do processo"""
+
+    def __init__(self, base_url, headers, transporte, timeout):
+        self._transporte = transporte
+        super().__init__(base_url, headers=headers, timeout=timeout)
+
+    def create_session(self, base_url, headers, timeout, *args, **kwargs):
+        return httpx.Client(base_url=base_url, headers=headers, timeout=timeout, transport=self._transporte)
+
+
+class ContextoUsuario:
+    """Interface table()/rpc() do Client com o JWT de um usuário nos headers.
+
+    Leve: não abre conexões próprias, só carrega headers sobre o transporte
+    compartilhado. O token pode ser trocado no lugar (renovação da sessão), de
+    modo que caches que guardam o contexto continuam válidos.
+    """
+
+    def __init__(self, url, key, transporte, access_token=None, auth=None, timeout=30):
+        self.access_token = access_token
+        self.auth = auth
+        headers = {"apikey": key, "Authorization": f"Bearer {access_token or key}"}
+        self.postgrest = _PostgrestCompartilhado(f"{url}/rest/v1", headers, transporte, timeout)
+
+    def table(self, nome):
+        return self.postgrest.from_(nome)
+
+    def rpc(self, funcao, params=None):
+        return self.postgrest.rpc(funcao, params or {})
+
+    def atualizar_token(self, access_token):
+        if access_token and access_token != self.access_token:
+            self.postgrest.auth(access_token)
+            self.access_token = access_token
+
+
+class GerenciadorSupabase:
+    """Um pool HTTP por processo e um contexto (JWT próprio) por usuário.
+
+    O cliente de autenticação (GoTrue) guarda a sessão em memória, então cada
+    sessão do navegador recebe o seu (cliente_auth) e nunca um compartilhado:
+    um sign_in não pode vazar para outro usuário.
+    """
+
+    def __init__(self, url, key, max_conexoes=20):
+        self.url = url
+        self.key = key
+        self.transporte = httpx.HTTPTransport(
+            limits=httpx.Limits(max_connections=max_conexoes, max_keepalive_connections=max_conexoes),
+            retries=1,
+        )
+        self._lock = threading.Lock()
+        self._contextos: Dict[str, ContextoUsuario] = {}
+        # Contexto anônimo do processo (catálogo público de templates etc.)
+        self.anonimo = ContextoUsuario(url, key, self.transporte)
+
+    def cliente_auth(self) -> SyncGoTrueClient:
+        """Cliente GoTrue isolado para uma sessão do navegador"""
+        return SyncGoTrueClient(
+            url=f"{self.url}/auth/v1",
+            headers={"apikey": self.key, "Authorization": f"Bearer {self.key}"},
+            auto_refresh_token=False,
+            persist_session=False,
+        )
+
+    def contexto_login(self, auth: SyncGoTrueClient) -> ContextoUsuario:
+        """Contexto anônimo com o cliente de autenticação da sessão (tela de login)"""
+        return ContextoUsuario(self.url, self.key, self.transporte, auth=auth)
+
+    def contexto(self, user_id, access_token) -> ContextoUsuario:
+        """Contexto do usuário (reaproveitado entre reruns e sessões, token sempre o mais recente)"""
+        with self._lock:
+            contexto = self._contextos.get(user_id)
+            if contexto is None:
+                contexto = ContextoUsuario(self.url, self.key, self.transporte, access_token)
+                self._contextos[user_id] = contexto
+            else:
+                contexto.atualizar_token(access_token)
+            return contexto
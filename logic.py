@@ -1,17 +1,27 @@
 import pandas as pd
 import datetime
 
-def get_editais(supabase):
+def montar_editais(linhas):
+    """Agrupa as linhas de editais_materias em {concurso: {cargo, data_prova, materias}}"""
+    editais = {}
+    for row in linhas:
+        c = row['concurso']
+        if c not in editais:
+            editais[c] = {"cargo": row.get('cargo') or "Geral", "data_prova": row.get('data_prova'), "materias": {}}
+        if row.get('materia'): 
+            editais[c]["materias"][row['materia']] = row.get('topicos') or []
+    return editais
+
+def get_materias_edital(supabase, user_id, concurso=None):
+    """Linhas de editais_materias com os tópicos ativos (tabela topicos), em um único join"""
+    params = {"p_user_id": user_id}
+    if concurso is not None:
+        params["p_concurso"] = concurso
+    return supabase.rpc("editais_com_topicos", params).execute().data or []
+
+def get_editais(supabase, user_id):
     try:
-        res = supabase.table("editais_materias").select("*").execute()
-        editais = {}
-        for row in res.data:
-            c = row['concurso']
-            if c not in editais:
-                editais[c] = {"cargo": row.get('cargo') or "Geral", "materias": {}}
-            if row.get('materia'): 
-                editais[c]["materias"][row['materia']] = row.get('topicos') or []
-        return editais
+        return montar_editais(get_materias_edital(supabase, user_id))
     except: return {}
 
 def calcular_pendencias(df):
@@ -39,3 +49,127 @@ def excluir_concurso_completo(supabase, nome_concurso):
     except Exception as e:
         st.error(f"Erro ao excluir concurso: {e}")
         return False
+
+class IndiceCobertura:
+    """Índice (materia, assunto) -> primeira/última data, registros, tempo, acertos e total"""
+
+    def __init__(self):
+        self.topicos = {}
+        self.por_materia = {}
+        self.datas_por_assunto = {}
+
+    @classmethod
+    def construir(cls, df):
+        """Monta o índice com um único groupby sobre os registros"""
+        indice = cls()
+        if df.empty:
+            return indice
+        base = df[['materia', 'assunto', 'tempo', 'acertos', 'total']].copy()
+        base['dt'] = pd.to_datetime(df['data_estudo']).dt.date
+        agg = base.groupby(['materia', 'assunto']).agg(
+            primeira=('dt', 'min'), ultima=('dt', 'max'), registros=('dt', 'size'),
+            tempo=('tempo', 'sum'), acertos=('acertos', 'sum'), total=('total', 'sum'))
+        for (materia, assunto), r in agg.iterrows():
+            indice.topicos[(materia, assunto)] = {
+                "primeira": r['primeira'], "ultima": r['ultima'], "registros": int(r['registros']),
+                "tempo": int(r['tempo']), "acertos": int(r['acertos']), "total": int(r['total'])}
+            indice.por_materia.setdefault(materia, set()).add(assunto)
+        for assunto, datas in base.groupby('assunto')['dt']:
+            indice.datas_por_assunto[assunto] = set(datas)
+        return indice
+
+    def registrar(self, registro):
+        """Atualização incremental com um registro recém-gravado"""
+        materia, assunto = registro['materia'], registro['assunto']
+        dt = pd.to_datetime(registro['data_estudo']).date()
+        t = self.topicos.get((materia, assunto))
+        if t is None:
+            t = self.topicos[(materia, assunto)] = {
+                "primeira": dt, "ultima": dt, "registros": 0, "tempo": 0, "acertos": 0, "total": 0}
+        t["primeira"], t["ultima"] = min(t["primeira"], dt), max(t["ultima"], dt)
+        t["registros"] += 1
+        t["tempo"] += int(registro.get('tempo') or 0)
+        t["acertos"] += int(registro.get('acertos') or 0)
+        t["total"] += int(registro.get('total') or 0)
+        self.por_materia.setdefault(materia, set()).add(assunto)
+        self.datas_por_assunto.setdefault(assunto, set()).add(dt)
+
+    def assuntos_estudados(self, materia, desde=None):
+        """Nº de assuntos únicos estudados na matéria (opcionalmente a partir de uma data)"""
+        assuntos = self.por_materia.get(materia, ())
+        if desde is None:
+            return len(assuntos)
+        return sum(1 for a in assuntos if self.topicos[(materia, a)]["ultima"] >= desde)
+
+    def resumo_edital(self, materias_edital):
+        """(tópicos do edital já estudados, dias distintos com estudo desses tópicos)"""
+        estudados = set()
+        for topicos in materias_edital.values():
+            estudados.update(a for a in topicos if a in self.datas_por_assunto)
+        datas = set()
+        for assunto in estudados:
+            datas |= self.datas_por_assunto[assunto]
+        return len(estudados), len(datas)
+
+
+JANELAS_RITMO = (7, 30, 90)
+
+def projetar_edital(indice, materias_edital, hoje, data_prova=None):
+    """Projeção do edital sobre a série diária de cobertura acumulada (ritmo em janelas móveis)"""
+    pares = [(m, a) for m, topicos in materias_edital.items() for a in topicos]
+    if not pares:
+        return None
+    df_top = pd.DataFrame(pares, columns=['materia', 'assunto'])
+    total = df_top['assunto'].nunique()
+
+    # Data em que cada tópico do edital foi estudado pela primeira vez
+    primeiras = {a: min(indice.datas_por_assunto[a]) for a in df_top['assunto'].unique() if a in indice.datas_por_assunto}
+    estudados = len(primeiras)
+    restantes = total - estudados
+
+    # Série diária: tópicos novos por dia, cobertura acumulada e ritmo móvel
+    if primeiras:
+        novos = pd.to_datetime(pd.Series(list(primeiras.values()))).value_counts().sort_index()
+        fim = max(pd.Timestamp(hoje), novos.index.max())
+        novos = novos.reindex(pd.date_range(novos.index.min(), fim, freq='D'), fill_value=0)
+    else:
+        novos = pd.Series([0], index=pd.DatetimeIndex([pd.Timestamp(hoje)]))
+    serie = pd.DataFrame({"novos": novos, "cobertura": novos.cumsum()})
+    for j in JANELAS_RITMO:
+        serie[f"ritmo_{j}d"] = serie['novos'].rolling(j, min_periods=1).mean()
+    ritmos = {j: float(serie[f"ritmo_{j}d"].iloc[-1]) for j in JANELAS_RITMO}
+
+    # Ritmo de referência: janela de 30 dias, recorrendo às maiores se estiver zerada
+    ritmo_diario = ritmos[30] or ritmos[90] or (estudados / len(serie) if estudados else 0)
+    ritmo_diario = max(ritmo_diario, 0.001)
+    dias_para_fim = int(restantes / ritmo_diario)
+    data_fim = hoje + datetime.timedelta(days=dias_para_fim)
+
+    # Por matéria: restante / ritmo dos últimos 30 dias
+    df_top['primeira'] = df_top['assunto'].map(primeiras)
+    df_top['recente'] = df_top['primeira'].apply(lambda d: pd.notna(d) and d >= hoje - datetime.timedelta(days=30))
+    por_materia = df_top.groupby('materia', sort=False).agg(
+        total=('assunto', 'size'), estudados=('primeira', 'count'), recentes=('recente', 'sum')).reset_index()
+    por_materia['restantes'] = por_materia['total'] - por_materia['estudados']
+    por_materia['ritmo'] = por_materia['recentes'] / 30
+    por_materia['dias_para_fim'] = (por_materia['restantes'] / por_materia['ritmo'].where(por_materia['ritmo'] > 0)).round()
+    por_materia['data_fim'] = por_materia['dias_para_fim'].apply(
+        lambda d: hoje + datetime.timedelta(days=int(d)) if pd.notna(d) else None)
+    por_materia.loc[por_materia['restantes'] == 0, 'data_fim'] = hoje
+    if data_prova:
+        por_materia['no_prazo'] = por_materia['data_fim'].apply(lambda d: d is not None and d <= data_prova)
+
+    return {
+        "total": total,
+        "estudados": estudados,
+        "restantes": restantes,
+        "progresso": (estudados / total * 100) if total > 0 else 0,
+        "ritmo": ritmo_diario * 7,  # Tópicos por semana para exibição
+        "ritmos": {j: r * 7 for j, r in ritmos.items()},
+        "dias_para_fim": dias_para_fim,
+        "data_fim": data_fim,
+        "data_prova": data_prova,
+        "no_prazo": (data_fim <= data_prova) if data_prova else None,
+        "serie": serie,
+        "materias": por_materia.to_dict('records'),
+    }
@@ -0,0 +1,104 @@
+-- =============================================================================
+-- 001 - LOG DE REVISÕES (append-only)
+-- Cada revisão concluída vira uma linha tipada, em vez de ser concatenada
+-- como " | Rev: A/T (Xmin)" no campo texto registros_estudos.comentarios.
+-- =============================================================================
+
+create table if not exists public.revisoes_log (
+    id            bigint generated by default as identity primary key,
+    registro_id   bigint not null references public.registros_estudos(id) on delete cascade,
+    user_id       uuid   not null default auth.uid(),
+    concurso      text   not null,
+    materia       text,
+    assunto       text,
+    fase          text,                       -- rev_24h | rev_07d | rev_15d | rev_30d (NULL = legado)
+    acertos       integer not null default 0,
+    total         integer not null default 0,
+    tempo         integer not null default 0, -- minutos
+    taxa          numeric(5, 2),              -- 0..100 (acertos limitados ao total)
+    data_revisao  date not null default current_date,
+    created_at    timestamptz not null default now()
+);
+
+create index if not exists revisoes_log_user_concurso_idx
+    on public.revisoes_log (user_id, concurso, data_revisao);
+create index if not exists revisoes_log_registro_idx
+    on public.revisoes_log (registro_id);
+
+alter table public.revisoes_log enable row level security;
+
+drop policy if exists "revisoes_log_dono" on public.revisoes_log;
+create policy "revisoes_log_dono" on public.revisoes_log
+    for all using (auth.uid() = user_id) with check (auth.uid() = user_id);
+
+-- -----------------------------------------------------------------------------
+-- Migração única: extrai as revisões antigas do texto de comentarios
+-- -----------------------------------------------------------------------------
+insert into public.revisoes_log (registro_id, user_id, concurso, materia, assunto, acertos, total, tempo, taxa, data_revisao)
+select r.id,
+       r.user_id,
+       r.concurso,
+       r.materia,
+       r.assunto,
+       m[1]::integer,
+       m[2]::integer,
+       m[3]::integer,
+       case when m[2]::integer > 0 then least(round(m[1]::numeric / m[2]::numeric * 100, 2), 100) end,
+       r.data_estudo
+from public.registros_estudos r,
+     regexp_matches(r.comentarios, 'Rev: (\d+)/(\d+) \((\d+)min\)', 'g') as m
+where r.comentarios like '%Rev: %'
+  and not exists (select 1 from public.revisoes_log l where l.registro_id = r.id);
+
+update public.registros_estudos
+set comentarios = nullif(trim(regexp_replace(comentarios, '\s*\|\s*Rev: \d+/\d+ \(\d+min\)', '', 'g')), '')
+where comentarios like '%Rev: %';
+
+-- -----------------------------------------------------------------------------
+-- Conclusão de revisão atômica (1 round trip): soma acertos/total/tempo no
+-- registro, marca a fase e grava a linha do log no mesmo statement — sem
+-- registro atualizado sem log (ou o contrário) em falhas parciais.
+-- Devolve a linha atualizada de registros_estudos (vazio se id/fase inválidos).
+-- -----------------------------------------------------------------------------
+create or replace function public.concluir_revisao(
+    p_registro_id bigint,
+    p_user_id     uuid,
+    p_fase        text,
+    p_acertos     integer,
+    p_total       integer,
+    p_tempo       integer,
+    p_data        date default current_date
+)
+returns setof public.registros_estudos
+language sql
+security invoker
+as $$
+    with atualizado as (
+        update public.registros_estudos r
+        set acertos = r.acertos + p_acertos,
+            total   = r.total + p_total,
+            tempo   = coalesce(r.tempo, 0) + p_tempo,
+            taxa    = case when r.total + p_total > 0
+                           then round((r.acertos + p_acertos)::numeric / (r.total + p_total) * 100, 2)
+                           else 0 end,
+            rev_24h = r.rev_24h or p_fase = 'rev_24h',
+            rev_07d = r.rev_07d or p_fase = 'rev_07d',
+            rev_15d = r.rev_15d or p_fase = 'rev_15d',
+            rev_30d = r.rev_30d or p_fase = 'rev_30d'
+        where r.id = p_registro_id
+          and r.user_id = p_user_id
+          and p_fase in ('rev_24h', 'rev_07d', 'rev_15d', 'rev_30d')
+        returning r.*
+    ),
+    log_inserido as (
+        insert into public.revisoes_log (registro_id, user_id, concurso, materia, assunto, fase, acertos, total, tempo, taxa, data_revisao)
+        select a.id, a.user_id, a.concurso, a.materia, a.assunto, p_fase, p_acertos, p_total, p_tempo,
+               case when p_total > 0 then least(round(p_acertos::numeric / p_total * 100, 2), 100) end,
+               p_data
+        from atualizado a
+        returning id
+    )
+    select * from atualizado;
+$$;
+
+grant execute on function public.concluir_revisao(bigint, uuid, text, integer, integer, integer, date) to authenticated;
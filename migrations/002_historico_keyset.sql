@@ -0,0 +1,23 @@
+-- =============================================================================
+-- 002 - PAGINAÇÃO POR CHAVE NO HISTÓRICO
+-- O Histórico pagina no servidor por (coluna de ordenação, id) com filtros de
+-- matéria e relevância aplicados na consulta. Relevância nula era tratada como
+-- 5 no pandas; aqui ela passa a ser 5 no banco para o filtro e a chave baterem.
+-- =============================================================================
+
+update public.registros_estudos set relevancia = 5 where relevancia is null;
+alter table public.registros_estudos alter column relevancia set default 5;
+alter table public.registros_estudos alter column relevancia set not null;
+
+update public.registros_estudos
+set taxa = case when total > 0 then round(acertos::numeric / total::numeric * 100, 2) else 0 end
+where taxa is null;
+
+create index if not exists registros_estudos_hist_data_idx
+    on public.registros_estudos (user_id, concurso, data_estudo desc, id desc);
+create index if not exists registros_estudos_hist_materia_idx
+    on public.registros_estudos (user_id, concurso, materia, data_estudo desc, id desc);
+create index if not exists registros_estudos_hist_taxa_idx
+    on public.registros_estudos (user_id, concurso, taxa, id);
+create index if not exists registros_estudos_hist_relevancia_idx
+    on public.registros_estudos (user_id, concurso, relevancia, id);
@@ -0,0 +1,35 @@
+-- =============================================================================
+-- 003 - BANCO DE QUESTÕES: FILTROS NO SERVIDOR E CONTAGENS AGRUPADAS
+-- A aba Questões pagina/filtra/ordena via PostgREST; a aba Estatísticas lê
+-- as contagens por status, matéria e relevância desta função em vez de baixar
+-- todas as questões uma segunda vez.
+-- =============================================================================
+
+create index if not exists questoes_revisao_user_concurso_data_idx
+    on public.questoes_revisao (user_id, concurso, data desc, id desc);
+create index if not exists questoes_revisao_user_concurso_rel_idx
+    on public.questoes_revisao (user_id, concurso, relevancia, id);
+
+create or replace function public.questoes_contagens(p_concurso text, p_user_id uuid)
+returns table (dimensao text, valor text, quantidade bigint)
+language sql
+stable
+security invoker
+as $$
+    select 'status', coalesce(status, 'Pendente'), count(*)
+    from public.questoes_revisao
+    where concurso = p_concurso and user_id = p_user_id
+    group by 1, 2
+    union all
+    select 'materia', materia, count(*)
+    from public.questoes_revisao
+    where concurso = p_concurso and user_id = p_user_id
+    group by 1, 2
+    union all
+    select 'relevancia', coalesce(relevancia, 5)::text, count(*)
+    from public.questoes_revisao
+    where concurso = p_concurso and user_id = p_user_id
+    group by 1, 2;
+$$;
+
+grant execute on function public.questoes_contagens(text, uuid) to authenticated, anon;
@@ -0,0 +1,63 @@
+-- =============================================================================
+-- 004 - NOTAS DE SIMULADO POR MATÉRIA (tabela filha)
+-- Substitui o texto "Banca: X | Detalhes: Mat: A/T | Mat2: A/T" gravado em
+-- registros_estudos.comentarios por linhas tipadas (simulado_id, materia,
+-- acertos, total). A Análise Vertical vira um único agregado agrupado.
+-- =============================================================================
+
+create table if not exists public.simulado_materias (
+    id           bigint generated by default as identity primary key,
+    simulado_id  bigint  not null references public.registros_estudos(id) on delete cascade,
+    user_id      uuid    not null default auth.uid(),
+    concurso     text    not null,
+    materia      text    not null,
+    acertos      integer not null default 0,
+    total        integer not null default 0,
+    created_at   timestamptz not null default now(),
+    unique (simulado_id, materia)
+);
+
+create index if not exists simulado_materias_user_concurso_idx
+    on public.simulado_materias (user_id, concurso, materia);
+
+alter table public.simulado_materias enable row level security;
+
+drop policy if exists "simulado_materias_dono" on public.simulado_materias;
+create policy "simulado_materias_dono" on public.simulado_materias
+    for all using (auth.uid() = user_id) with check (auth.uid() = user_id);
+
+create or replace function public.simulado_materias_consolidado(p_concurso text, p_user_id uuid)
+returns table (materia text, acertos bigint, total bigint)
+language sql
+stable
+security invoker
+as $$
+    select materia, sum(acertos), sum(total)
+    from public.simulado_materias
+    where concurso = p_concurso and user_id = p_user_id
+    group by materia
+    order by sum(total) desc;
+$$;
+
+grant execute on function public.simulado_materias_consolidado(text, uuid) to authenticated, anon;
+
+-- -----------------------------------------------------------------------------
+-- Migração única: extrai as notas de "Detalhes:" dos simulados existentes
+-- -----------------------------------------------------------------------------
+insert into public.simulado_materias (simulado_id, user_id, concurso, materia, acertos, total)
+select r.id,
+       r.user_id,
+       r.concurso,
+       trim(m[1]),
+       m[2]::integer,
+       m[3]::integer
+from public.registros_estudos r,
+     regexp_matches(split_part(r.comentarios, 'Detalhes:', 2), '([^|:]+):\s*(\d+)\s*/\s*(\d+)', 'g') as m
+where upper(r.materia) like '%SIMULADO%'
+  and r.comentarios like '%Detalhes:%'
+on conflict (simulado_id, materia) do nothing;
+
+update public.registros_estudos
+set comentarios = nullif(trim(regexp_replace(comentarios, '\s*\|?\s*Detalhes:.*$', '')), '')
+where upper(materia) like '%SIMULADO%'
+  and comentarios like '%Detalhes:%';
@@ -0,0 +1,22 @@
+-- =============================================================================
+-- 005 - PARTIÇÃO ESTUDO / SIMULADO EM registros_estudos
+-- Substitui a detecção por substring ('SIMULADO' em materia), feita a cada
+-- rerun no pandas, por uma coluna tipada e indexada. O app carrega cada
+-- partição separadamente.
+-- =============================================================================
+
+alter table public.registros_estudos
+    add column if not exists tipo text not null default 'estudo';
+
+alter table public.registros_estudos
+    drop constraint if exists registros_estudos_tipo_check;
+alter table public.registros_estudos
+    add constraint registros_estudos_tipo_check check (tipo in ('estudo', 'simulado'));
+
+update public.registros_estudos
+set tipo = 'simulado'
+where upper(materia) like '%SIMULADO%'
+  and tipo <> 'simulado';
+
+create index if not exists registros_estudos_tipo_idx
+    on public.registros_estudos (user_id, concurso, tipo, data_estudo desc);
@@ -0,0 +1,109 @@
+-- =============================================================================
+-- 006 - ROLLUP SEMANAL (semana ISO)
+-- Minutos, questões, acertos e simulados por (user_id, concurso, semana),
+-- mantidos por trigger a cada insert/update/delete em registros_estudos.
+-- A Home e o Guia Semanal leem uma linha por semana em vez de filtrar todo
+-- o histórico a cada rerun.
+-- =============================================================================
+
+create table if not exists public.resumo_semanal (
+    user_id             uuid    not null default auth.uid(),
+    concurso            text    not null,
+    semana              date    not null,            -- segunda-feira da semana ISO
+    minutos             integer not null default 0,  -- só tipo = 'estudo'
+    questoes            integer not null default 0,
+    acertos             integer not null default 0,
+    registros           integer not null default 0,
+    simulados           integer not null default 0,  -- tipo = 'simulado'
+    questoes_simulados  integer not null default 0,
+    acertos_simulados   integer not null default 0,
+    primary key (user_id, concurso, semana)
+);
+
+alter table public.resumo_semanal enable row level security;
+
+drop policy if exists "resumo_semanal_dono" on public.resumo_semanal;
+create policy "resumo_semanal_dono" on public.resumo_semanal
+    for select using (auth.uid() = user_id);
+
+-- -----------------------------------------------------------------------------
+-- Manutenção incremental: aplica (+1) ou desfaz (-1) um registro na sua semana
+-- -----------------------------------------------------------------------------
+create or replace function public.resumo_semanal_aplicar(r public.registros_estudos, sinal integer)
+returns void
+language sql
+security definer
+set search_path = public
+as $$
+    insert into public.resumo_semanal as s
+        (user_id, concurso, semana, minutos, questoes, acertos, registros, simulados, questoes_simulados, acertos_simulados)
+    select r.user_id,
+           r.concurso,
+           date_trunc('week', r.data_estudo)::date,
+           case when r.tipo = 'estudo' then sinal * coalesce(r.tempo, 0) else 0 end,
+           case when r.tipo = 'estudo' then sinal * coalesce(r.total, 0) else 0 end,
+           case when r.tipo = 'estudo' then sinal * coalesce(r.acertos, 0) else 0 end,
+           case when r.tipo = 'estudo' then sinal else 0 end,
+           case when r.tipo = 'simulado' then sinal else 0 end,
+           case when r.tipo = 'simulado' then sinal * coalesce(r.total, 0) else 0 end,
+           case when r.tipo = 'simulado' then sinal * coalesce(r.acertos, 0) else 0 end
+    where r.data_estudo is not null
+    on conflict (user_id, concurso, semana) do update set
+        minutos            = s.minutos + excluded.minutos,
+        questoes           = s.questoes + excluded.questoes,
+        acertos            = s.acertos + excluded.acertos,
+        registros          = s.registros + excluded.registros,
+        simulados          = s.simulados + excluded.simulados,
+        questoes_simulados = s.questoes_simulados + excluded.questoes_simulados,
+        acertos_simulados  = s.acertos_simulados + excluded.acertos_simulados;
+$$;
+
+create or replace function public.resumo_semanal_trigger()
+returns trigger
+language plpgsql
+security definer
+set search_path = public
+as $$
+begin
+    if tg_op in ('UPDATE', 'DELETE') then
+        perform public.resumo_semanal_aplicar(old, -1);
+    end if;
+    if tg_op in ('INSERT', 'UPDATE') then
+        perform public.resumo_semanal_aplicar(new, 1);
+    end if;
+    return null;
+end;
+$$;
+
+drop trigger if exists registros_estudos_resumo_semanal on public.registros_estudos;
+create trigger registros_estudos_resumo_semanal
+    after insert or delete or update of user_id, concurso, data_estudo, tipo, tempo, total, acertos
+    on public.registros_estudos
+    for each row execute function public.resumo_semanal_trigger();
+
+-- -----------------------------------------------------------------------------
+-- Carga inicial (idempotente: recalcula as semanas a partir dos registros)
+-- -----------------------------------------------------------------------------
+insert into public.resumo_semanal
+    (user_id, concurso, semana, minutos, questoes, acertos, registros, simulados, questoes_simulados, acertos_simulados)
+select user_id,
+       concurso,
+       date_trunc('week', data_estudo)::date,
+       coalesce(sum(tempo) filter (where tipo = 'estudo'), 0),
+       coalesce(sum(total) filter (where tipo = 'estudo'), 0),
+       coalesce(sum(acertos) filter (where tipo = 'estudo'), 0),
+       count(*) filter (where tipo = 'estudo'),
+       count(*) filter (where tipo = 'simulado'),
+       coalesce(sum(total) filter (where tipo = 'simulado'), 0),
+       coalesce(sum(acertos) filter (where tipo = 'simulado'), 0)
+from public.registros_estudos
+where data_estudo is not null
+group by user_id, concurso, date_trunc('week', data_estudo)::date
+on conflict (user_id, concurso, semana) do update set
+    minutos            = excluded.minutos,
+    questoes           = excluded.questoes,
+    acertos            = excluded.acertos,
+    registros          = excluded.registros,
+    simulados          = excluded.simulados,
+    questoes_simulados = excluded.questoes_simulados,
+    acertos_simulados  = excluded.acertos_simulados;
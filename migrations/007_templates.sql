@@ -0,0 +1,65 @@
+-- =============================================================================
+-- 007 - CATÁLOGO DE TEMPLATES
+-- Uma linha por template (antes: template_nome/descricao/clones repetidos em
+-- cada linha de editais_materias). As matérias continuam nas linhas do edital
+-- do criador, marcadas com is_template para poderem ser lidas e clonadas.
+-- As colunas template_* de editais_materias deixam de ser escritas pelo app.
+-- =============================================================================
+
+create table if not exists public.templates (
+    id          bigint generated by default as identity primary key,
+    user_id     uuid    not null default auth.uid(),  -- criador
+    concurso    text    not null,
+    cargo       text,
+    nome        text    not null,
+    descricao   text,
+    materias    integer not null default 0,
+    clones      integer not null default 0,
+    created_at  timestamptz not null default now(),
+    unique (user_id, concurso)
+);
+
+alter table public.templates enable row level security;
+
+drop policy if exists "templates_leitura_publica" on public.templates;
+create policy "templates_leitura_publica" on public.templates
+    for select using (true);
+
+drop policy if exists "templates_dono" on public.templates;
+create policy "templates_dono" on public.templates
+    for all using (auth.uid() = user_id) with check (auth.uid() = user_id);
+
+-- -----------------------------------------------------------------------------
+-- Contador de clones: incremento atômico no servidor (quem clona não é o dono
+-- da linha, por isso security definer restrito a esta coluna)
+-- -----------------------------------------------------------------------------
+create or replace function public.templates_registrar_clone(p_template_id bigint)
+returns integer
+language sql
+security definer
+set search_path = public
+as $$
+    update public.templates
+    set clones = clones + 1
+    where id = p_template_id
+    returning clones;
+$$;
+
+revoke all on function public.templates_registrar_clone(bigint) from public;
+grant execute on function public.templates_registrar_clone(bigint) to authenticated;
+
+-- -----------------------------------------------------------------------------
+-- Migração única: um template por (criador, concurso) já marcado em editais_materias
+-- -----------------------------------------------------------------------------
+insert into public.templates (user_id, concurso, cargo, nome, descricao, materias, clones)
+select coalesce(template_criador_id, user_id),
+       concurso,
+       max(cargo),
+       coalesce(max(template_nome), concurso),
+       max(template_descricao),
+       count(*),
+       coalesce(max(template_clones), 0)
+from public.editais_materias
+where is_template
+group by coalesce(template_criador_id, user_id), concurso
+on conflict (user_id, concurso) do nothing;
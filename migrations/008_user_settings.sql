@@ -0,0 +1,56 @@
+-- =============================================================================
+-- 008 - CONFIGURAÇÕES POR USUÁRIO
+-- Uma linha por usuário com a missão principal, as metas semanais e a nota de
+-- corte alvo. Substitui a flag is_principal repetida em cada linha de
+-- editais_materias (três round trips para trocar) e as metas guardadas só em
+-- st.session_state. O app lê esta linha junto com o edital numa única chamada
+-- (snapshot_usuario).
+-- =============================================================================
+
+create table if not exists public.user_settings (
+    user_id               uuid    primary key default auth.uid(),
+    missao_principal      text,
+    meta_horas_semana     integer not null default 22,
+    meta_questoes_semana  integer not null default 350,
+    nota_corte_alvo       integer not null default 80,
+    updated_at            timestamptz not null default now()
+);
+
+alter table public.user_settings enable row level security;
+
+drop policy if exists "user_settings_dono" on public.user_settings;
+create policy "user_settings_dono" on public.user_settings
+    for all using (auth.uid() = user_id) with check (auth.uid() = user_id);
+
+-- -----------------------------------------------------------------------------
+-- Migração única: missão principal (is_principal)
+-- -----------------------------------------------------------------------------
+insert into public.user_settings (user_id, missao_principal)
+select distinct on (user_id) user_id, concurso
+from public.editais_materias
+where is_principal and user_id is not null
+order by user_id, id
+on conflict (user_id) do nothing;
+
+-- -----------------------------------------------------------------------------
+-- Snapshot de abertura: linhas do edital + configurações em uma requisição
+-- -----------------------------------------------------------------------------
+create or replace function public.snapshot_usuario(p_user_id uuid)
+returns json
+language sql
+stable
+security invoker
+as $$
+    select json_build_object(
+        'editais', coalesce((
+            select json_agg(e order by e.id)
+            from public.editais_materias e
+            where e.user_id = p_user_id
+        ), '[]'::json),
+        'settings', (
+            select row_to_json(s)
+            from public.user_settings s
+            where s.user_id = p_user_id
+        )
+    );
+$$;
@@ -0,0 +1,77 @@
+-- =============================================================================
+-- 009 - EXCLUSÃO E RENOMEAÇÃO DE MATÉRIAS EM CASCATA (atômicas, 1 round trip)
+-- Antes: 3 chamadas por matéria na exclusão em massa (contagem, delete em
+-- registros_estudos, delete em editais_materias) e 2 na renomeação, com falhas
+-- parciais possíveis. Cada função é um único statement (CTEs de escrita), logo
+-- tudo ou nada, e devolve as contagens afetadas.
+-- =============================================================================
+
+create or replace function public.excluir_materias(p_ids bigint[], p_user_id uuid)
+returns table (materias bigint, registros bigint)
+language sql
+security invoker
+as $$
+    with alvo as (
+        select id, concurso, materia
+        from public.editais_materias
+        where id = any(p_ids) and user_id = p_user_id
+    ),
+    registros_removidos as (
+        delete from public.registros_estudos r
+        using alvo
+        where r.user_id = p_user_id
+          and r.concurso = alvo.concurso
+          and r.materia = alvo.materia
+        returning r.id
+    ),
+    materias_removidas as (
+        delete from public.editais_materias e
+        using alvo
+        where e.id = alvo.id
+        returning e.id
+    )
+    select (select count(*) from materias_removidas),
+           (select count(*) from registros_removidos);
+$$;
+
+create or replace function public.renomear_materia(p_id bigint, p_novo_nome text, p_user_id uuid)
+returns table (materias bigint, registros bigint)
+language sql
+security invoker
+as $$
+    with alvo as (
+        select id, concurso, materia
+        from public.editais_materias
+        where id = p_id and user_id = p_user_id
+    ),
+    materia_renomeada as (
+        update public.editais_materias e
+        set materia = p_novo_nome
+        from alvo
+        where e.id = alvo.id
+        returning e.id
+    ),
+    registros_renomeados as (
+        update public.registros_estudos r
+        set materia = p_novo_nome
+        from alvo
+        where r.user_id = p_user_id
+          and r.concurso = alvo.concurso
+          and r.materia = alvo.materia
+        returning r.id
+    ),
+    log_renomeado as (
+        update public.revisoes_log l
+        set materia = p_novo_nome
+        from alvo
+        where l.user_id = p_user_id
+          and l.concurso = alvo.concurso
+          and l.materia = alvo.materia
+        returning l.id
+    )
+    select (select count(*) from materia_renomeada),
+           (select count(*) from registros_renomeados);
+$$;
+
+grant execute on function public.excluir_materias(bigint[], uuid) to authenticated;
+grant execute on function public.renomear_materia(bigint, text, uuid) to authenticated;
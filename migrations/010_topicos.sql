@@ -0,0 +1,212 @@
+-- =============================================================================
+-- 010 - TÓPICOS DO EDITAL EM TABELA FILHA
+-- Cada assunto vira uma linha (id estável, ordem, exclusão lógica) em vez de
+-- um elemento do array editais_materias.topicos, reescrito por inteiro a cada
+-- edição. O app não escreve mais o array (insere as linhas de topicos junto
+-- com a matéria); ele fica só como semente legada, expandida pelo trigger
+-- abaixo se algum insert ainda o trouxer. A leitura do edital monta
+-- matéria -> tópicos com um único join (editais_com_topicos).
+-- =============================================================================
+
+create table if not exists public.topicos (
+    id           bigint generated by default as identity primary key,
+    materia_id   bigint  not null references public.editais_materias(id) on delete cascade,
+    user_id      uuid    not null default auth.uid(),
+    nome         text    not null,
+    ordem        integer not null default 0,
+    excluido_em  timestamptz,                      -- exclusão lógica
+    created_at   timestamptz not null default now()
+);
+
+create unique index if not exists topicos_materia_nome_ativos_idx
+    on public.topicos (materia_id, nome) where excluido_em is null;
+create index if not exists topicos_user_idx
+    on public.topicos (user_id, materia_id, ordem);
+
+alter table public.topicos enable row level security;
+
+drop policy if exists "topicos_dono" on public.topicos;
+create policy "topicos_dono" on public.topicos
+    for all using (auth.uid() = user_id) with check (auth.uid() = user_id);
+
+-- Tópicos de templates públicos podem ser lidos (visualização e clonagem)
+drop policy if exists "topicos_templates" on public.topicos;
+create policy "topicos_templates" on public.topicos
+    for select using (exists (
+        select 1 from public.editais_materias e where e.id = materia_id and e.is_template
+    ));
+
+-- -----------------------------------------------------------------------------
+-- Migração única: expande os arrays existentes preservando a ordem
+-- -----------------------------------------------------------------------------
+insert into public.topicos (materia_id, user_id, nome, ordem)
+select e.id, e.user_id, trim(t.nome), min(t.ordem)::integer
+from public.editais_materias e,
+     unnest(e.topicos) with ordinality as t(nome, ordem)
+where e.user_id is not null
+  and trim(t.nome) <> ''
+  and not exists (select 1 from public.topicos x where x.materia_id = e.id)
+group by e.id, e.user_id, trim(t.nome);
+
+-- -----------------------------------------------------------------------------
+-- Semente legada: insert com "topicos": [...] ainda vira linhas de topicos.
+-- Depois da criação o array não acompanha as edições (só a tabela topicos).
+-- -----------------------------------------------------------------------------
+alter table public.editais_materias alter column topicos set default '{}';
+
+create or replace function public.topicos_expandir_semente()
+returns trigger
+language plpgsql
+security invoker
+as $$
+begin
+    insert into public.topicos (materia_id, user_id, nome, ordem)
+    select new.id, new.user_id, trim(t.nome), min(t.ordem)::integer
+    from unnest(coalesce(new.topicos, '{}'::text[])) with ordinality as t(nome, ordem)
+    where trim(t.nome) <> ''
+    group by trim(t.nome)
+    on conflict do nothing;
+    return null;
+end;
+$$;
+
+drop trigger if exists editais_materias_topicos_semente on public.editais_materias;
+create trigger editais_materias_topicos_semente
+    after insert on public.editais_materias
+    for each row execute function public.topicos_expandir_semente();
+
+-- -----------------------------------------------------------------------------
+-- Leitura do edital: linhas de editais_materias com os tópicos ativos (1 join).
+-- p_concurso restringe a um concurso (matérias de um template no catálogo).
+-- -----------------------------------------------------------------------------
+drop function if exists public.editais_com_topicos(uuid);
+
+create or replace function public.editais_com_topicos(p_user_id uuid, p_concurso text default null)
+returns json
+language sql
+stable
+security invoker
+as $$
+    select coalesce(json_agg(linha order by linha.id), '[]'::json)
+    from (
+        select e.id,
+               e.concurso,
+               e.cargo,
+               e.materia,
+               e.data_prova,
+               e.is_template,
+               coalesce(array_agg(t.nome order by t.ordem, t.id) filter (where t.id is not null), '{}') as topicos,
+               coalesce(array_agg(t.id order by t.ordem, t.id) filter (where t.id is not null), '{}') as topico_ids,
+               -- Maior ordem já usada, incluindo excluídos: novos tópicos entram depois dela
+               (select coalesce(max(x.ordem), 0) from public.topicos x where x.materia_id = e.id) as ultima_ordem
+        from public.editais_materias e
+        left join public.topicos t on t.materia_id = e.id and t.excluido_em is null
+        where e.user_id = p_user_id
+          and (p_concurso is null or e.concurso = p_concurso)
+        group by e.id
+    ) as linha;
+$$;
+
+create or replace function public.snapshot_usuario(p_user_id uuid)
+returns json
+language sql
+stable
+security invoker
+as $$
+    select json_build_object(
+        'editais', public.editais_com_topicos(p_user_id),
+        'settings', (
+            select row_to_json(s)
+            from public.user_settings s
+            where s.user_id = p_user_id
+        )
+    );
+$$;
+
+-- -----------------------------------------------------------------------------
+-- Registros de estudo passam a apontar para o tópico por id
+-- -----------------------------------------------------------------------------
+alter table public.registros_estudos
+    add column if not exists topico_id bigint references public.topicos(id) on delete set null;
+
+create index if not exists registros_estudos_topico_idx
+    on public.registros_estudos (topico_id);
+
+update public.registros_estudos r
+set topico_id = t.id
+from public.editais_materias e
+join public.topicos t on t.materia_id = e.id and t.excluido_em is null
+where r.topico_id is null
+  and e.user_id = r.user_id
+  and e.concurso = r.concurso
+  and e.materia = r.materia
+  and t.nome = r.assunto;
+
+create or replace function public.registros_resolver_topico()
+returns trigger
+language plpgsql
+security invoker
+as $$
+begin
+    select t.id into new.topico_id
+    from public.editais_materias e
+    join public.topicos t on t.materia_id = e.id and t.excluido_em is null
+    where e.user_id = new.user_id
+      and e.concurso = new.concurso
+      and e.materia = new.materia
+      and t.nome = new.assunto
+    limit 1;
+    return new;
+end;
+$$;
+
+drop trigger if exists registros_estudos_topico on public.registros_estudos;
+create trigger registros_estudos_topico
+    before insert or update of concurso, materia, assunto on public.registros_estudos
+    for each row execute function public.registros_resolver_topico();
+
+-- -----------------------------------------------------------------------------
+-- renomear_materia (009) em plpgsql: a ordem dos CTEs de escrita irmãos não é
+-- garantida, e o trigger acima precisa ver a matéria já renomeada para
+-- resolver o topico_id dos registros. Com comandos em sequência, cada update
+-- enxerga o anterior.
+-- -----------------------------------------------------------------------------
+create or replace function public.renomear_materia(p_id bigint, p_novo_nome text, p_user_id uuid)
+returns table (materias bigint, registros bigint)
+language plpgsql
+security invoker
+as $$
+declare
+    v_concurso text;
+    v_materia  text;
+begin
+    select e.concurso, e.materia into v_concurso, v_materia
+    from public.editais_materias e
+    where e.id = p_id and e.user_id = p_user_id;
+
+    if not found then
+        return query select 0::bigint, 0::bigint;
+        return;
+    end if;
+
+    update public.editais_materias
+    set materia = p_novo_nome
+    where id = p_id;
+
+    update public.registros_estudos r
+    set materia = p_novo_nome
+    where r.user_id = p_user_id
+      and r.concurso = v_concurso
+      and r.materia = v_materia;
+    get diagnostics registros = row_count;
+
+    update public.revisoes_log l
+    set materia = p_novo_nome
+    where l.user_id = p_user_id
+      and l.concurso = v_concurso
+      and l.materia = v_materia;
+
+    materias := 1;
+    return next;
+end;
+$$;
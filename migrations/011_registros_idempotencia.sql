@@ -0,0 +1,13 @@
+-- =============================================================================
+-- 011 - CHAVE DE IDEMPOTÊNCIA EM REGISTROS_ESTUDOS
+-- O Registrar passou a gravar por uma fila em segundo plano (write-behind) que
+-- retenta em caso de falha. Cada registro leva uma idempotency_key gerada no
+-- cliente; o envio é um upsert "on conflict do nothing" sobre ela, então um
+-- reenvio após timeout não duplica o registro.
+-- =============================================================================
+
+alter table public.registros_estudos
+    add column if not exists idempotency_key uuid;
+
+create unique index if not exists registros_estudos_idempotency_key
+    on public.registros_estudos (idempotency_key);
@@ -0,0 +1,68 @@
+import pandas as pd
+import datetime
+
+
+# Pesos padrão do score de prioridade (configuráveis por chamada)
+PESOS_PADRAO = {"relevancia": 1.0, "erro": 1.0, "recencia": 0.5}
+
+
+def construir_matrizes(df, hoje):
+    """Matrizes matéria x assunto (precisão, relevância, recência) em uma única passada"""
+    if df.empty:
+        colunas = ['materia', 'acertos', 'total', 'tempo', 'taxa', 'relevancia', 'dias_sem_estudo']
+        return {
+            "assuntos": pd.DataFrame(columns=['assunto', 'taxa_media'] + colunas),
+            "materias": pd.DataFrame(columns=['pior_assunto'] + colunas),
+            "semana": {"materias": set(), "assuntos": 0, "questoes": 0},
+        }
+
+    base = df[['materia', 'assunto', 'acertos', 'total', 'tempo', 'taxa']].copy()
+    base['relevancia'] = df['relevancia'].fillna(5) if 'relevancia' in df.columns else 5
+    base['dt'] = pd.to_datetime(df['data_estudo']).dt.date
+
+    assuntos = base.groupby(['materia', 'assunto']).agg(
+        acertos=('acertos', 'sum'), total=('total', 'sum'), tempo=('tempo', 'sum'),
+        taxa_media=('taxa', 'mean'), rel_soma=('relevancia', 'sum'),
+        registros=('dt', 'size'), ultima=('dt', 'max')).reset_index()
+    assuntos['taxa'] = (assuntos['acertos'] / assuntos['total'] * 100).fillna(0)
+    assuntos['relevancia'] = assuntos['rel_soma'] / assuntos['registros']
+    assuntos['dias_sem_estudo'] = assuntos['ultima'].apply(lambda d: (hoje - d).days)
+
+    # Matriz por matéria a partir da matriz de assuntos (sem novo scan dos registros)
+    materias = assuntos.groupby('materia').agg(
+        acertos=('acertos', 'sum'), total=('total', 'sum'), tempo=('tempo', 'sum'),
+        rel_soma=('rel_soma', 'sum'), registros=('registros', 'sum'),
+        dias_sem_estudo=('dias_sem_estudo', 'min')).reset_index()
+    materias['taxa'] = (materias['acertos'] / materias['total'] * 100).fillna(0)
+    materias['relevancia'] = materias['rel_soma'] / materias['registros']
+    pior = assuntos.sort_values('taxa_media').drop_duplicates('materia').set_index('materia')['assunto']
+    materias['pior_assunto'] = materias['materia'].map(pior)
+
+    # Recorte da semana corrente (segunda-feira até hoje)
+    df_sem = base[base['dt'] >= hoje - datetime.timedelta(days=hoje.weekday())]
+    semana = {
+        "materias": set(df_sem['materia']),
+        "assuntos": df_sem['assunto'].nunique(),
+        "questoes": int(df_sem['total'].sum()),
+    }
+    return {"assuntos": assuntos, "materias": materias, "semana": semana}
+
+
+def score_padrao(linha, pesos):
+    """Relevância (1-10) + erro (0-1) + recência (até 30 dias sem estudo, em décimos)"""
+    return (linha['relevancia'] * pesos['relevancia']
+            + (100 - linha['taxa']) / 100 * pesos['erro']
+            + min(linha['dias_sem_estudo'], 30) / 30 * pesos['recencia'])
+
+
+def ranquear_alvos(matriz, taxa_max=75, relevancia_min=5, funcao_score=score_padrao, pesos=None, limite=None):
+    """Alvos prioritários (abaixo da taxa e acima da relevância) ordenados pelo score"""
+    if matriz.empty:
+        return matriz
+    pesos = {**PESOS_PADRAO, **(pesos or {})}
+    alvos = matriz[(matriz['taxa'] < taxa_max) & (matriz['relevancia'] >= relevancia_min)].copy()
+    if alvos.empty:
+        return alvos
+    alvos['score'] = alvos.apply(lambda linha: funcao_score(linha, pesos), axis=1)
+    alvos = alvos.sort_values(['score', 'taxa'], ascending=[False, True])
+    return alvos.head(limite) if limite else alvos
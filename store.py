@@ -0,0 +1,661 @@
+import json
+import os
+import random
+import threading
+import time
+import unicodedata
+import uuid
+from postgrest.exceptions import APIError
+from supabase import Client
+from typing import Callable, Dict, List, Optional
+
+
+# Filtros do Banco de Questões traduzidos para parâmetros do PostgREST
+FAIXAS_RELEVANCIA_QUESTOES = {"Alta (8-10)": (8, 10), "Média (5-7)": (5, 7), "Baixa (1-4)": (1, 4)}
+ORDENACAO_QUESTOES = {
+    "Data (mais recente)": ("data", True),
+    "Data (mais antiga)": ("data", False),
+    "Relevância (maior)": ("relevancia", True),
+    "Relevância (menor)": ("relevancia", False),
+}
+
+
+def aplicar_filtros_questoes(query, missao, user_id, materia, status, faixa_relevancia):
+    """Aplica ao query builder os filtros de concurso, matéria, status e relevância"""
+    query = query.eq("concurso", missao).eq("user_id", user_id)
+    if materia != "Todas":
+        query = query.eq("materia", materia)
+    if status == "Pendente":
+        # Status nulo sempre foi exibido como Pendente
+        query = query.or_("status.eq.Pendente,status.is.null")
+    elif status != "Todas":
+        query = query.eq("status", status)
+    if faixa_relevancia in FAIXAS_RELEVANCIA_QUESTOES:
+        rel_min, rel_max = FAIXAS_RELEVANCIA_QUESTOES[faixa_relevancia]
+        query = query.gte("relevancia", rel_min).lte("relevancia", rel_max)
+    return query
+
+
+# Campos que decidem em quais páginas (filtro) e em que posição (ordenação) uma questão aparece
+CAMPOS_PAGINACAO_QUESTOES = {"concurso", "materia", "status", "relevancia"} | {c for c, _ in ORDENACAO_QUESTOES.values()}
+
+
+class QuestoesStore:
+    """Cache das questões de um (usuário, concurso) com escrita write-through"""
+
+    def __init__(self, supabase_client: Client, user_id: str, concurso: str):
+        self.supabase = supabase_client
+        self.user_id = user_id
+        self.concurso = concurso
+        self._lock = threading.Lock()
+        self._paginas = {}  # (materia, status, faixa, ordem, pagina, tamanho) -> [linhas, total]
+        self._contagens = None
+
+    # ------------------------------------------------------------------
+    # LEITURA
+    # ------------------------------------------------------------------
+    def pagina(self, materia, status, faixa_relevancia, ordem, pagina, tamanho):
+        """Página filtrada/ordenada: lida do servidor só na primeira vez"""
+        chave = (materia, status, faixa_relevancia, ordem, pagina, tamanho)
+        with self._lock:
+            if chave in self._paginas:
+                linhas, total = self._paginas[chave]
+                return list(linhas), total
+
+        coluna, desc = ORDENACAO_QUESTOES.get(ordem, ("data", True))
+        inicio = pagina * tamanho
+        query = self.supabase.table("questoes_revisao").select("*", count="exact")
+        query = aplicar_filtros_questoes(query, self.concurso, self.user_id, materia, status, faixa_relevancia)
+        response = query.order(coluna, desc=desc).order("id", desc=desc).range(inicio, inicio + tamanho - 1).execute()
+        linhas, total = response.data or [], response.count or 0
+
+        with self._lock:
+            self._paginas[chave] = [linhas, total]
+        return list(linhas), total
+
+    def contagens(self):
+        """Contagens agrupadas (status, matéria, relevância) via RPC"""
+        with self._lock:
+            if self._contagens is not None:
+                return self._copiar_contagens(self._contagens)
+
+        contagens = {"total": 0, "status": {}, "materia": {}, "relevancia": {}}
+        try:
+            response = self.supabase.rpc(
+                "questoes_contagens", {"p_concurso": self.concurso, "p_user_id": self.user_id}
+            ).execute()
+        except Exception:
+            return contagens
+        for linha in response.data or []:
+            contagens[linha['dimensao']][linha['valor']] = linha['quantidade']
+        contagens["total"] = sum(contagens["status"].values())
+
+        with self._lock:
+            self._contagens = contagens
+        return self._copiar_contagens(contagens)
+
+    # ------------------------------------------------------------------
+    # ESCRITA (só altera o cache depois que o servidor confirma)
+    # ------------------------------------------------------------------
+    def atualizar(self, questao_id, campos: Dict):
+        """Atualiza uma questão no servidor e aplica a mudança no cache.
+
+        Campos de filtro/ordenação podem mover a questão entre páginas (ou para
+        páginas ainda não lidas), então todas são descartadas; os demais são
+        corrigidos no lugar.
+        """
+        self.supabase.table("questoes_revisao").update(campos).eq("id", questao_id).eq("user_id", self.user_id).execute()
+
+        with self._lock:
+            anterior = self._localizar(questao_id)
+            if CAMPOS_PAGINACAO_QUESTOES & set(campos):
+                self._paginas.clear()
+            else:
+                for linhas, _ in self._paginas.values():
+                    for i, linha in enumerate(linhas):
+                        if linha.get('id') == questao_id:
+                            linhas[i] = {**linha, **campos}
+            if anterior is None:
+                # Questão fora das páginas em cache: contagens não podem ser ajustadas
+                self._contagens = None
+            else:
+                self._ajustar_contagens(anterior, -1)
+                self._ajustar_contagens({**anterior, **campos}, +1)
+
+    def excluir(self, questao_id):
+        """Exclui uma questão no servidor; as páginas seguintes se deslocam, então são relidas"""
+        self.supabase.table("questoes_revisao").delete().eq("id", questao_id).eq("user_id", self.user_id).execute()
+
+        with self._lock:
+            removida = self._localizar(questao_id)
+            self._paginas.clear()
+            if removida is None:
+                self._contagens = None
+            else:
+                self._ajustar_contagens(removida, -1)
+
+    def inserir(self, payload: Dict):
+        """Insere uma questão; a posição nas páginas é desconhecida, então elas são relidas"""
+        response = self.supabase.table("questoes_revisao").insert(payload).execute()
+
+        with self._lock:
+            self._paginas.clear()
+            for linha in response.data or [payload]:
+                self._ajustar_contagens(linha, +1)
+        return response
+
+    def invalidar(self):
+        """Descarta páginas e contagens (ex.: após ações em massa)"""
+        with self._lock:
+            self._paginas.clear()
+            self._contagens = None
+
+    def _localizar(self, questao_id):
+        for linhas, _ in self._paginas.values():
+            for linha in linhas:
+                if linha.get('id') == questao_id:
+                    return dict(linha)
+        return None
+
+    @staticmethod
+    def _copiar_contagens(contagens):
+        return {k: dict(v) if isinstance(v, dict) else v for k, v in contagens.items()}
+
+    def _ajustar_contagens(self, questao, delta):
+        if self._contagens is None:
+            return
+        for dimensao, valor in (
+            ("status", questao.get('status') or 'Pendente'),
+            ("materia", questao.get('materia')),
+            ("relevancia", str(questao.get('relevancia') or 5)),
+        ):
+            grupo = self._contagens[dimensao]
+            grupo[valor] = grupo.get(valor, 0) + delta
+            if grupo[valor] <= 0:
+                del grupo[valor]
+        self._contagens["total"] = sum(self._contagens["status"].values())
+
+
+class VersoesDados:
+    """Versão dos dados por (user_id, missao, escopo) para invalidar caches derivados"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._versoes = {}
+
+    def atual(self, user_id, missao, escopo):
+        return self._versoes.get((user_id, missao, escopo), 0)
+
+    def instantaneo(self, user_id, escopo):
+        """Cópia das versões de todas as missões do usuário no escopo"""
+        with self._lock:
+            return {m: v for (u, m, e), v in self._versoes.items() if u == user_id and e == escopo}
+
+    def incrementar(self, user_id, missao, escopo):
+        """Chamado após uma escrita confirmada: caches da versão anterior deixam de ser usados"""
+        with self._lock:
+            chave = (user_id, missao, escopo)
+            self._versoes[chave] = self._versoes.get(chave, 0) + 1
+            return self._versoes[chave]
+
+
+def normalizar_nome(nome):
+    """Chave de comparação sem acentos, caixa ou espaços repetidos ('Português' == 'portugues ')"""
+    sem_acento = unicodedata.normalize("NFKD", str(nome or "")).encode("ascii", "ignore").decode("ascii")
+    return " ".join(sem_acento.casefold().split())
+
+
+class EstudosMultiMissao:
+    """Registros de estudo de todos os concursos do usuário, particionados por concurso.
+
+    A primeira leitura traz todas as missões numa única consulta paginada; depois
+    disso, trocar de missão é uma busca no dicionário. Cada partição guarda a versão
+    dos dados (VersoesDados, `escopo`) com que foi lida e só ela é relida quando uma
+    escrita avança essa versão. Escritas de uma linha cuja resposta do servidor já
+    está em mãos são aplicadas na partição (atualizar_local/remover_local/
+    anexar_local) sem releitura.
+    """
+
+    def __init__(self, supabase_client: Client, user_id: str, versoes: VersoesDados, colunas: List[str],
+                 tamanho_pagina=1000, tipo="estudo", escopo="estudos"):
+        self.supabase = supabase_client
+        self.user_id = user_id
+        self.versoes = versoes
+        self.colunas = list(dict.fromkeys(["concurso", "id"] + list(colunas)))
+        self.tamanho_pagina = tamanho_pagina
+        self.tipo = tipo
+        self.escopo = escopo
+        self._lock = threading.Lock()
+        self._particoes = None  # concurso -> (versao, [linhas])
+
+    # ------------------------------------------------------------------
+    # LEITURA
+    # ------------------------------------------------------------------
+    def particao(self, concurso):
+        """Registros de um concurso (mais recentes primeiro), relidos só se a versão mudou"""
+        self._carregar_todas()
+        versao = self.versoes.atual(self.user_id, concurso, self.escopo)
+        with self._lock:
+            atual = self._particoes.get(concurso)
+            if atual is not None and atual[0] == versao:
+                return atual[1]
+
+        linhas = self._buscar(concurso)
+        with self._lock:
+            self._particoes[concurso] = (versao, linhas)
+        return linhas
+
+    def concursos(self):
+        """Concursos com ao menos um registro de estudo"""
+        self._carregar_todas()
+        with self._lock:
+            return sorted(c for c, (_, linhas) in self._particoes.items() if linhas)
+
+    def resumo_por_concurso(self):
+        """{concurso: {registros, tempo, acertos, total, taxa}} a partir das partições"""
+        resumo = {}
+        for concurso in self.concursos():
+            linhas = self.particao(concurso)
+            acertos = sum(int(l.get('acertos') or 0) for l in linhas)
+            total = sum(int(l.get('total') or 0) for l in linhas)
+            resumo[concurso] = {
+                "registros": len(linhas),
+                "tempo": sum(int(l.get('tempo') or 0) for l in linhas),
+                "acertos": acertos,
+                "total": total,
+                "taxa": acertos / total * 100 if total > 0 else 0,
+            }
+        return resumo
+
+    def materias_compartilhadas(self):
+        """Matérias presentes em mais de um concurso, deduplicadas por nome normalizado"""
+        materias = {}
+        for concurso in self.concursos():
+            for linha in self.particao(concurso):
+                chave = normalizar_nome(linha.get('materia'))
+                if not chave:
+                    continue
+                m = materias.setdefault(chave, {"materia": linha['materia'], "concursos": set(), "tempo": 0, "acertos": 0, "total": 0})
+                m["concursos"].add(concurso)
+                m["tempo"] += int(linha.get('tempo') or 0)
+                m["acertos"] += int(linha.get('acertos') or 0)
+                m["total"] += int(linha.get('total') or 0)
+        compartilhadas = [m for m in materias.values() if len(m["concursos"]) > 1]
+        for m in compartilhadas:
+            m["taxa"] = m["acertos"] / m["total"] * 100 if m["total"] > 0 else 0
+        return sorted(compartilhadas, key=lambda m: m["tempo"], reverse=True)
+
+    def invalidar(self):
+        """Descarta todas as partições (a próxima leitura refaz a carga completa)"""
+        with self._lock:
+            self._particoes = None
+
+    # ------------------------------------------------------------------
+    # MUTAÇÃO LOCAL (a escrita já foi confirmada pelo servidor)
+    # ------------------------------------------------------------------
+    def atualizar_local(self, registro_id, campos: Dict, concurso=None):
+        """Aplica na partição os campos alterados (de preferência a linha devolvida pelo update)"""
+        campos = {c: v for c, v in campos.items() if c in self.colunas}
+        concurso = concurso or campos.get('concurso') or self._localizar(registro_id)
+        self._mutar(concurso, lambda linhas: [
+            {**linha, **campos} if linha.get('id') == registro_id else linha for linha in linhas
+        ])
+
+    def remover_local(self, registro_id, concurso=None):
+        """Retira da partição um registro excluído no servidor"""
+        concurso = concurso or self._localizar(registro_id)
+        self._mutar(concurso, lambda linhas: [linha for linha in linhas if linha.get('id') != registro_id])
+
+    def anexar_local(self, linha: Dict):
+        """Inclui na partição a linha devolvida por um insert"""
+        linha = {c: linha.get(c) for c in self.colunas}
+        self._mutar(linha['concurso'], lambda linhas: linhas + [linha])
+
+    def _localizar(self, registro_id):
+        with self._lock:
+            for concurso, (_, linhas) in (self._particoes or {}).items():
+                if any(linha.get('id') == registro_id for linha in linhas):
+                    return concurso
+        return None
+
+    def _mutar(self, concurso, funcao):
+        """Avança a versão do concurso (caches derivados são refeitos) mantendo a partição
+        válida quando ela estava atualizada; se não estava, a próxima leitura a relê"""
+        if concurso is None:
+            self.invalidar()
+            return
+        with self._lock:
+            versao = self.versoes.atual(self.user_id, concurso, self.escopo)
+            nova_versao = self.versoes.incrementar(self.user_id, concurso, self.escopo)
+            atual = (self._particoes or {}).get(concurso)
+            if atual is None or atual[0] != versao or nova_versao != versao + 1:
+                return
+            linhas = funcao(list(atual[1]))
+            # Mesma ordem da consulta: data_estudo desc, id desc
+            linhas.sort(key=lambda l: (str(l.get('data_estudo') or ''), l.get('id') or 0), reverse=True)
+            self._particoes[concurso] = (nova_versao, linhas)
+
+    # ------------------------------------------------------------------
+    # CARGA
+    # ------------------------------------------------------------------
+    def _carregar_todas(self):
+        with self._lock:
+            if self._particoes is not None:
+                return
+
+        # Versões lidas antes da consulta: uma escrita concorrente força a releitura da partição
+        versoes = self.versoes.instantaneo(self.user_id, self.escopo)
+        particoes = {}
+        for linha in self._buscar():
+            particoes.setdefault(linha['concurso'], []).append(linha)
+        carregadas = {c: (versoes.get(c, 0), linhas) for c, linhas in particoes.items()}
+        with self._lock:
+            if self._particoes is None:
+                self._particoes = carregadas
+
+    def _buscar(self, concurso=None):
+        """Consulta paginada (por range) de uma ou de todas as missões do usuário"""
+        linhas, inicio = [], 0
+        while True:
+            query = self.supabase.table("registros_estudos").select(", ".join(self.colunas))\
+                .eq("user_id", self.user_id).eq("tipo", self.tipo)
+            if concurso is not None:
+                query = query.eq("concurso", concurso)
+            lote = query.order("data_estudo", desc=True).order("id", desc=True)\
+                .range(inicio, inicio + self.tamanho_pagina - 1).execute().data or []
+            linhas.extend(lote)
+            if len(lote) < self.tamanho_pagina:
+                return linhas
+            inicio += self.tamanho_pagina
+
+
+class CatalogoTemplates:
+    """Catálogo de templates públicos compartilhado por todas as sessões do processo.
+
+    A lista vem da tabela templates (uma linha por template, via função `carregar`);
+    as matérias de cada template são lidas sob demanda e guardadas junto. Os dados
+    valem por `ttl_segundos` ou até `invalidar()`, que avança a versão do catálogo.
+    """
+
+    def __init__(self, ttl_segundos=600):
+        self.ttl_segundos = ttl_segundos
+        self._lock = threading.Lock()
+        self._versao = 0
+        self._carregado_em = None
+        self._aquecido = False
+        self._templates = {}
+        self._materias = {}
+
+    @property
+    def versao(self):
+        return self._versao
+
+    # ------------------------------------------------------------------
+    # LEITURA
+    # ------------------------------------------------------------------
+    def templates(self, carregar):
+        """{id: {id, criador_id, concurso, cargo, nome, descricao, materias, clones}}
+
+        Por id: criadores diferentes podem publicar concursos com o mesmo nome.
+        """
+        self._garantir(carregar)
+        with self._lock:
+            return {t: dict(info) for t, info in self._templates.items()}
+
+    def materias(self, template_id, carregar_materias):
+        """Matérias e tópicos de um template (carregar_materias(template) na primeira leitura)"""
+        with self._lock:
+            if template_id in self._materias:
+                return [dict(m) for m in self._materias[template_id]]
+            template = self._templates.get(template_id)
+            versao = self._versao
+        if template is None:
+            return []
+
+        materias = carregar_materias(template)
+        with self._lock:
+            if self._versao == versao:
+                self._materias[template_id] = materias
+        return [dict(m) for m in materias]
+
+    # ------------------------------------------------------------------
+    # CICLO DE VIDA
+    # ------------------------------------------------------------------
+    def invalidar(self):
+        """Chamado após criar, remover ou clonar um template"""
+        with self._lock:
+            self._versao += 1
+            self._carregado_em = None
+            self._materias = {}
+
+    def aquecer_em_segundo_plano(self, carregar):
+        """Carrega o catálogo numa thread na primeira chamada do processo (sem bloquear a página)"""
+        with self._lock:
+            if self._aquecido:
+                return
+            self._aquecido = True
+
+        def _aquecer():
+            try:
+                self._garantir(carregar)
+            except Exception:
+                pass  # A próxima leitura tenta de novo e exibe o erro
+
+        threading.Thread(target=_aquecer, name="aquecer-templates", daemon=True).start()
+
+    def _garantir(self, carregar):
+        with self._lock:
+            if self._carregado_em is not None and time.monotonic() - self._carregado_em < self.ttl_segundos:
+                return
+            versao = self._versao
+
+        templates = {}
+        for item in carregar():
+            templates[item['id']] = {
+                'id': item['id'],
+                'criador_id': item['user_id'],
+                'concurso': item['concurso'],
+                'cargo': item.get('cargo'),
+                'nome': item.get('nome') or item['concurso'],
+                'descricao': item.get('descricao') or '',
+                'materias': item.get('materias', 0),
+                'clones': item.get('clones', 0),
+            }
+
+        with self._lock:
+            self._templates = templates
+            if self._versao == versao:
+                self._carregado_em = time.monotonic()
+                self._materias = {}
+            else:
+                # Invalidado durante a carga: publica, mas relê na próxima leitura
+                self._carregado_em = None
+
+
+def erro_permanente(erro):
+    """Recusa do PostgREST que uma nova tentativa não resolve (4xx: RLS, constraint, tipo, coluna)"""
+    if not isinstance(erro, APIError):
+        return False  # Rede/timeout: transitório
+    codigo = str(erro.code or "")
+    if codigo.startswith("PGRST"):
+        return not codigo.startswith("PGRST3")  # PGRST3xx: JWT, renovado no próximo rerun
+    # SQLSTATE 22 (dado inválido), 23 (constraint), 42 (coluna/constraint inexistente, RLS)
+    return codigo[:2] in ("22", "23", "42")
+
+
+class FilaEscrita:
+    """Fila write-behind de inserts de um usuário, enviada por uma thread em segundo plano.
+
+    Cada item recebe uma idempotency_key (coluna única no banco), então reenvios
+    após timeout não duplicam linhas. Falhas transitórias (rede, 5xx, JWT
+    expirado) são retentadas com backoff exponencial; recusas definitivas do
+    servidor (erro_permanente) tiram o item da fila e o marcam como rejeitado,
+    até o usuário reenviar ou descartar. Os itens ficam em disco (`caminho`) e
+    sobrevivem a um reinício do processo enquanto o Supabase estiver inacessível.
+    """
+
+    def __init__(self, supabase_client: Client, caminho: Optional[str] = None,
+                 ao_confirmar: Optional[Callable[[str, Dict, List[Dict]], None]] = None,
+                 backoff_inicial=2.0, backoff_maximo=300.0):
+        self.supabase = supabase_client
+        self.caminho = caminho
+        self.ao_confirmar = ao_confirmar
+        self.backoff_inicial = backoff_inicial
+        self.backoff_maximo = backoff_maximo
+        self._cond = threading.Condition()
+        self._itens = self._ler_disco()  # [{chave, tabela, payload, tentativas, proxima, erro, rejeitado}]
+        self._ultima_sincronizacao = None
+        self._thread = None
+        if self._ativos():
+            self._iniciar()
+
+    # ------------------------------------------------------------------
+    # API
+    # ------------------------------------------------------------------
+    def enfileirar(self, tabela, payload: Dict) -> Dict:
+        """Agenda o insert e devolve o payload com a idempotency_key (para a UI otimista)"""
+        payload = {**payload, "idempotency_key": str(uuid.uuid4())}
+        with self._cond:
+            self._itens.append({
+                "chave": payload["idempotency_key"], "tabela": tabela, "payload": payload,
+                "tentativas": 0, "proxima": 0.0, "erro": None, "rejeitado": False,
+            })
+            self._gravar_disco()
+            self._cond.notify()
+        self._iniciar()
+        return payload
+
+    def pendentes(self, tabela, **filtros) -> List[Dict]:
+        """Payloads ainda em envio (opcionalmente filtrados por campos); rejeitados ficam de fora"""
+        with self._cond:
+            return [
+                dict(item["payload"]) for item in self._ativos()
+                if item["tabela"] == tabela and all(item["payload"].get(k) == v for k, v in filtros.items())
+            ]
+
+    def rejeitados(self) -> List[Dict]:
+        """Itens recusados pelo servidor ({chave, tabela, payload, erro})"""
+        with self._cond:
+            return [
+                {"chave": item["chave"], "tabela": item["tabela"], "payload": dict(item["payload"]), "erro": item["erro"]}
+                for item in self._itens if item["rejeitado"]
+            ]
+
+    def status(self) -> Dict:
+        with self._cond:
+            ativos = self._ativos()
+            falhas = [item for item in ativos if item["tentativas"] > 0]
+            return {
+                "pendentes": len(ativos),
+                "com_falha": len(falhas),
+                "rejeitados": len(self._itens) - len(ativos),
+                "ultimo_erro": falhas[-1]["erro"] if falhas else None,
+                "proxima_tentativa": min((item["proxima"] for item in falhas), default=None),
+                "ultima_sincronizacao": self._ultima_sincronizacao,
+            }
+
+    def sincronizar_agora(self):
+        """Ignora o backoff e tenta enviar tudo imediatamente"""
+        with self._cond:
+            for item in self._itens:
+                item["proxima"] = 0.0
+            self._cond.notify()
+        self._iniciar()
+
+    def reenviar(self, chave):
+        """Devolve um item rejeitado à fila (ex.: depois de aplicar a migração que faltava)"""
+        with self._cond:
+            for item in self._itens:
+                if item["chave"] == chave and item["rejeitado"]:
+                    item.update(rejeitado=False, tentativas=0, proxima=0.0, erro=None)
+            self._gravar_disco()
+            self._cond.notify()
+        self._iniciar()
+
+    def descartar(self, chave):
+        """Remove definitivamente um item rejeitado"""
+        with self._cond:
+            self._itens = [item for item in self._itens if not (item["chave"] == chave and item["rejeitado"])]
+            self._gravar_disco()
+
+    # ------------------------------------------------------------------
+    # WORKER
+    # ------------------------------------------------------------------
+    def _iniciar(self):
+        with self._cond:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._executar, name="fila-escrita", daemon=True)
+            self._thread.start()
+
+    def _executar(self):
+        while True:
+            with self._cond:
+                while not self._ativos():
+                    self._cond.wait()
+                agora = time.time()
+                ativos = self._ativos()
+                prontos = [item for item in ativos if item["proxima"] <= agora]
+                if not prontos:
+                    self._cond.wait(timeout=min(item["proxima"] for item in ativos) - agora)
+                    continue
+                item = prontos[0]
+
+            try:
+                resposta = self.supabase.table(item["tabela"])\
+                    .upsert(item["payload"], on_conflict="idempotency_key", ignore_duplicates=True)\
+                    .execute()
+            except Exception as e:
+                with self._cond:
+                    item["erro"] = str(e)
+                    if erro_permanente(e):
+                        item["rejeitado"] = True
+                        self._gravar_disco()
+                        continue
+                    item["tentativas"] += 1
+                    espera = min(self.backoff_inicial * 2 ** (item["tentativas"] - 1), self.backoff_maximo)
+                    item["proxima"] = time.time() + espera * random.uniform(0.8, 1.2)
+                    self._gravar_disco()
+                continue
+
+            with self._cond:
+                self._itens = [i for i in self._itens if i["chave"] != item["chave"]]
+                self._ultima_sincronizacao = time.time()
+                self._gravar_disco()
+            if self.ao_confirmar is not None:
+                try:
+                    # linhas vazias: a chave já existia (reenvio de um insert que tinha passado)
+                    self.ao_confirmar(item["tabela"], item["payload"], resposta.data or [])
+                except Exception:
+                    pass
+
+    def _ativos(self):
+        return [item for item in self._itens if not item["rejeitado"]]
+
+    # ------------------------------------------------------------------
+    # PERSISTÊNCIA LOCAL
+    # ------------------------------------------------------------------
+    def _ler_disco(self):
+        if not self.caminho or not os.path.exists(self.caminho):
+            return []
+        try:
+            with open(self.caminho, encoding="utf-8") as f:
+                itens = json.load(f)
+            for item in itens:
+                item["proxima"] = 0.0
+                item.setdefault("rejeitado", False)
+            return itens
+        except (OSError, ValueError):
+            return []
+
+    def _gravar_disco(self):
+        if not self.caminho:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.caminho), exist_ok=True)
+            temporario = self.caminho + ".tmp"
+            with open(temporario, "w", encoding="utf-8") as f:
+                json.dump(self._itens, f, ensure_ascii=False)
+            os.replace(temporario, self.caminho)
+        except OSError:
+            pass  # Sem disco gravável: a fila continua só em memória
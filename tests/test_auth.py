@@ -0,0 +1,30 @@
+import pytest
+
+pytest.importorskip("streamlit")
+pytest.importorskip("supabase")
+
+from auth import LoginRateLimiter, client_ip  # noqa: E402
+
+PROXY = "10.0.0.2"
+
+
+def test_client_ip_usa_hop_do_proxy_confiavel():
+    # O cliente pode forjar o início do header; o proxy acrescenta o IP real no fim
+    headers = {"X-Forwarded-For": "1.1.1.1, 203.0.113.7"}
+    assert client_ip(headers, PROXY) == "203.0.113.7"
+
+
+def test_client_ip_sem_header_usa_endereco_da_conexao():
+    assert client_ip({}, "198.51.100.4") == "198.51.100.4"
+
+
+def test_dois_clientes_atras_do_proxy_tem_buckets_separados():
+    limiter = LoginRateLimiter(email_capacity=100, ip_capacity=2, ip_refill_per_second=1e-9)
+    ip_a = client_ip({"X-Forwarded-For": "forjado, 203.0.113.7"}, PROXY)
+    ip_b = client_ip({"X-Forwarded-For": "outro, 198.51.100.9"}, PROXY)
+    assert ip_a != ip_b
+
+    for i in range(2):
+        assert limiter.allow(f"a{i}@x.com", ip_a) == 0
+    assert limiter.allow("a9@x.com", ip_a) > 0  # bucket de A esgotado
+    assert limiter.allow("b@x.com", ip_b) == 0  # B não é afetado